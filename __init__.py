@@ -18,3 +18,18 @@ __all__ += query.__all__
 
 from utils import *
 __all__ += utils.__all__
+
+from lockstats import *
+__all__ += lockstats.__all__
+
+from session import *
+__all__ += session.__all__
+
+from executor import *
+__all__ += executor.__all__
+
+from encoders import *
+__all__ += encoders.__all__
+
+from bloom import *
+__all__ += bloom.__all__
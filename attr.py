@@ -3,6 +3,37 @@ import datetime
 
 from query import Query
 
+_IMMUTABLE_TYPES = (
+    type(None), bool, int, long, float, str, unicode,
+    datetime.datetime, datetime.date, datetime.timedelta)
+
+def _isimmutable(value):
+    if type(value) in (tuple, frozenset):
+        return all(_isimmutable(item) for item in value)
+    return type(value) in _IMMUTABLE_TYPES
+
+def _copier(value):
+    # a function returning copies of value. immutable values are returned
+    # as they are and plain containers are copied by type, which is much
+    # cheaper than a deepcopy
+    if _isimmutable(value):
+        return lambda: value
+
+    if type(value) is dict:
+        if all(_isimmutable(item) for item in value.itervalues()):
+            return lambda: dict(value)
+        items = [(key, _copier(item)) for key, item in value.iteritems()]
+        return lambda: {key: copyitem() for key, copyitem in items}
+
+    if type(value) in (list, tuple):
+        if all(_isimmutable(item) for item in value):
+            return lambda: list(value)
+        copiers = map(_copier, value)
+        container = type(value)
+        return lambda: container([copyitem() for copyitem in copiers])
+
+    return lambda: copy.deepcopy(value)
+
 class Attr(object):
 
     ALLOW_REQUIRED = True
@@ -17,23 +48,33 @@ class Attr(object):
         assert not required or default is None, "required attr cannot have default"
 
         self.name = None # filled in by DataMetaClass
+        self._index = None # position in the instance's values, set by DataType
         self.required = self.ALWAYS_REQUIRED or required
         self.default = self._validate(default) if default is not None else default
 
+        # reads of an unset attr get a copy of the default, so changes to it
+        # are never shared. immutable defaults aren't copied at all
+        self._newdefault = _copier(self.default) if self.default is not None else None
+
         # nested attributes
         self.attrdefs = {}
 
     def setname(self, name):
         self.name = name
 
+    def setindex(self, index):
+        self._index = index
+
     def set(self, instance, attrvalue):
         assert not (self.required and attrvalue is None), "required `%s` cannot be None" % self.name
         attrvalue = None if attrvalue is None else self._validate(attrvalue)
-        instance.__datadict__[self.name] = attrvalue
+        instance.__values__[self._index] = attrvalue
 
     def get(self, instance):
-        attrvalue = instance.__datadict__.get(self.name)
-        return attrvalue if attrvalue is not None else copy.deepcopy(self.default)
+        attrvalue = instance.__values__[self._index]
+        if attrvalue is None and self._newdefault:
+            return self._newdefault()
+        return attrvalue
 
     def __getattr__(self, attrname):
         if attrname in self.attrdefs:
@@ -71,6 +112,48 @@ class Attr(object):
     def _from_base_type(self, value):
         return value
 
+    def _overrides(self, methodname):
+        return getattr(type(self), methodname).im_func is not getattr(Attr, methodname).im_func
+
+    def _compileToBase(self):
+        # _to_base_type, or None when it leaves values as they are
+        return self._to_base_type if self._overrides('_to_base_type') else None
+
+    def _compileFromBase(self):
+        return self._from_base_type if self._overrides('_from_base_type') else None
+
+    def _mutable(self):
+        # whether values can be changed in place, rather than only replaced
+        return False
+
+    def _compileEncode(self):
+        # a function reading this attr's base type value (None when unset)
+        # off an instance, specialised on what the attr overrides
+        index, tobase = self._index, self._compileToBase()
+
+        if self._overrides('get'):
+            get = self.get
+        elif self.default is None:
+            get = lambda instance: instance.__values__[index]
+        else:
+            # the default is converted once, unset attrs get a copy of that
+            newbase = _copier(tobase(self.default) if tobase else self.default)
+            def encode(instance):
+                value = instance.__values__[index]
+                if value is None:
+                    return newbase()
+                return tobase(value) if tobase else value
+            return encode
+
+        if not tobase:
+            return get
+
+        def encode(instance):
+            value = get(instance)
+            return tobase(value) if value is not None else None
+        return encode
+
+
 class _NestedAttr(Attr):
 
     def __init__(self, attr, parentattr):
@@ -139,17 +222,23 @@ class RepeatedAttr(Attr):
     ALLOWS_REQUIRED = False
 
     def __init__(self, elemattr, required=False, **kwargs):
-        default = None if required else tuple()
-        super(RepeatedAttr, self).__init__(required=required, default=default, **kwargs)
-
+        # the element attr validates the default, so it's set up first
         assert isinstance(elemattr, Attr), "need element type for RepeatedAttr"
         self.elemattr = elemattr
+
+        default = None if required else tuple()
+        super(RepeatedAttr, self).__init__(required=required, default=default, **kwargs)
         self.elemattr.name = self.name
 
     def setname(self, name):
         super(RepeatedAttr, self).setname(name)
         self.elemattr.setname(name)
 
+    def setindex(self, index):
+        # the element attr reads the whole value, eg. for nested data attrs
+        super(RepeatedAttr, self).setindex(index)
+        self.elemattr.setindex(index)
+
     def _validate(self, value):
         assert isinstance(value, (list, tuple)), "value must be a list/tuple"
         assert not (self.required and not value), "required `%s` cannot be empty" % self.name
@@ -161,6 +250,17 @@ class RepeatedAttr(Attr):
     def _to_base_type(self, value):
         return map(self.elemattr._to_base_type, value)
 
+    def _compileToBase(self):
+        elemtobase = self.elemattr._compileToBase()
+        return (lambda value: map(elemtobase, value)) if elemtobase else list
+
+    def _compileFromBase(self):
+        elemfrombase = self.elemattr._compileFromBase()
+        return (lambda value: tuple(map(elemfrombase, value))) if elemfrombase else tuple
+
+    def _mutable(self):
+        return self.elemattr._mutable()
+
     def __getattr__(self, attrname):
         return getattr(self.elemattr, attrname)
 
@@ -168,6 +268,9 @@ class DictAttr(Attr):
     def _validate(self, value):
         return _castif(dict, value)
 
+    def _mutable(self):
+        return True
+
 class DateTimeAttr(Attr):
 
     _EPOCH = datetime.datetime.utcfromtimestamp(0)
@@ -190,9 +293,15 @@ class GidAttr(IntAttr):
 class LocalGidAttr(GidAttr):
     ALWAYS_REQUIRED = True
 
+    def get(self, instance):
+        return instance.__localgid__
+
 class RemoteGidAttr(GidAttr):
     ALWAYS_REQUIRED = True
 
+    def get(self, instance):
+        return instance.__remotegid__
+
 class PrimaryGidAttr(LocalGidAttr, RemoteGidAttr):
     ALWAYS_REQUIRED = True
 
@@ -205,8 +314,9 @@ class PrimaryKeyAttr(StringAttr):
 class LocalDataAttr(Attr):
 
     def __init__(self, nesteddatacls, **kwargs):
-        super(LocalDataAttr, self).__init__(**kwargs)
+        # the nested class validates the default, so it's set up first
         self.nesteddatacls = nesteddatacls
+        super(LocalDataAttr, self).__init__(**kwargs)
 
         for attrname, attrdef in nesteddatacls.__attrdefs__.iteritems():
             attrtype = type('NestedAttr', (attrdef.__class__,), dict(_NestedAttr.__dict__))
@@ -226,3 +336,14 @@ class LocalDataAttr(Attr):
 
     def _to_base_type(self, value):
         return value.dict(validate=True)
+
+    def _compileToBase(self):
+        todict = self.nesteddatacls.dict
+        return lambda value: todict(value, True)
+
+    def _compileFromBase(self):
+        # nested values go through the nested class's decode plan too
+        return self.nesteddatacls._fromDict
+
+    def _mutable(self):
+        return True
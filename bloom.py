@@ -0,0 +1,62 @@
+import os
+import math
+import struct
+import hashlib
+
+__all__ = ['BloomFilter']
+
+class BloomFilter(object):
+
+    # set membership with false positives but no false negatives, sized for
+    # capacity values at the given false positive rate
+
+    _header = struct.Struct('<4sQQQ')
+    _magic = 'BLM1'
+
+    def __init__(self, capacity, errorrate=0.01):
+        assert capacity > 0, "capacity must be positive"
+        assert 0 < errorrate < 1, "error rate must be between 0 and 1"
+
+        nbits = int(math.ceil(-capacity * math.log(errorrate) / math.log(2) ** 2))
+        self._nbits = max(8, (nbits + 7) // 8 * 8)
+        self._nhashes = max(1, int(round(float(self._nbits) / capacity * math.log(2))))
+        self._bits = bytearray(self._nbits // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        # k positions from two 64 bit hashes (Kirsch-Mitzenmacher)
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        hash1, hash2 = struct.unpack('<QQ', hashlib.md5(value).digest())
+        return [(hash1 + i * hash2) % self._nbits for i in xrange(self._nhashes)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+    def save(self, path):
+        # write and rename so readers never load a partial filter
+        tmppath = path + '.tmp'
+        with open(tmppath, 'wb') as f:
+            f.write(BloomFilter._header.pack(BloomFilter._magic, self._nbits, self._nhashes, self.count))
+            f.write(self._bits)
+        os.rename(tmppath, path)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            header = f.read(BloomFilter._header.size)
+            bits = bytearray(f.read())
+
+        magic, nbits, nhashes, count = BloomFilter._header.unpack(header)
+        assert magic == BloomFilter._magic, "`%s` is not a bloom filter" % path
+        assert len(bits) * 8 == nbits, "truncated bloom filter `%s`" % path
+
+        instance = BloomFilter.__new__(BloomFilter)
+        instance._nbits, instance._nhashes, instance._bits, instance.count = nbits, nhashes, bits, count
+        return instance
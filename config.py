@@ -6,4 +6,40 @@ class config(object):
         '127.0.0.1',
     ]
 
+    # read replicas per database host, reads outside of a lock are spread
+    # over these, eg. {'10.0.0.1': ['10.0.1.1', '10.0.2.1']}
+    DATABASE_REPLICAS = {}
+
+    # after a session writes to a host, its reads go to the primary for
+    # this many seconds so it sees its own writes
+    READ_YOUR_WRITES_WINDOW = 0
+
     DATABASE_NAME = 'datastore'
+
+    # collect wait/hold times for EdgeData.lock, see LockStats
+    LOCK_STATS_ENABLED = False
+
+    # log the holder's stack when a lock is held longer than this (seconds)
+    SLOW_LOCK_THRESHOLD = None
+
+    # worker threads (and so connections) per host serving async reads
+    # and parallel global queries
+    ASYNC_POOL_SIZE = 4
+
+    # data of classes using the compressed encoding is zlib compressed
+    # once encoded to at least this many bytes
+    COMPRESS_THRESHOLD = 512
+    COMPRESS_LEVEL = 6
+
+    # encoding (an index into EdgeData._encoders) that edges are saved with.
+    # only move it to a newer encoding once every reader can decode it
+    WRITE_ENCODING = 0
+
+    # index value format for indexes that don't set a version. version 2
+    # keeps numbers, floats and strings in order, version 1 does not
+    INDEX_VERSION = 1
+
+    # while moving indexes to another version, saves also write that
+    # version (queries keep using the current one) until migrate.py reindex
+    # has filled it in for existing edges
+    INDEX_SHADOW_VERSION = None
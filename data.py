@@ -2,8 +2,51 @@ import copy
 
 from attr import Attr
 
+class AttrDescriptor(object):
+
+    # instance access to an attr goes through its attrdef, class access
+    # returns the attrdef itself so it can be used in queries and indexes
+
+    __slots__ = ('attrdef',)
+
+    def __init__(self, attrdef):
+        self.attrdef = attrdef
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self.attrdef
+        return self.attrdef.get(instance)
+
+    def __set__(self, instance, attrvalue):
+        self.attrdef.set(instance, attrvalue)
+
+class ValueDescriptor(AttrDescriptor):
+
+    # attrs read straight from the instance's values
+
+    __slots__ = ('index', 'newdefault')
+
+    def __init__(self, attrdef):
+        super(ValueDescriptor, self).__init__(attrdef)
+        self.index = attrdef._index
+        self.newdefault = attrdef._newdefault
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self.attrdef
+        attrvalue = instance.__values__[self.index]
+        if attrvalue is None and self.newdefault:
+            return self.newdefault()
+        return attrvalue
+
 class DataType(type):
 
+    def __new__(cls, name, parents, attrs):
+        # instances keep their attr values in a list and have no __dict__,
+        # classes can still list slots of their own
+        attrs.setdefault('__slots__', ())
+        return super(DataType, cls).__new__(cls, name, parents, attrs)
+
     def __init__(self, name, parents, attrs):
         super(DataType, self).__init__(name, parents, attrs)
 
@@ -26,6 +69,50 @@ class DataType(type):
                 assert attrname not in attrdefs, "redefined attr `%s`" % attrname
                 attrdefs[attrdef.name] = attrdef
 
+        self._compileAttrs()
+
+    def _compileAttrs(self):
+        # each attr gets a fixed index into the instance's values and a
+        # descriptor reading and writing it
+        self.__attrnames__ = sorted(self.__attrdefs__)
+        for index, attrname in enumerate(self.__attrnames__):
+            attrdef = self.__attrdefs__[attrname]
+            attrdef.setindex(index)
+            setattr(self, attrname, self._makeDescriptor(attrdef))
+
+        self._compilePlans()
+
+    def _makeDescriptor(self, attrdef):
+        return AttrDescriptor(attrdef) if attrdef._overrides('get') else ValueDescriptor(attrdef)
+
+    def _compilePlans(self):
+        # per attr steps run by dict and _fromBaseTypes in place of generic
+        # attrdef calls, attrs without a base type conversion aren't decoded
+        self.__encodeplan__ = [
+            (attrname, self.__attrdefs__[attrname]._compileEncode(), self.__attrdefs__[attrname].required)
+            for attrname in self.__attrnames__]
+
+        self.__decodeplan__ = []
+        for index, attrname in enumerate(self.__attrnames__):
+            frombase = self.__attrdefs__[attrname]._compileFromBase()
+            if frombase:
+                self.__decodeplan__.append((index, frombase))
+
+    def _fromBaseTypes(self, datadict):
+        # the values of a decoded data dict, attrs the class doesn't have
+        # are dropped
+        values = map(datadict.get, self.__attrnames__)
+        for index, frombase in self.__decodeplan__:
+            attrvalue = values[index]
+            if attrvalue is not None:
+                values[index] = frombase(attrvalue)
+        return values
+
+    def _fromDict(self, datadict):
+        instance = self.__new__(self)
+        instance.__values__ = self._fromBaseTypes(datadict)
+        return instance
+
     def __getattr__(self, attrname):
         if attrname in self.__attrdefs__:
             return self.__attrdefs__[attrname]
@@ -36,38 +123,26 @@ class Data(object):
 
     __metaclass__ = DataType
 
+    __slots__ = ('__values__',)
+
     def __init__(self, **attrs):
         self.initialize()
         self.populate(attrs)
 
     def initialize(self):
-        self.__datadict__ = {}
+        self.__values__ = [None] * len(self.__attrnames__)
 
     def populate(self, attrsdict):
         for attrname, attrvalue in attrsdict.iteritems():
             setattr(self, attrname, attrvalue)
 
-    def __setattr__(self, attrname, attrvalue):
-        attrdef = self.__attrdefs__.get(attrname)
-        if attrdef:
-            attrdef.set(self, attrvalue)
-        else:
-            super(Data, self).__setattr__(attrname, attrvalue)
-
-    def __getattr__(self, attrname):
-        attrdef = self.__attrdefs__.get(attrname)
-        if attrdef:
-            return attrdef.get(self)
-
-        raise AttributeError('%s has no attr `%s`' % (self, attrname))
-
     def dict(self, validate=False):
         attrsdict = {}
-        for attrname, attrdef in self.__attrdefs__.iteritems():
-            attrvalue = attrdef.get(self)
+        for attrname, encode, required in self.__encodeplan__:
+            attrvalue = encode(self)
             if attrvalue is not None:
-                attrsdict[attrname] = attrdef._to_base_type(attrvalue)
-            elif validate and attrdef.required:
+                attrsdict[attrname] = attrvalue
+            elif validate and required:
                 assert 0, "attr `{}` is required".format(attrname)
         return attrsdict
 
@@ -1,9 +1,17 @@
+import time
+import zlib
+import struct
+import bisect
 import random
 import heapq
+import threading
 
-from itertools import chain
+from itertools import chain, islice
+from collections import defaultdict
 from db import DB
 from config import config
+from session import Session
+from executor import Future, Executor
 from contextlib import contextmanager
 
 class DataStore(object):
@@ -14,6 +22,10 @@ class DataStore(object):
 
     _instances = {}
 
+    # worker pools per host index, shared by all sessions
+    _executors = {}
+    _executorsMutex = threading.Lock()
+
     @staticmethod
     def getInstance(dbname=config.DATABASE_NAME):
         instance =  DataStore._instances.get(dbname)
@@ -23,10 +35,14 @@ class DataStore(object):
 
     def __init__(self, dbname):
         self._dbname = dbname
-        self._shards = {}
-        self._locked_colos = set()
-        self.lastAddWasOverwrite = False
-        self.definitionsDB = DB.getInstance(config.DEFINITIONS_HOST, self._dbname)
+
+    @property
+    def definitionsDB(self):
+        return DB.getInstance(config.DEFINITIONS_HOST, self._dbname)
+
+    @property
+    def lastAddWasOverwrite(self):
+        return Session.current().lastAddWasOverwrite
 
     def colo(self, gid):
         return gid >> 32
@@ -42,30 +58,187 @@ class DataStore(object):
     def add(self, edgetype, gid1, gid2, encoding, data, indices=[], overwrite=False):
         shard = self._getShard(gid1)
         edge = shard.add(edgetype, gid1, gid2, encoding, data, indices, overwrite)
-        self.lastAddWasOverwrite = shard.lastAddWasOverwrite
+        Session.current().lastAddWasOverwrite = shard.lastAddWasOverwrite
+        self._setWriteTime(self._getColoHost(self.colo(gid1)))
         return edge
 
     def delete(self, edgetype, gid1, gid2, indextypes=[]):
+        self._setWriteTime(self._getColoHost(self.colo(gid1)))
         return self._getShard(gid1).delete(edgetype, gid1, gid2, indextypes)
 
-    def query(self, edgetype, index=None, gid1=None, colo=None):
-        assert not (gid1 and colo), "cannot query with both parent gid and colo"
+    # inverse edges live on the shard of gid2
+
+    def addInverse(self, edgetype, gid1, gid2):
+        self._setWriteTime(self._getColoHost(self.colo(gid2)))
+        return self._getShard(gid2).addInverse(edgetype, gid1, gid2)
+
+    def deleteInverse(self, edgetype, gid1, gid2):
+        self._setWriteTime(self._getColoHost(self.colo(gid2)))
+        return self._getShard(gid2).deleteInverse(edgetype, gid1, gid2)
+
+    def queryInverse(self, edgetype, gid2, replica=False):
+        return self._getShard(gid2, replica).queryInverse(edgetype, gid2)
+
+    @staticmethod
+    def setPacked(edgetype, encoding, data):
+        # edges of the edgetype are stored in gid2 blocks, and read back as
+        # edges with this (data less) encoded data
+        DataStoreShard._packedEdges[edgetype] = (encoding, data)
+
+    def listPacked(self, edgetype, gid1, after=0, limit=None, replica=False):
+        return self._getShard(gid1, replica).listPacked(edgetype, gid1, after, limit)
+
+    def query(self, edgetype, index=None, gid1=None, colo=None, replica=False):
+        assert not (gid1 and colo) or colo == self.colo(gid1), "conflicting parent gid and colo"
+
+        if colo or gid1:
+            colo = colo or self.colo(gid1)
+            return self._getColoShard(colo, replica).query(edgetype, index, gid1)
+
+        if self._NUM_HOSTS == 1:
+            return self._getHostShard(0, replica).query(edgetype, index, None)
+
+        # query all hosts in parallel
+        return self.queryAsync(edgetype, index, replica=replica).result()
+
+    def queryAsync(self, edgetype, index=None, gid1=None, colo=None, replica=False):
+        assert not (gid1 and colo) or colo == self.colo(gid1), "conflicting parent gid and colo"
 
         if colo or gid1:
             colo = colo or self.colo(gid1)
-            return self._getColoShard(colo).query(edgetype, index, gid1)
+            hostindex = self._getColoHost(colo)
+            host = self._getHost(hostindex, replica)
+            return self._submit(hostindex, self._queryHost, host, edgetype, index, gid1)
 
-        results = [
-            self._getHostShard(hostindex).query(edgetype, index, None)
+        futures = [
+            self._submit(
+                hostindex, self._queryHost, self._getHost(hostindex, replica), edgetype, index, None)
             for hostindex in range(self._NUM_HOSTS)]
 
-        return list(heapq.merge(*results))
+        return Future.gather(futures).then(lambda results: list(heapq.merge(*results)))
 
-    def get(self, edgetype, gid1, gid2, index=None):
-        return self._getShard(gid1).get(edgetype, gid1, gid2, index)
+    def queryIndex(self, index, gid1=None, colo=None, replica=False):
+        assert not (gid1 and colo) or colo == self.colo(gid1), "conflicting parent gid and colo"
 
-    def count(self, edgetype, gid1):
-        return self._getShard(gid1).count(edgetype, gid1)
+        if colo or gid1:
+            colo = colo or self.colo(gid1)
+            return self._getColoShard(colo, replica).queryIndex(index, gid1)
+
+        if self._NUM_HOSTS == 1:
+            return self._getHostShard(0, replica).queryIndex(index, None)
+
+        # query all hosts in parallel
+        futures = [
+            self._submit(
+                hostindex, self._queryIndexHost, self._getHost(hostindex, replica), index)
+            for hostindex in range(self._NUM_HOSTS)]
+
+        return list(heapq.merge(*Future.gather(futures).result()))
+
+    def iter(self, edgetype, index=None, gid1=None, colo=None, batch_size=1000, replica=False):
+        assert not (gid1 and colo) or colo == self.colo(gid1), "conflicting parent gid and colo"
+
+        if colo or gid1:
+            colo = colo or self.colo(gid1)
+            return self._getColoShard(colo, replica).iter(edgetype, index, gid1, batch_size)
+
+        # hosts are streamed side by side and merged lazily
+        return heapq.merge(*[
+            self._getHostShard(hostindex, replica).iter(edgetype, index, None, batch_size)
+            for hostindex in range(self._NUM_HOSTS)])
+
+    def get(self, edgetype, gid1, gid2, index=None, replica=False):
+        return self._getShard(gid1, replica).get(edgetype, gid1, gid2, index)
+
+    def queryShard(self, hostindex, edgetype, index, limit=None):
+        # a global index query on one host, for jobs working host by host
+        return self._getHostShard(hostindex).query(edgetype, index, None, limit)
+
+    def deleteRevisions(self, hostindex, edgetype, edges, indextypes=[]):
+        self._setWriteTime(hostindex)
+        return self._getHostShard(hostindex).deleteRevisions(edgetype, edges, indextypes)
+
+    def getAsync(self, edgetype, gid1, gid2, replica=False):
+        hostindex = self._getColoHost(self.colo(gid1))
+        host = self._getHost(hostindex, replica)
+        return self._submit(hostindex, self._getOnHost, host, edgetype, gid1, gid2)
+
+    def getMulti(self, edgetype, gidpairs, replica=False):
+        hostpairs = defaultdict(list)
+        for gid1, gid2 in gidpairs:
+            hostpairs[self._getColoHost(self.colo(gid1))].append((gid1, gid2))
+
+        # inside a lock reads have to use the locked connections, otherwise
+        # hosts are read in parallel
+        if len(hostpairs) <= 1 or Session.current().storeLockedColos:
+            return list(chain.from_iterable(
+                self._getHostShard(hostindex, replica).getMulti(edgetype, pairs)
+                for hostindex, pairs in hostpairs.iteritems()))
+
+        futures = [
+            self._submit(
+                hostindex, self._getMultiOnHost, self._getHost(hostindex, replica), edgetype, pairs)
+            for hostindex, pairs in hostpairs.iteritems()]
+
+        return list(chain.from_iterable(Future.gather(futures).result()))
+
+    def _queryHost(self, host, edgetype, index, gid1):
+        return self._getDBShard(host).query(edgetype, index, gid1)
+
+    def _queryIndexHost(self, host, index):
+        return self._getDBShard(host).queryIndex(index, None)
+
+    def _getOnHost(self, host, edgetype, gid1, gid2):
+        return self._getDBShard(host).get(edgetype, gid1, gid2)
+
+    def _getMultiOnHost(self, host, edgetype, gidpairs):
+        return self._getDBShard(host).getMulti(edgetype, gidpairs)
+
+    def _submit(self, hostindex, func, *args):
+        # runs func on one of the host's worker threads, each worker has
+        # its own session and so its own connection, making the pool
+        # a connection pool for the host
+        executor = DataStore._executors.get(hostindex)
+        if not executor:
+            with DataStore._executorsMutex:
+                executor = DataStore._executors.get(hostindex)
+                if not executor:
+                    executor = Executor(config.ASYNC_POOL_SIZE)
+                    DataStore._executors[hostindex] = executor
+
+        return executor.submit(func, *args)
+
+    def count(self, edgetype, gid1, replica=False):
+        return self._getShard(gid1, replica).count(edgetype, gid1)
+
+    def scan(self, hostindex, start, limit, edgetype=None):
+        return self._getHostShard(hostindex).scan(start, limit, edgetype)
+
+    def reencode(self, hostindex, edges):
+        self._setWriteTime(hostindex)
+        return self._getHostShard(hostindex).reencode(edges)
+
+    def reindex(self, hostindex, edges):
+        self._setWriteTime(hostindex)
+        return self._getHostShard(hostindex).reindex(edges)
+
+    def dropIndex(self, hostindex, indextype, limit):
+        self._setWriteTime(hostindex)
+        return self._getHostShard(hostindex).dropIndex(indextype, limit)
+
+    def iterIndex(self, indextype, batch_size=1000, replica=True):
+        # index values of every host, one host after the other
+        return chain.from_iterable(
+            self._getHostShard(hostindex, replica).iterIndex(indextype, batch_size)
+            for hostindex in range(self._NUM_HOSTS))
+
+    def replicationLag(self, hostindex):
+        # seconds the most lagging replica of the host is behind, None if
+        # one of them isn't replicating
+        lags = [
+            self._getDBShard(replica).replicationLag()
+            for replica in config.DATABASE_REPLICAS.get(config.DATABASE_HOSTS[hostindex], [])]
+        return None if None in lags else max(lags or [0])
 
     def insideLock(self):
         return len(self._locks)
@@ -74,33 +247,71 @@ class DataStore(object):
         return (edgetype, gid1) in self._locks
 
     @contextmanager
-    def lock(self, colo):
-        if colo in self._locked_colos:
+    def lock(self, colo, timer=None):
+        locked_colos = Session.current().storeLockedColos
+        if (self._dbname, colo) in locked_colos:
             # nested locks are noops
             yield
             return
 
+        shard = self._getColoShard(colo)
+        statements = None
+
         try:
-            self._locked_colos.add(colo)
-            shard = self._getColoShard(colo)
+            locked_colos.add((self._dbname, colo))
             with shard.transaction():
-                yield shard.lock(colo)
+                timer and timer.request(colo)
+                counter = shard.lock(colo)
+                statements = shard.getStatementCount()
+                timer and timer.acquire(colo)
+                yield counter
         finally:
-            self._locked_colos.remove(colo)
+            locked_colos.remove((self._dbname, colo))
 
-    def _getShard(self, gid):
-        return self._getColoShard(self.colo(gid))
+            # changes under the lock are only visible on replicas after the commit
+            self._setWriteTime(self._getColoHost(colo))
 
-    def _getColoShard(self, colo):
-        return self._getHostShard(colo % self._NUM_HOSTS)
+            # hold time includes the commit or rollback of the transaction
+            if timer and statements is not None:
+                timer.release(colo, shard, shard.getStatementCount() - statements)
 
-    def _getHostShard(self, hostindex):
-        db = DB.getInstance(config.DATABASE_HOSTS[hostindex], self._dbname)
-        shard = self._shards.get(db)
+    def _getShard(self, gid, replica=False):
+        return self._getColoShard(self.colo(gid), replica)
+
+    def _getColoShard(self, colo, replica=False):
+        return self._getHostShard(self._getColoHost(colo), replica)
+
+    def _getColoHost(self, colo):
+        return colo % self._NUM_HOSTS
+
+    def _getHostShard(self, hostindex, replica=False):
+        return self._getDBShard(self._getHost(hostindex, replica))
+
+    def _getHost(self, hostindex, replica=False):
+        host = config.DATABASE_HOSTS[hostindex]
+        replicas = replica and config.DATABASE_REPLICAS.get(host)
+        if not replicas:
+            return host
+
+        # read your own writes from the primary until they have replicated
+        writetime = Session.current().writeTimes.get((self._dbname, hostindex))
+        if writetime and time.time() - writetime < config.READ_YOUR_WRITES_WINDOW:
+            return host
+
+        return random.choice(replicas)
+
+    def _getDBShard(self, host):
+        db = DB.getInstance(host, self._dbname)
+        shards = Session.current().shards
+        shard = shards.get(db)
         if not shard:
-            shard = self._shards[db] = DataStoreShard(db)
+            shard = shards[db] = DataStoreShard(db)
         return shard
 
+    def _setWriteTime(self, hostindex):
+        if config.READ_YOUR_WRITES_WINDOW:
+            Session.current().writeTimes[(self._dbname, hostindex)] = time.time()
+
     _addDefinitionSQL = """
         INSERT INTO definitions
         (`name`, `typeid`)
@@ -120,7 +331,8 @@ class DataStore(object):
         return self.definitionsDB.getLastInsertID()
 
     def getDefinitionType(self, name):
-        return self.definitionsDB.getOne(self.getDefinitionSQL, name)
+        row = self.definitionsDB.getOne(self._getDefinitionSQL, (name,))
+        return row[0] if row else None
 
 class DataStoreShard(object):
 
@@ -173,11 +385,14 @@ class DataStoreShard(object):
 
     _addIndexSQL = """
       INSERT INTO edgeindex
-      (indextype, indexvalue, gid1, revision)
-      VALUES (%s, _binary %s, %s, %s)
+      (indextype, indexvalue, gid1, revision, payload)
+      VALUES (%s, _binary %s, %s, %s, %s)
     """
 
     def add(self, edgetype, gid1, gid2, encoding, data, indices=[], overwrite=False):
+        if edgetype in DataStoreShard._packedEdges:
+            return self._addPacked(edgetype, gid1, gid2)
+
         with self._db.transaction():
 
             # get new revision
@@ -187,6 +402,7 @@ class DataStoreShard(object):
 
             add_sql = DataStoreShard._addOverwriteSQL if overwrite else DataStoreShard._addSQL
             self._db.run(add_sql, edgeargs)
+            self.lastAddWasOverwrite = False
 
             affected_rows = self._db.getAffectedRows()
             prev_revision = self._db.getLastInsertID()
@@ -199,7 +415,7 @@ class DataStoreShard(object):
                 self.lastAddWasOverwrite = True
                 assert prev_revision == (revision - 1), "data changed during update"
 
-            for indextype, indexvalue, unique in indices:
+            for indextype, indexvalue, unique, payload in indices:
 
                 # if the edge already existed, delete old indices
                 if affected_rows == 2:
@@ -209,7 +425,7 @@ class DataStoreShard(object):
                     count = self._db.getOne(DataStoreShard._uniqueIndexSQL, (indextype, indexvalue))
                     assert not count[0], "edge violates index uniqueness"
 
-                self._db.run(DataStoreShard._addIndexSQL, (indextype, indexvalue, gid1, revision))
+                self._db.run(DataStoreShard._addIndexSQL, (indextype, indexvalue, gid1, revision, payload))
 
             return edgedata
 
@@ -224,6 +440,9 @@ class DataStoreShard(object):
     _lastInsertIDSQL = "SELECT LAST_INSERT_ID()"
 
     def delete(self, edgetype, gid1, gid2, indextypes=[]):
+        if edgetype in DataStoreShard._packedEdges:
+            return self._deletePacked(edgetype, gid1, gid2)
+
         with self._db.transaction():
 
             # increment revision since we are making a change
@@ -245,6 +464,63 @@ class DataStoreShard(object):
 
             return (affected_rows == 1)
 
+    _deleteRevisionSQL = """
+      DELETE FROM edgedata
+      WHERE edgetype = %s
+        AND gid1 = %s
+        AND gid2 = %s
+        AND revision = %s
+    """
+
+    def deleteRevisions(self, edgetype, edges, indextypes=[]):
+        # edges are (gid1, gid2, revision) and are only deleted while they
+        # still have that revision, along with their index rows and count
+        deleted = []
+        with self._db.transaction():
+            for gid1, gid2, revision in edges:
+                self._db.run(DataStoreShard._deleteRevisionSQL, (edgetype, gid1, gid2, revision))
+                if not self._db.getAffectedRows():
+                    continue
+
+                self._incrementRevision(edgetype, gid1)
+                self._incrementCount(edgetype, gid1, -1)
+                for indextype in indextypes:
+                    self._db.run(DataStoreShard._deleteIndexSQL, (indextype, gid1, revision))
+                deleted.append((gid1, gid2))
+
+        return deleted
+
+    _addInverseSQL = """
+      INSERT IGNORE INTO edgeinverse
+      (edgetype, gid2, gid1)
+      VALUES (%s, %s, %s)
+    """
+
+    _deleteInverseSQL = """
+      DELETE FROM edgeinverse
+      WHERE edgetype = %s
+        AND gid2 = %s
+        AND gid1 = %s
+    """
+
+    _queryInverseSQL = """
+      SELECT gid1
+      FROM edgeinverse
+      WHERE edgetype = %s
+        AND gid2 = %s
+      ORDER BY gid1
+    """
+
+    def addInverse(self, edgetype, gid1, gid2):
+        self._db.run(DataStoreShard._addInverseSQL, (edgetype, gid2, gid1))
+        return self._db.getAffectedRows()
+
+    def deleteInverse(self, edgetype, gid1, gid2):
+        self._db.run(DataStoreShard._deleteInverseSQL, (edgetype, gid2, gid1))
+        return self._db.getAffectedRows()
+
+    def queryInverse(self, edgetype, gid2):
+        return [row[0] for row in self._db.get(DataStoreShard._queryInverseSQL, (edgetype, gid2))]
 
     _listSQL = """
       SELECT edgetype, 0, revision, gid1, gid2, encoding, data
@@ -270,7 +546,41 @@ class DataStoreShard(object):
       ORDER BY edgeindex.indexvalue, edgeindex.revision DESC
     """
 
-    def query(self, edge_type, index, gid1=None):
+    def query(self, edge_type, index, gid1=None, limit=None):
+        if edge_type in DataStoreShard._packedEdges:
+            return self.listPacked(edge_type, gid1, 0, limit)
+
+        query, args = self._queryArgs(edge_type, index, gid1)
+        if limit:
+            query, args = query + 'LIMIT %s', args + (limit,)
+        return self._db.get(query, args)
+
+    def iter(self, edge_type, index, gid1=None, batch_size=1000):
+        if edge_type in DataStoreShard._packedEdges:
+            return self._iterPacked(edge_type, gid1)
+
+        query, args = self._queryArgs(edge_type, index, gid1)
+        return self._db.iter(query, args, batch_size)
+
+    _queryIndexSQL = """
+      SELECT indexvalue, revision, gid1, payload
+      FROM edgeindex
+      WHERE indextype = %s
+        AND indexvalue > _binary %s AND indexvalue < _binary %s
+        {}
+      ORDER BY indexvalue, revision DESC
+    """
+
+    def queryIndex(self, index, gid1=None):
+        # covering index rows only, without the join into edgedata
+        indextype, indexstart, indexend = index
+        if gid1:
+            query = DataStoreShard._queryIndexSQL.format('AND gid1 = %s')
+            return self._db.get(query, (indextype, indexstart, indexend, gid1))
+        query = DataStoreShard._queryIndexSQL.format('')
+        return self._db.get(query, (indextype, indexstart, indexend))
+
+    def _queryArgs(self, edge_type, index, gid1):
         if gid1 and not index:
             query = DataStoreShard._listSQL
             args = (edge_type, gid1)
@@ -283,7 +593,7 @@ class DataStoreShard(object):
             query = DataStoreShard._querySQL.format('edgeindex.gid1')
             args = (edge_type, indextype, indexstart, indexend)
 
-        return self._db.get(query, args)
+        return query, args
 
     _getSQL = """
       SELECT edgetype, '', revision, gid1, gid2, encoding, data
@@ -312,6 +622,9 @@ class DataStoreShard(object):
     """
 
     def get(self, edge_type, gid1, gid2, index=None):
+        if edge_type in DataStoreShard._packedEdges:
+            return self._getPacked(edge_type, gid1, gid2)
+
         if index:
             indextype, indexstart, indexend = indexrange
             query = DataStoreShard._getIndexSQL
@@ -322,6 +635,175 @@ class DataStoreShard(object):
 
         return self._db.getOne(query, args)
 
+    _getMultiSQL = """
+      SELECT edgetype, '', revision, gid1, gid2, encoding, data
+      FROM edgedata
+      WHERE edgetype = %s
+        AND (gid1, gid2) IN ({})
+    """
+
+    _getMultiBatchSize = 500
+
+    def getMulti(self, edgetype, gidpairs):
+        gidpairs = list(set(gidpairs))
+        if edgetype in DataStoreShard._packedEdges:
+            return filter(None, [self._getPacked(edgetype, gid1, gid2) for gid1, gid2 in gidpairs])
+
+        edgedatas = []
+
+        for start in range(0, len(gidpairs), DataStoreShard._getMultiBatchSize):
+            pairs = sorted(gidpairs[start:start + DataStoreShard._getMultiBatchSize])
+            query = DataStoreShard._getMultiSQL.format(', '.join(['(%s, %s)'] * len(pairs)))
+            edgedatas.extend(self._db.get(query, [edgetype] + list(chain.from_iterable(pairs))))
+
+        return edgedatas
+
+    # packed edgetypes keep the sorted gid2s of a gid1 in blocks of up to
+    # _packedBlockSize gids, stored as zlib compressed deltas. the edges
+    # have no data, so they all read back with the same encoded data
+
+    _packedEdges = {}
+    _packedBlockSize = 1024
+    _packedBlocksPerRead = 16
+
+    _packedBlockSQL = """
+      SELECT start, data
+      FROM edgeblock
+      WHERE edgetype = %s
+        AND gid1 = %s
+        AND start <= %s
+      ORDER BY start DESC
+      LIMIT 1
+      {}
+    """
+
+    _packedFirstBlockSQL = """
+      SELECT start, data
+      FROM edgeblock
+      WHERE edgetype = %s
+        AND gid1 = %s
+      ORDER BY start
+      LIMIT 1
+      {}
+    """
+
+    _packedBlocksSQL = """
+      SELECT start, data
+      FROM edgeblock
+      WHERE edgetype = %s
+        AND gid1 = %s
+        AND start > %s
+      ORDER BY start
+      LIMIT %s
+    """
+
+    _addPackedBlockSQL = """
+      INSERT INTO edgeblock
+      (edgetype, gid1, start, data)
+      VALUES (%s, %s, %s, %s)
+    """
+
+    _deletePackedBlockSQL = """
+      DELETE FROM edgeblock
+      WHERE edgetype = %s
+        AND gid1 = %s
+        AND start = %s
+    """
+
+    @staticmethod
+    def _packGids(gids):
+        deltas = [gids[0]] + [gid - prev for prev, gid in zip(gids, gids[1:])]
+        return zlib.compress(struct.pack('<%dQ' % len(deltas), *deltas))
+
+    @staticmethod
+    def _unpackGids(data):
+        data = zlib.decompress(data)
+        gids, gid = [], 0
+        for delta in struct.unpack('<%dQ' % (len(data) // 8), data):
+            gid += delta
+            gids.append(gid)
+        return gids
+
+    def _packedEdge(self, edgetype, gid1, gid2, revision=1):
+        encoding, data = DataStoreShard._packedEdges[edgetype]
+        return (edgetype, 0, revision, gid1, gid2, encoding, data)
+
+    def _packedBlock(self, edgetype, gid1, gid2, lock=False):
+        # the block gid2 is or belongs in, gids before every block go in the
+        # first one. returns its start (None without blocks) and gids
+        suffix = 'FOR UPDATE' if lock else ''
+        row = (
+            self._db.getOne(DataStoreShard._packedBlockSQL.format(suffix), (edgetype, gid1, gid2)) or
+            self._db.getOne(DataStoreShard._packedFirstBlockSQL.format(suffix), (edgetype, gid1)))
+        if not row:
+            return None, []
+        return row[0], DataStoreShard._unpackGids(row[1])
+
+    def _writePackedBlock(self, edgetype, gid1, start, gids):
+        # replaces the block at start, a block over the size limit is split
+        # in two and an empty one is dropped
+        if start is not None:
+            self._db.run(DataStoreShard._deletePackedBlockSQL, (edgetype, gid1, start))
+
+        blocks = [gids] if len(gids) <= DataStoreShard._packedBlockSize else [
+            gids[:len(gids) // 2], gids[len(gids) // 2:]]
+        for block in filter(None, blocks):
+            self._db.run(
+                DataStoreShard._addPackedBlockSQL,
+                (edgetype, gid1, block[0], DataStoreShard._packGids(block)))
+
+    def _addPacked(self, edgetype, gid1, gid2):
+        with self._db.transaction():
+            revision = self._incrementRevision(edgetype, gid1)
+            start, gids = self._packedBlock(edgetype, gid1, gid2, lock=True)
+
+            position = bisect.bisect_left(gids, gid2)
+            self.lastAddWasOverwrite = position < len(gids) and gids[position] == gid2
+            if not self.lastAddWasOverwrite:
+                gids.insert(position, gid2)
+                self._writePackedBlock(edgetype, gid1, start, gids)
+                self._incrementCount(edgetype, gid1)
+
+            return self._packedEdge(edgetype, gid1, gid2, revision)
+
+    def _deletePacked(self, edgetype, gid1, gid2):
+        with self._db.transaction():
+            self._incrementRevision(edgetype, gid1)
+            start, gids = self._packedBlock(edgetype, gid1, gid2, lock=True)
+
+            position = bisect.bisect_left(gids, gid2)
+            if position == len(gids) or gids[position] != gid2:
+                return False
+
+            del gids[position]
+            self._writePackedBlock(edgetype, gid1, start, gids)
+            self._incrementCount(edgetype, gid1, -1)
+            return True
+
+    def _getPacked(self, edgetype, gid1, gid2):
+        start, gids = self._packedBlock(edgetype, gid1, gid2)
+        position = bisect.bisect_left(gids, gid2)
+        if position < len(gids) and gids[position] == gid2:
+            return self._packedEdge(edgetype, gid1, gid2)
+
+    def _iterPacked(self, edgetype, gid1, after=0):
+        # edges in gid2 order, from the block holding after onwards
+        start, gids = self._packedBlock(edgetype, gid1, after)
+        for gid2 in gids[bisect.bisect_right(gids, after):]:
+            yield self._packedEdge(edgetype, gid1, gid2)
+
+        while start is not None:
+            rows = self._db.get(
+                DataStoreShard._packedBlocksSQL,
+                (edgetype, gid1, start, DataStoreShard._packedBlocksPerRead))
+            for start, data in rows:
+                for gid2 in DataStoreShard._unpackGids(data):
+                    yield self._packedEdge(edgetype, gid1, gid2)
+            if len(rows) < DataStoreShard._packedBlocksPerRead:
+                break
+
+    def listPacked(self, edgetype, gid1, after=0, limit=None):
+        return list(islice(self._iterPacked(edgetype, gid1, after), limit))
 
     _countSQL = """
       SELECT `count` from edgemeta
@@ -332,6 +814,112 @@ class DataStoreShard(object):
         row = self._db.getOne(DataStoreShard._countSQL, (edgetype, gid1))
         return row[0] if row else 0
 
+    _scanSQL = """
+      SELECT edgetype, 0, revision, gid1, gid2, encoding, data
+      FROM edgedata
+      WHERE edgetype > %s
+         OR (edgetype = %s AND gid1 > %s)
+         OR (edgetype = %s AND gid1 = %s AND revision > %s)
+      ORDER BY edgetype, gid1, revision
+      LIMIT %s
+    """
+
+    _scanEdgeTypeSQL = """
+      SELECT edgetype, 0, revision, gid1, gid2, encoding, data
+      FROM edgedata
+      WHERE edgetype = %s
+        AND (gid1 > %s OR (gid1 = %s AND revision > %s))
+      ORDER BY edgetype, gid1, revision
+      LIMIT %s
+    """
+
+    def scan(self, start, limit, edgetype=None):
+        # walks edgedata in primary key order from the (edgetype, gid1, revision)
+        # after start, so every batch is a short range read
+        startedgetype, startgid1, startrevision = start
+        if edgetype is not None:
+            if edgetype < startedgetype:
+                return ()
+            if edgetype > startedgetype:
+                startgid1, startrevision = 0, 0
+            args = (edgetype, startgid1, startgid1, startrevision, limit)
+            return self._db.get(DataStoreShard._scanEdgeTypeSQL, args)
+
+        args = (
+            startedgetype, startedgetype, startgid1,
+            startedgetype, startgid1, startrevision, limit)
+        return self._db.get(DataStoreShard._scanSQL, args)
+
+    _reencodeSQL = """
+      UPDATE edgedata
+      SET encoding = %s, data = %s
+      WHERE edgetype = %s
+        AND gid1 = %s
+        AND revision = %s
+        AND encoding = %s
+    """
+
+    def reencode(self, edges):
+        # edges are (edgetype, gid1, revision, oldencoding, encoding, data).
+        # the revision is kept since the data doesn't change, and edges
+        # rewritten since they were read are left alone
+        updated = 0
+        with self._db.transaction():
+            for edgetype, gid1, revision, oldencoding, encoding, data in edges:
+                self._db.run(
+                    DataStoreShard._reencodeSQL,
+                    (encoding, data, edgetype, gid1, revision, oldencoding))
+                updated += self._db.getAffectedRows()
+        return updated
+
+    _reindexSQL = """
+      INSERT IGNORE INTO edgeindex
+      (indextype, indexvalue, gid1, revision, payload)
+      SELECT %s, _binary %s, gid1, revision, %s
+      FROM edgedata
+      WHERE edgetype = %s
+        AND gid1 = %s
+        AND revision = %s
+    """
+
+    def reindex(self, edges):
+        # edges are (edgetype, gid1, revision, [(indextype, indexvalue, payload)]).
+        # index values are only added while the edge still has the revision
+        # they were computed from, and adding them again is a noop
+        added = 0
+        with self._db.transaction():
+            for edgetype, gid1, revision, indices in edges:
+                for indextype, indexvalue, payload in indices:
+                    self._db.run(
+                        DataStoreShard._reindexSQL,
+                        (indextype, indexvalue, payload, edgetype, gid1, revision))
+                    added += self._db.getAffectedRows()
+        return added
+
+    _dropIndexSQL = """
+      DELETE FROM edgeindex
+      WHERE indextype = %s
+      LIMIT %s
+    """
+
+    def dropIndex(self, indextype, limit):
+        self._db.run(DataStoreShard._dropIndexSQL, (indextype, limit))
+        return self._db.getAffectedRows()
+
+    _iterIndexSQL = """
+      SELECT indexvalue
+      FROM edgeindex
+      WHERE indextype = %s
+    """
+
+    def iterIndex(self, indextype, batch_size=1000):
+        for row in self._db.iter(DataStoreShard._iterIndexSQL, (indextype,), batch_size):
+            yield row[0]
+
+    def replicationLag(self):
+        status = self._db.getOneDict("SHOW SLAVE STATUS")
+        return status['Seconds_Behind_Master'] if status else 0
+
     def lock(self, colo):
         assert self._db.hasOngoingTransaction()
         return self.generateGid(colo, start=0)
@@ -339,6 +927,9 @@ class DataStoreShard(object):
     def transaction(self):
         return self._db.transaction()
 
+    def getStatementCount(self):
+        return self._db.getStatementCount()
+
     _incrementRevisionSQL = """
         INSERT INTO edgemeta
         (edgetype, gid1, revision, count)
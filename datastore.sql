@@ -57,7 +57,7 @@ CREATE TABLE `edgedata` (
   `gid2` bigint(20) unsigned NOT NULL DEFAULT '0',
   `revision` int(11) unsigned NOT NULL DEFAULT '0',
   `encoding` tinyint(3) unsigned NOT NULL DEFAULT '0',
-  `data` blob,
+  `data` mediumblob,
   PRIMARY KEY (`edgetype`,`gid1`,`revision`),
   UNIQUE KEY `edge` (`edgetype`,`gid1`,`gid2`) USING HASH
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8 COLLATE=utf8_unicode_ci;
@@ -75,11 +75,43 @@ CREATE TABLE `edgeindex` (
   `indexvalue` varbinary(767) NOT NULL DEFAULT '',
   `gid1` bigint(20) unsigned NOT NULL DEFAULT '0',
   `revision` int(11) unsigned NOT NULL DEFAULT '0',
+  `payload` blob,
   PRIMARY KEY (`indextype`,`indexvalue`,`gid1`,`revision`),
   KEY `edge` (`indextype`,`gid1`,`revision`) USING HASH
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8 COLLATE=utf8_unicode_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
+--
+-- Table structure for table `edgeblock`
+--
+
+DROP TABLE IF EXISTS `edgeblock`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8 */;
+CREATE TABLE `edgeblock` (
+  `edgetype` int(11) unsigned NOT NULL DEFAULT '0',
+  `gid1` bigint(20) unsigned NOT NULL DEFAULT '0',
+  `start` bigint(20) unsigned NOT NULL DEFAULT '0',
+  `data` blob,
+  PRIMARY KEY (`edgetype`,`gid1`,`start`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8 COLLATE=utf8_unicode_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Table structure for table `edgeinverse`
+--
+
+DROP TABLE IF EXISTS `edgeinverse`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8 */;
+CREATE TABLE `edgeinverse` (
+  `edgetype` int(11) unsigned NOT NULL DEFAULT '0',
+  `gid2` bigint(20) unsigned NOT NULL DEFAULT '0',
+  `gid1` bigint(20) unsigned NOT NULL DEFAULT '0',
+  PRIMARY KEY (`edgetype`,`gid2`,`gid1`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8 COLLATE=utf8_unicode_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
 --
 -- Table structure for table `edgemeta`
 --
@@ -1,11 +1,13 @@
 import copy
 import time
+import threading
 import MySQLdb
 import MySQLdb.converters
 import MySQLdb.cursors
 import MySQLdb.constants
 
 from contextlib import contextmanager, closing
+from session import Session
 
 class DB:
 
@@ -14,14 +16,19 @@ class DB:
     # connection every 1 hour
     _recycleInterval = 60*60*1
 
-    # Cache of DB instances
-    _instances = {}
+    # statements run by every DB instance of the process, including the
+    # ones of worker threads and streaming connections
+    _totalStatementCount = 0
+    _totalStatementMutex = threading.Lock()
 
     @staticmethod
     def getInstance(host, dbname):
-        instance = DB._instances.get((host, dbname))
+        # connections can't be shared between threads, so DB instances
+        # are cached per session
+        instances = Session.current().dbs
+        instance = instances.get((host, dbname))
         if not instance:
-            instance = DB._instances[(host, dbname)] = DB(host, dbname)
+            instance = instances[(host, dbname)] = DB(host, dbname)
         return instance
 
     def __init__(self, host, dbname):
@@ -35,6 +42,7 @@ class DB:
         self._lastInsertID = 0
         self._transactionDepth = 0
         self._transactionCursor = None
+        self._statementCount = 0
 
     def getConnection(self):
         if (not self._dbconn or
@@ -42,19 +50,23 @@ class DB:
             long(time.time()) - self._connectTime > DB._recycleInterval):
             self.closeConnection()
             self._connectTime = long(time.time())
-            self._dbconn = MySQLdb.connect(
-                host=self._dbhost,
-                db=self._dbname,
-                user=self._dbuser,
-                passwd=self._dbpasswd,
-                conv=DB._getConversions(),
-                use_unicode=True,
-                charset='utf8',
-                init_command='SET time_zone = "+0:00"',
-                sql_mode='TRADITIONAL')
-            self._dbconn.autocommit(True)
+            self._dbconn = self._connect()
         return self._dbconn
 
+    def _connect(self):
+        dbconn = MySQLdb.connect(
+            host=self._dbhost,
+            db=self._dbname,
+            user=self._dbuser,
+            passwd=self._dbpasswd,
+            conv=DB._getConversions(),
+            use_unicode=True,
+            charset='utf8',
+            init_command='SET time_zone = "+0:00"',
+            sql_mode='TRADITIONAL')
+        dbconn.autocommit(True)
+        return dbconn
+
     def closeConnection(self):
         if self._dbconn:
             self._dbconn.close()
@@ -100,7 +112,34 @@ class DB:
             self._execute(cursor, sql, args)
             for row in cursor: return row
 
+    def getOneDict(self, sql, args=None):
+        with closing(self.getConnection().cursor(MySQLdb.cursors.DictCursor)) as cursor:
+            self._execute(cursor, sql, args)
+            for row in cursor: return row
+
+    def iter(self, sql, args=None, batch_size=1000):
+        # a server side cursor keeps its connection busy until every row
+        # is read, so stream over a dedicated connection instead of the
+        # shared one (which may be used while the rows are consumed)
+        dbconn = self._connect()
+        try:
+            with closing(dbconn.cursor(MySQLdb.cursors.SSCursor)) as cursor:
+                self._countStatement()
+                cursor.execute(sql, args)
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows: break
+                    for row in rows: yield row
+        finally:
+            dbconn.close()
+
+    def _countStatement(self):
+        self._statementCount += 1
+        with DB._totalStatementMutex:
+            DB._totalStatementCount += 1
+
     def _execute(self, cursor, sql, args):
+        self._countStatement()
         try:
             return cursor.execute(sql, args)
         except:
@@ -116,6 +155,13 @@ class DB:
     def getLastInsertID(self):
         return self._lastInsertID
 
+    def getStatementCount(self):
+        return self._statementCount
+
+    @staticmethod
+    def getTotalStatementCount():
+        return DB._totalStatementCount
+
     def hasOngoingTransaction(self):
         return bool(self._transactionDepth)
 
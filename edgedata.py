@@ -1,31 +1,98 @@
 import copy
-import escode
+import time
+import itertools
 import contextlib
 
 from collections import defaultdict
 from utils import first
-from data import DataType, Data
+from data import DataType, Data, AttrDescriptor, ValueDescriptor
 from attr import *
 from index import Index
 from query import Query
 from datastore import DataStore
+from config import config
+from lockstats import LockStats
+from session import Session
+from executor import Future
+from encoders import ESCodeEncoder, CompactEncoder, CompressedEncoder
 
 DATASTORE = DataStore.getInstance()
 
+# query cache lookups return this on a miss, as a cached None is a missing edge
+_UNCACHED = object()
+
+def _checkRead(instance):
+    assert instance.__locked__ or not Session.current().lockedColos, "using unlocked data inside lock"
+
+def _prepareWrite(instance):
+    assert instance.__locked__, "cannot make changes without a lock "
+    instance._markSave()
+
+    # committed values can be shared with other sessions, so they are
+    # copied on the first change
+    if instance.__values__ is instance.__committed__:
+        instance.__values__ = list(instance.__values__)
+
+class _EdgeAttrDescriptor(AttrDescriptor):
+
+    __slots__ = ()
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self.attrdef
+        _checkRead(instance)
+        return self.attrdef.get(instance)
+
+    def __set__(self, instance, attrvalue):
+        _prepareWrite(instance)
+        self.attrdef.set(instance, attrvalue)
+
+class _EdgeValueDescriptor(ValueDescriptor):
+
+    __slots__ = ()
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self.attrdef
+        _checkRead(instance)
+        return ValueDescriptor.__get__(self, instance, owner)
+
+    def __set__(self, instance, attrvalue):
+        _prepareWrite(instance)
+        self.attrdef.set(instance, attrvalue)
+
+class _GidDescriptor(AttrDescriptor):
+
+    __slots__ = ()
+
+    def __set__(self, instance, attrvalue):
+        assert 0, "cannot assign local or remote gid"
+
 class EdgeDataType(DataType):
 
     _edgedataClasses = {}
 
-    # cache of instances per (edgetype, localgid, remotegid)
+    # committed (revision, values) per (cls, localgid, remotegid), shared by
+    # all sessions and never mutated, instances copy the values on change
     _instanceCache = {}
 
     _RESERVED = {'get'}
 
+    def __new__(cls, name, parents, attrs):
+        # expiring classes keep their expiry time (in seconds) as an attr
+        inherited = any('expiretime' in getattr(parent, '__attrdefs__', {}) for parent in parents)
+        if attrs.get('__ttl__') and not inherited:
+            assert 'expiretime' not in attrs, "`expiretime` is reserved for classes with __ttl__"
+            attrs['expiretime'] = IntAttr()
+        return super(EdgeDataType, cls).__new__(cls, name, parents, attrs)
+
     def __init__(self, name, parents, attrs):
         super(EdgeDataType, self).__init__(name, parents, attrs)
 
         assert all(attrname not in EdgeDataType._RESERVED for attrname in self.__attrdefs__), \
             "reserved keyword attr"
+        assert self.__encoding__ is None or 0 <= self.__encoding__ < len(self._encoders), \
+            "unknown encoding"
 
         # get edgetype definition from the datastore
         storename = self.__dict__.get('__storename__', name)
@@ -58,39 +125,106 @@ class EdgeDataType(DataType):
         self.__remoteattr__ = remoteattr
         self.__edgetype__ = edgetype
 
+        # the gid attrs aren't part of the data anymore, they're read off
+        # the instance's own slots
+        if localattr and remoteattr:
+            setattr(self, localattr.name, _GidDescriptor(localattr))
+            setattr(self, remoteattr.name, _GidDescriptor(remoteattr))
+        self._compileAttrs()
+
+        # ids written in place of attr names by compact encodings. ids are
+        # never reused, so fields of removed attrs are simply skipped
+        self.__fieldids__ = {}
+        self.__fieldnames__ = {}
+        for attrname in self.__attrdefs__:
+            fieldid = DATASTORE.addOrGetDefinitionType('{}.{}'.format(storename, attrname))
+            self.__fieldids__[attrname] = fieldid
+            self.__fieldnames__[fieldid] = intern(attrname)
+
         indexdefs = self.__dict__.get('__indexdefs__', [])
         self.__indexdefs__ = []
 
         for parent in cls_parents:
             for indexdef in copy.deepcopy(parent.__indexdefs__):
-                self.addIndex(indexdef)
+                if not indexdef.shadow:
+                    self.addIndex(indexdef)
 
         for indexdef in indexdefs:
             self.addIndex(indexdef)
 
+        # the sweeper finds expired edges through this index
+        self.__expireindex__ = None
+        if self.__ttl__:
+            self.__expireindex__ = first(
+                indexdef for indexdef in self.__indexdefs__
+                if not indexdef.shadow and indexdef.attrdefs[0].name == 'expiretime')
+            if not self.__expireindex__:
+                self.__expireindex__ = Index(self.__attrdefs__['expiretime'])
+                self.addIndex(self.__expireindex__)
+
+        if self.__packed__:
+            assert not self.__attrdefs__ and not self.__indexdefs__, "packed classes can't have data or indexes"
+            assert not self.__inverse__, "packed classes can't have inverse edges"
+            assert not self.__ttl__, "packed classes can't expire"
+            encoding = self.__encoding__ if self.__encoding__ is not None else config.WRITE_ENCODING
+            DataStore.setPacked(edgetype, encoding, self._encoders[encoding].encode(self, {}))
+
     def addIndex(self, indexdef):
-            attrdefs = indexdef.attrdefs
             assert isinstance(indexdef, Index), "non Index type in index"
-            indexname = '{}:{}'.format(self.__name__, ':'.join(attrdef.name for attrdef in attrdefs))
+
+            # covering indexes of expiring classes include the expiry time,
+            # so expired edges can be left out of their rows too
+            if indexdef.include and self.__ttl__ and \
+                    'expiretime' not in [attrdef.name for attrdef in indexdef.include]:
+                indexdef.include += (self.__attrdefs__['expiretime'],)
+
+            indexname = '{}:{}'.format(self.__name__, indexdef.name)
             indexdef.indextype = DATASTORE.addOrGetDefinitionType(indexname)
             self.__indexdefs__.append(indexdef)
 
+            # also write the version indexes are moving to, so existing edges
+            # can be reindexed before queries switch over to it
+            shadowversion = config.INDEX_SHADOW_VERSION
+            if shadowversion and shadowversion != indexdef.version and not indexdef.shadow:
+                self.addIndex(indexdef.shadowcopy(shadowversion))
+
+    def _compilePlans(self):
+        super(EdgeDataType, self)._compilePlans()
+
+        # positions of values that can be changed in place (dicts and nested
+        # data), instances get their own copies of these committed values
+        self.__mutableindexes__ = [
+            index for index, attrname in enumerate(self.__attrnames__)
+            if self.__attrdefs__[attrname]._mutable()]
+
+    def _makeDescriptor(self, attrdef):
+        if attrdef._overrides('get'):
+            return _EdgeAttrDescriptor(attrdef)
+        return _EdgeValueDescriptor(attrdef)
+
     def __call__(self, localgid, remotegid, **attrs):
         assert self is not EdgeData, "cannot instantiate EdgeData directly, must inherit"
 
+        session = Session.current()
+
         # check if the instance is cached
         instance_key = (self, localgid, remotegid)
-        instance = EdgeDataType._instanceCache.get(instance_key)
+        instance = session.instanceCache.get(instance_key)
 
         if not instance:
             # create a new instance if one isn't in the instance cache
             instance = super(DataType, self).__call__(localgid, remotegid)
-            EdgeDataType._instanceCache[instance_key] = instance
+            session.instanceCache[instance_key] = instance
+
+            # start from the committed data another session has already loaded
+            committed = EdgeDataType._instanceCache.get(instance_key)
+            if committed:
+                instance._setCommitted(*committed)
 
         # set the instance as locked if accessed under a lock
         if self.isLocked(self.colo(localgid)):
             instance.__locked__ = True
-            self._lockedInstances.add(instance)
+            session.lockedInstances.add(instance)
 
         if attrs:
             # clear and populate attributes for instance
@@ -107,6 +241,10 @@ class EdgeDataType(DataType):
     def getEdgeDataClass(cls, edgetype):
         return cls._edgedataClasses.get(edgetype)
 
+    @property
+    def lastAddWasOverwrite(self):
+        return Session.current().overwrites.get(self, False)
+
     def __getattr__(self, attrname):
         if self.__localattr__ and attrname == self.__localattr__.name:
             return self.__localattr__
@@ -117,41 +255,55 @@ class EdgeDataType(DataType):
 
 class EdgeData(Data):
 
-    lastAddWasOverwrite = False
-
     __metaclass__ = EdgeDataType
 
-    #
-    # caches queries made so far so we can reuse them
-    # colo -> (edgetype, localgid) -> (None|index|remotegid) -> result
-    #
-    _queryCache = defaultdict(lambda: defaultdict(dict))
-    _queryCacheDisabled = False
-
-    # instances fetched under lock
-    _lockedInstances = set()
-
-    # instances that are dirtied or added under a lock
-    _saveInstances = set()
-
-    # instances that are deleted under a lock
-    _deleteInstances = set()
-
-    # colos that are currently locked
-    _lockedColos = set()
-
-    # list of encoders
-    _encoders = [escode]
-    _currentEncodingIndex = 0
+    # query cache, locked colos and locked, saved and deleted instances
+    # are kept per thread (or greenlet) in the current Session
+
+    # list of encoders, indexed by the encoding stored with each edge.
+    # entries are never removed or reordered, existing edges refer to them
+    _encoders = [
+        ESCodeEncoder(),
+        CompactEncoder(),
+        CompressedEncoder(CompactEncoder()),
+        CompactEncoder(version=2),
+        CompressedEncoder(CompactEncoder(version=2)),
+    ]
+
+    # classes can pick their own encoding (an index into _encoders), eg.
+    # EdgeData.COMPRESSED_ENCODING for ones with large data. the version 2
+    # format compressed is COMPRESSED_V2_ENCODING, for once every reader
+    # decodes version 2
+    __encoding__ = None
+    COMPRESSED_ENCODING = 2
+    COMPRESSED_V2_ENCODING = 4
+
+    # classes with __inverse__ keep an index of their edges by remote gid on
+    # the remote gid's shard, see queryInverse
+    __inverse__ = False
+
+    # data less classes with __packed__ store the remote gids of a local gid
+    # in sorted blocks instead of a row per edge, for very high fan-out
+    __packed__ = False
+
+    # classes with __ttl__ expire their edges this many seconds after they
+    # are added. reads skip expired edges and migrate.py sweep deletes them
+    __ttl__ = None
+
+    __slots__ = (
+        '__localgid__', '__remotegid__',
+        '__committed__', '__committedrevision__', '__revision__',
+        '__locked__', '__save__', '__delete__')
 
     def __init__(self, localgid, remotegid, **attrs):
 
-        # setattr forbids setting these, so set them directly in __dict__
-        self.__dict__[self.__localattr__.name] = localgid
-        self.__dict__[self.__remoteattr__.name] = remotegid
+        self.__localgid__ = localgid
+        self.__remotegid__ = remotegid
 
-        # datastore sync variables
-        self.__committeddatadict__ = None
+        # datastore sync variables, the committed values are shared with
+        # __values__ until the instance is changed, dicts and nested data
+        # are copied right away as they can be changed in place
+        self.__committed__ = None
         self.__committedrevision__ = 0
         self.__revision__ = 0
 
@@ -163,14 +315,6 @@ class EdgeData(Data):
         # initialize data attributes
         super(EdgeData, self).__init__(**attrs)
 
-    @property
-    def __localgid__(self):
-        return getattr(self, self.__localattr__.name)
-
-    @property
-    def __remotegid__(self):
-        return getattr(self, self.__remoteattr__.name)
-
     @classmethod
     def generateGid(cls, colo_gid=None, colo=None):
         return DATASTORE.generateGid(colo_gid, colo)
@@ -193,6 +337,8 @@ class EdgeData(Data):
         assert not instance or get, "duplicate data (%s,%s,%s)" % (cls, localgid, remotegid)
 
         if not instance:
+            if cls.__ttl__ and attrs.get('expiretime') is None:
+                attrs['expiretime'] = int(time.time()) + cls.__ttl__
             instance = cls(localgid, remotegid, **attrs)
             instance._markSave()
 
@@ -211,12 +357,82 @@ class EdgeData(Data):
         colo = cls.checkLock(localgid)
 
         # check cache
-        cached = cls._getQueryCache(localgid, remotegid)
-        if cached: return cached
+        cached = cls._getQueryCache(localgid, remotegid, default=_UNCACHED)
+        if cached is not _UNCACHED: return cached
+
+        # get instance, reads outside of a lock can be served by a replica
+        edgedata = DATASTORE.get(
+            cls.__edgetype__, localgid, remotegid, replica=not cls.insideLock())
+        return cls._getFetched(localgid, remotegid, edgedata)
+
+    @classmethod
+    def getmulti(cls, gidpairs):
+        # instances for (localgid, remotegid) pairs (None when missing), the
+        # uncached ones are read with one query per host
+        for localgid, remotegid in gidpairs:
+            assert localgid and remotegid, "local(%d) or remote(%d) gid missing" % (localgid, remotegid)
+            cls.checkLock(localgid)
+
+        instances = {}
+        missing = set()
+        for gidpair in gidpairs:
+            cached = cls._getQueryCache(*gidpair, default=_UNCACHED)
+            if cached is not _UNCACHED:
+                instances[gidpair] = cached
+            else:
+                missing.add(gidpair)
+
+        if missing:
+            edgedatas = DATASTORE.getMulti(
+                cls.__edgetype__, missing, replica=not cls.insideLock())
+            for instance in cls._getInstancesFromEdges(edgedatas):
+                instances[(instance.__localgid__, instance.__remotegid__)] = instance
+
+            for localgid, remotegid in missing:
+                cls._setQueryCache(localgid, remotegid, instances.get((localgid, remotegid)))
+
+        return [instances.get(gidpair) for gidpair in gidpairs]
+
+    @classmethod
+    def listPacked(cls, localgid, after=0, limit=1000):
+        # a page of edges in remote gid order, after the remote gid `after`
+        assert cls.__packed__, "%s isn't packed" % cls.__name__
+        cls.checkLock(localgid)
+        edgedatas = DATASTORE.listPacked(
+            cls.__edgetype__, localgid, after, limit, replica=not cls.insideLock())
+        return cls._getInstancesFromEdges(edgedatas)
+
+    @classmethod
+    def queryInverse(cls, remotegid):
+        # edges pointing at remotegid, ordered by local gid
+        assert cls.__inverse__, "%s has no inverse edges" % cls.__name__
+        localgids = DATASTORE.queryInverse(
+            cls.__edgetype__, remotegid, replica=not cls.insideLock())
+        return filter(None, cls.getmulti([(localgid, remotegid) for localgid in localgids]))
+
+    @classmethod
+    def aget(cls, localgid, remotegid):
+        assert localgid and remotegid, "local(%d) or remote(%d) gid missing" % (localgid, remotegid)
+        colo = cls.checkLock(localgid)
+
+        # reads inside a lock have to go through the locked connection
+        cached = cls._getQueryCache(localgid, remotegid, default=_UNCACHED)
+        if cached is not _UNCACHED:
+            return Future.resolved(cached)
+        if cls.insideLock():
+            return Future.resolved(cls.get(localgid, remotegid))
+
+        future = DATASTORE.getAsync(cls.__edgetype__, localgid, remotegid, replica=True)
+        return future.then(lambda edgedata: cls._getFetched(localgid, remotegid, edgedata, True))
+
+    @classmethod
+    def _getFetched(cls, localgid, remotegid, edgedata, unlocked=False):
+        assert not (unlocked and cls.insideLock()), "unlocked read resolved inside lock"
 
         # get instance
-        edgedata = DATASTORE.get(cls.__edgetype__, localgid, remotegid)
         instance = cls._getInstanceFromEdge(edgedata) if edgedata else None
+        if instance and cls.__ttl__ and cls._expired(instance):
+            instance = None
 
         # update cache
         cls._setQueryCache(localgid, remotegid, instance)
@@ -233,7 +449,7 @@ class EdgeData(Data):
         if cached: return cached
 
         # get count
-        count = DATASTORE.count(cls.__edgetype__, localgid)
+        count = DATASTORE.count(cls.__edgetype__, localgid, replica=not cls.insideLock())
 
         # update cache
         cls._setQueryCache(localgid, '__count__', count)
@@ -254,6 +470,97 @@ class EdgeData(Data):
 
     @classmethod
     def queryfetch(cls, query):
+        indexrange, cached = cls._queryPrepare(query)
+        if cached: return cls._queryPrefetch(query, list(cached))
+
+        # fetch list
+        edgedatas = DATASTORE.query(
+            cls.__edgetype__, indexrange, gid1=query.localgid, colo=query.colo,
+            replica=not cls.insideLock())
+        return cls._queryPrefetch(query, cls._queryFetched(query, indexrange, edgedatas))
+
+    @classmethod
+    def aqueryfetch(cls, query):
+        indexrange, cached = cls._queryPrepare(query)
+
+        # reads inside a lock have to go through the locked connection
+        if cached or cls.insideLock():
+            return Future.resolved(cls.queryfetch(query))
+
+        future = DATASTORE.queryAsync(
+            cls.__edgetype__, indexrange, gid1=query.localgid, colo=query.colo, replica=True)
+        return future.then(lambda edgedatas: cls._queryPrefetch(
+            query, cls._queryFetched(query, indexrange, edgedatas, True)))
+
+    @classmethod
+    def queryiter(cls, query, batch_size=1000):
+        # rows are streamed over their own connection, which is not the locked one
+        assert not cls.insideLock(), "streaming query inside lock forbidden"
+        assert not query.prefetches, "streamed instances aren't cached, nothing to prefetch into"
+        indexrange = cls._queryRange(query)
+
+        edgedatas = DATASTORE.iter(
+            cls.__edgetype__, indexrange, gid1=query.localgid, colo=query.colo,
+            batch_size=batch_size, replica=True)
+
+        # streamed instances stay out of the caches so memory use does not
+        # grow with the size of the result
+        while True:
+            batch = list(itertools.islice(edgedatas, batch_size))
+            if not batch: return
+            for instance in cls._queryChecked(query, cls._getInstancesFromEdges(batch, cache=False)):
+                yield instance
+
+    @classmethod
+    def queryincluded(cls, query):
+        # values of the included attrs of a covering index (and the local
+        # and remote gids), read from edgeindex without loading the edges
+        indexrange = cls._queryRange(query)
+        indexdef = indexrange and cls._queryIndex(query)
+        assert indexdef and indexdef.include, "query doesn't use a covering index"
+        assert not indexdef.hashed, "hashed index rows can't be checked for collisions"
+
+        rows = DATASTORE.queryIndex(
+            indexrange, gid1=query.localgid, colo=query.colo, replica=not cls.insideLock())
+        rows = [(revision, localgid) + indexdef.included(payload) for _, revision, localgid, payload in rows]
+
+        # rows left behind by older revisions of an edge are skipped
+        revisions = {}
+        for revision, localgid, remotegid, values in rows:
+            edge = (localgid, remotegid)
+            revisions[edge] = max(revision, revisions.get(edge, 0))
+
+        now = time.time()
+        results = []
+        for revision, localgid, remotegid, values in rows:
+            if revision != revisions[(localgid, remotegid)]:
+                continue
+            if cls.__ttl__ and values['expiretime'] is not None and values['expiretime'] <= now:
+                continue
+            values[cls.__localattr__.name] = localgid
+            values[cls.__remoteattr__.name] = remotegid
+            results.append(values)
+        return results
+
+    @classmethod
+    def _queryPrepare(cls, query):
+        indexrange = cls._queryRange(query)
+
+        # check cache
+        cached = cls._getQueryCache(query.localgid, indexrange, colo=query.colo)
+        return indexrange, cached
+
+    @classmethod
+    def _queryPrefetch(cls, query, instances):
+        # loads the remote entities of the results into the caches
+        if query.prefetches:
+            remotegids = list(set(instance.__remotegid__ for instance in instances))
+            for remotecls in query.prefetches:
+                remotecls.getmulti(remotegids)
+        return instances
+
+    @classmethod
+    def _queryRange(cls, query):
         # check locks
         assert query.colo or not cls.insideLock(), "global query inside lock forbidden"
         query.colo and cls.checkLock(colo=query.colo)
@@ -261,17 +568,30 @@ class EdgeData(Data):
         # index range
         indexrange = None
         if query.isindexquery:
-            indexdef = first(indexdef for indexdef in cls.__indexdefs__ if indexdef.match(query))
-            indexrange = query.range(indexdef)
+            indexrange = query.range(cls._queryIndex(query))
 
-        # check cache
-        cached = cls._getQueryCache(query.localgid, indexrange, colo=query.colo)
-        if cached: return list(cached)
+        return indexrange
 
-        # fetch list
-        edgedatas = DATASTORE.query(
-            cls.__edgetype__, indexrange, gid1=query.localgid, colo=query.colo)
-        instances = [cls._getInstanceFromEdge(edgedata) for edgedata in edgedatas]
+    @classmethod
+    def _queryIndex(cls, query):
+        return first(indexdef for indexdef in cls.__indexdefs__ if indexdef.match(query))
+
+    @classmethod
+    def _queryChecked(cls, query, instances):
+        # digests of hashed indexes can collide, so drop the edges whose
+        # values aren't the ones queried
+        indexdef = query.isindexquery and cls._queryIndex(query)
+        if not indexdef or not indexdef.hashed:
+            return instances
+
+        values = tuple(query.equalargs[attrdef].basevalue for attrdef in indexdef.attrdefs)
+        return [instance for instance in instances if values in indexdef.attrtuples(instance)]
+
+    @classmethod
+    def _queryFetched(cls, query, indexrange, edgedatas, unlocked=False):
+        assert not (unlocked and cls.insideLock()), "unlocked read resolved inside lock"
+
+        instances = cls._queryChecked(query, cls._getInstancesFromEdges(edgedatas))
 
         # update cache
         cls._setQueryCache(query.localgid, indexrange, instances, colo=query.colo)
@@ -280,30 +600,26 @@ class EdgeData(Data):
 
         return instances
 
-    def __setattr__(self, attrname, attrvalue):
-        # cannot assign localgid or remotegid
-        assert attrname not in (self.__localattr__.name, self.__remoteattr__.name)
-
-        if attrname in self.__attrdefs__:
-            assert self.__locked__, "cannot make changes without a lock "
-            self._markSave()
-
-        return super(EdgeData, self).__setattr__(attrname, attrvalue)
-
-    def __getattr__(self, attrname):
-        if attrname in self.__attrdefs__ and self.insideLock():
-            assert self.__locked__, "using unlocked data inside lock"
-
-        return super(EdgeData, self).__getattr__(attrname)
-
     def _save(self):
         assert self.__locked__, "lock data before changes"
         assert self.__save__, "unexpected: unchanged instance being saved"
 
-        # validate and encode the data
-        encoding = EdgeData._currentEncodingIndex
-        data = EdgeData._encoders[encoding].encode(self.dict(validate=True))
-        indices = [indextuple for index in self.__indexdefs__ for indextuple in index.tuples(self)]
+        # validate and encode the data along with all its index values
+        encoding = self.__encoding__
+        if encoding is None:
+            encoding = config.WRITE_ENCODING
+        indexdefs, attrtuples = [], []
+        for index in self.__indexdefs__:
+            for attrtuple in index.attrtuples(self):
+                indexdefs.append(index)
+                attrtuples.append(attrtuple)
+
+        data, indexvalues = EdgeData._encoders[encoding].encode_record(
+            self.__class__, self.dict(validate=True), attrtuples,
+            [index.version for index in indexdefs])
+        payloads = {index: index.payload(self) for index in self.__indexdefs__ if index.include}
+        indices = [(index.indextype, index.digest(indexvalue), index.unique, payloads.get(index))
+            for index, indexvalue in zip(indexdefs, indexvalues)]
 
         # only overwrite data if we already have a previous revision
         overwrite = bool(self.__revision__)
@@ -313,7 +629,13 @@ class EdgeData(Data):
             self.__edgetype__, self.__localgid__, self.__remotegid__,
             encoding, data, indices, overwrite)
 
-        self.__class__.lastAddWasOverwrite = DATASTORE.lastAddWasOverwrite
+        Session.current().overwrites[self.__class__] = DATASTORE.lastAddWasOverwrite
+
+        # the remote gid's shard may be another host, which commits right
+        # away. an inverse edge left behind by a failed lock is skipped by
+        # queryInverse, so it's added before the edge commits
+        if self.__inverse__ and not DATASTORE.lastAddWasOverwrite:
+            DATASTORE.addInverse(self.__edgetype__, self.__localgid__, self.__remotegid__)
 
         # set the updated revision
         edgetype, order, revision, localgid, remotegid, encoding, data = edgedata
@@ -326,43 +648,129 @@ class EdgeData(Data):
 
     def _delete(self):
         indextypes = [indexdef.indextype for indexdef in self.__indexdefs__]
-        return DATASTORE.delete(
+        deleted = DATASTORE.delete(
             self.__edgetype__, self.__localgid__, self.__remotegid__, indextypes)
 
+        # removed while the lock is held, so a session adding the edge again
+        # afterwards always writes its inverse edge again
+        if self.__inverse__:
+            DATASTORE.deleteInverse(self.__edgetype__, self.__localgid__, self.__remotegid__)
+
+        return deleted
+
     @classmethod
-    def _getInstanceFromEdge(cls, edgedata):
+    def _getInstanceFromEdge(cls, edgedata, cache=True):
         edgetype, order, revision, localgid, remotegid, encoding, data = edgedata
-        instance = cls(localgid, remotegid)
+        instance = cls._getEdgeInstance(localgid, remotegid, cache)
 
         # update the instance if we don't have the most recent revision
         if instance.__revision__ < revision:
-            encoder = EdgeData._encoders[encoding]
-            datadict = encoder.decode(data)
+            datadict = EdgeData._encoders[encoding].decode(cls, data)
+            instance._setDecoded(revision, datadict, cache)
+
+        return instance
 
-            # convert from base type for data dict and skip unknown attributes
-            for attrname in datadict:
-                attrdef = cls.__attrdefs__.get(attrname)
-                if attrdef:
-                    datadict[attrname] = attrdef._from_base_type(datadict[attrname])
+    @classmethod
+    def _getInstancesFromEdges(cls, edgedatas, cache=True):
+        instances = []
+        stale = defaultdict(list)
 
-            instance.__datadict__ = instance.__committeddatadict__ = datadict
-            instance.__revision__ = instance.__committedrevision__ = revision
+        for edgedata in edgedatas:
+            edgetype, order, revision, localgid, remotegid, encoding, data = edgedata
+            instance = cls._getEdgeInstance(localgid, remotegid, cache)
+            instances.append(instance)
 
+            if instance.__revision__ < revision:
+                stale[encoding].append((instance, edgedata))
+
+        # decode the rows of out of date instances with one call per encoding
+        for encoding, staleedges in stale.iteritems():
+            datadicts = EdgeData._encoders[encoding].decode_many(
+                cls, [edgedata for instance, edgedata in staleedges])
+
+            for (instance, edgedata), datadict in zip(staleedges, datadicts):
+                instance._setDecoded(edgedata[2], datadict, cache)
+
+        if cls.__ttl__:
+            now = time.time()
+            instances = [instance for instance in instances if not cls._expired(instance, now)]
+
+        return instances
+
+    @classmethod
+    def _expired(cls, instance, now=None):
+        # expired edges stay stored until they're swept
+        expiretime = instance.expiretime
+        return expiretime is not None and expiretime <= (now or time.time())
+
+    @classmethod
+    def _getDetachedInstanceFromEdge(cls, edgedata):
+        # a new instance that is neither cached nor shared, for tools
+        # working through raw edges
+        edgetype, order, revision, localgid, remotegid, encoding, data = edgedata
+        instance = super(DataType, cls).__call__(localgid, remotegid)
+        instance._setDecoded(revision, EdgeData._encoders[encoding].decode(cls, data), False)
         return instance
 
+    @classmethod
+    def _getEdgeInstance(cls, localgid, remotegid, cache=True):
+        if cache:
+            return cls(localgid, remotegid)
+
+        # reuse a cached instance but don't cache new ones
+        instance = Session.current().instanceCache.get((cls, localgid, remotegid))
+        return instance or super(DataType, cls).__call__(localgid, remotegid)
+
+    def _setDecoded(self, revision, datadict, cache=True):
+        # convert from base types with the class's decode plan
+        self._setCommitted(revision, self.__class__._fromBaseTypes(datadict))
+        cache and self._shareCommitted()
+
+    def _setCommitted(self, revision, values):
+        # the committed values may be shared between sessions so changes
+        # are only ever made to a copy of them
+        self.__committed__ = values
+        self.__values__ = self._committedValues()
+        self.__revision__ = self.__committedrevision__ = revision
+
+    def _committedValues(self):
+        # the committed values themselves when none can be changed in place,
+        # otherwise a copy with copies of those that can
+        values = self.__committed__
+        if not self.__mutableindexes__:
+            return values
+
+        values = list(values)
+        for index in self.__mutableindexes__:
+            if values[index] is not None:
+                values[index] = copy.deepcopy(values[index])
+        return values
+
+    def _shareCommitted(self):
+        instance_key = (self.__class__, self.__localgid__, self.__remotegid__)
+        committed = EdgeDataType._instanceCache.get(instance_key)
+        if not committed or committed[0] < self.__committedrevision__:
+            EdgeDataType._instanceCache[instance_key] = (
+                self.__committedrevision__, self.__committed__)
+
+    def _unshareCommitted(self):
+        instance_key = (self.__class__, self.__localgid__, self.__remotegid__)
+        EdgeDataType._instanceCache.pop(instance_key, None)
+
     @staticmethod
     @contextlib.contextmanager
     def disabledQueryCache():
         # disable query cache
-        queryCacheDisabledOld = EdgeData._queryCacheDisabled
-        EdgeData._queryCacheDisabled = True
+        session = Session.current()
+        queryCacheDisabledOld = session.queryCacheDisabled
+        session.queryCacheDisabled = True
 
         try:
             yield
         finally:
             # only the outermost with statemnt will set this back to its original
             # value since all others will see a disabled=True as the old value
-            EdgeData._queryCacheDisabled = queryCacheDisabledOld
+            session.queryCacheDisabled = queryCacheDisabledOld
 
     @classmethod
     def colo(cls, gid):
@@ -370,11 +778,11 @@ class EdgeData(Data):
 
     @staticmethod
     def isLocked(colo):
-        return colo in EdgeData._lockedColos
+        return colo in Session.current().lockedColos
 
     @staticmethod
     def insideLock():
-        return EdgeData._lockedColos
+        return Session.current().lockedColos
 
     @classmethod
     def checkLock(cls, localgid=None, required=False, colo=None):
@@ -397,16 +805,18 @@ class EdgeData(Data):
             yield
             return
 
+        session = Session.current()
+
         # nested locks are noops
-        if EdgeData.insideLock():
-            assert colos.issubset(EdgeData._lockedColos), "cannot acquire new locks inside a lock"
+        if session.lockedColos:
+            assert colos.issubset(session.lockedColos), "cannot acquire new locks inside a lock"
             yield
             return
 
-        EdgeData._lockedColos = colos
-        save_instances = EdgeData._saveInstances
-        delete_instances = EdgeData._deleteInstances
-        locked_instances = EdgeData._lockedInstances
+        session.lockedColos.update(colos)
+        save_instances = session.saveInstances
+        delete_instances = session.deleteInstances
+        locked_instances = session.lockedInstances
 
         assert not (save_instances or delete_instances or locked_instances)
 
@@ -414,13 +824,22 @@ class EdgeData(Data):
         for colo in colos:
             EdgeData._clearQueryCache(colo)
 
+        timer = LockStats.start(colos)
+
         try:
 
-            with contextlib.nested(*map(DATASTORE.lock, sorted(EdgeData._lockedColos))):
+            locks = [DATASTORE.lock(colo, timer) for colo in sorted(colos)]
+            with contextlib.nested(*locks):
                 # all updates, adds and deletes will be stored in
                 # save_instances and delete_instances
                 yield
 
+                if timer:
+                    for instance in save_instances:
+                        timer.saves[instance.colo(instance.__localgid__)] += 1
+                    for instance in delete_instances:
+                        timer.deletes[instance.colo(instance.__localgid__)] += 1
+
                 # save any save instances
                 for instance in save_instances:
                     instance._save()
@@ -438,20 +857,39 @@ class EdgeData(Data):
                 EdgeData._clearQueryCache(colo)
 
             for instance in save_instances:
-                instance.__datadict__ = instance.__committeddatadict__
+                if instance.__committed__ is None:
+                    instance.initialize()
+                else:
+                    instance.__values__ = instance._committedValues()
                 instance.__revision__ = instance.__committedrevision__
 
+            # changes made in place to dicts and nested data don't mark an
+            # instance for saving, so the other locked instances are reverted too
+            for instance in locked_instances - save_instances:
+                if instance.__mutableindexes__ and instance.__committed__ is not None:
+                    instance.__values__ = instance._committedValues()
+
+            # put back the inverse edges of deletes that were rolled back, an
+            # extra one for an edge that doesn't exist is skipped on reads
+            for instance in delete_instances:
+                if instance.__inverse__:
+                    DATASTORE.addInverse(
+                        instance.__edgetype__, instance.__localgid__, instance.__remotegid__)
+
             raise
 
         else:
 
-            # store a copy of the freshly committed data dict and revision
-            # this will be used to revert back to a committed state on future
-            # changes
+            # the freshly committed values and revision are used to revert
+            # back to a committed state on future changes, the values are
+            # shared until the next change copies them
 
             for instance in save_instances:
-                instance.__committeddatadict__ = dict(instance.__datadict__)
-                instance.__committedrevision__ = instance.__revision__
+                instance._setCommitted(instance.__revision__, instance.__values__)
+                instance._shareCommitted()
+
+            for instance in delete_instances:
+                instance._unshareCommitted()
 
         finally:
 
@@ -470,7 +908,9 @@ class EdgeData(Data):
                 instance.__delete__ = False
             delete_instances.clear()
 
-            EdgeData._lockedColos.clear()
+            session.lockedColos.clear()
+
+            LockStats.record(timer)
 
     @contextlib.contextmanager
     def locknload(self):
@@ -481,40 +921,43 @@ class EdgeData(Data):
     def _markDelete(self):
         if not self.__delete__:
             self.__delete__ = True
-            EdgeData._deleteInstances.add(self)
+            Session.current().deleteInstances.add(self)
 
     def _markSave(self):
         if not self.__save__:
             self.__save__ = True
-            EdgeData._saveInstances.add(self)
+            Session.current().saveInstances.add(self)
 
     @staticmethod
     def clearInstanceCache():
-        EdgeData._instanceCache.clear()
+        Session.current().instanceCache.clear()
+        EdgeDataType._instanceCache.clear()
 
     @classmethod
-    def _getQueryCache(cls, localgid, query, colo=None):
+    def _getQueryCache(cls, localgid, query, colo=None, default=None):
+        session = Session.current()
         colo = colo or (localgid and cls.colo(localgid)) or 0
-        cache = EdgeData._queryCache[colo][(cls.__edgetype__, localgid)]
-        if not EdgeData._queryCacheDisabled and query in cache:
+        cache = session.queryCache[colo][(cls.__edgetype__, localgid)]
+        if not session.queryCacheDisabled and query in cache:
             return cache[query]
+        return default
 
     @classmethod
     def _setQueryCache(cls, localgid, query, value, colo=None):
         colo = colo or (localgid and cls.colo(localgid)) or 0
-        EdgeData._queryCache[colo][(cls.__edgetype__, localgid)][query] = value
+        Session.current().queryCache[colo][(cls.__edgetype__, localgid)][query] = value
 
     @classmethod
     def _clearQueryCache(cls, colo=None, localgid=None):
         colo = colo or cls.colo(localgid)
-        cache = EdgeData._queryCache[colo]
+        cache = Session.current().queryCache[colo]
         if localgid:
             cache = cache[(cls.__edgetype__, localgid)]
         cache.clear()
 
     @staticmethod
     def clearQueryCache():
-        EdgeData._queryCache.clear()
+        Session.current().queryCache.clear()
 
     def debug_print(self, prefix=''):
         localgidname = self.__localattr__.name
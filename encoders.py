@@ -0,0 +1,79 @@
+import zlib
+import escode
+
+from config import config
+
+__all__ = ['ESCodeEncoder', 'CompactEncoder', 'CompressedEncoder']
+
+class ESCodeEncoder(object):
+
+    def __init__(self, version=1):
+        # the encoder holds the GIL for a whole call, so threads can share
+        # its buffer. any version decodes, the version sets what is written
+        self._encoder = escode.Encoder(version=version)
+
+    def encode(self, cls, datadict):
+        return self._encoder.encode(datadict)
+
+    def encode_record(self, cls, datadict, attrtuples, indexversions=None):
+        # returns the encoded data and the index value of each attr tuple
+        return self._encoder.encode_record(datadict, attrtuples, None, indexversions)
+
+    def decode(self, cls, data):
+        return escode.decode(data)
+
+    def decode_many(self, cls, rows):
+        return escode.decode_many(rows)
+
+class CompactEncoder(ESCodeEncoder):
+
+    # writes the field id of each attr (see EdgeDataType) instead of its name,
+    # fields that are no longer defined on the class are dropped on decode
+
+    def encode(self, cls, datadict):
+        return self.encode_record(cls, datadict, [])[0]
+
+    def encode_record(self, cls, datadict, attrtuples, indexversions=None):
+        return self._encoder.encode_record(datadict, attrtuples, cls.__fieldids__, indexversions)
+
+    def decode(self, cls, data):
+        return escode.decode_record(data, cls.__fieldnames__)
+
+    def decode_many(self, cls, rows):
+        return escode.decode_many(rows, -1, cls.__fieldnames__)
+
+class CompressedEncoder(object):
+
+    # wraps another encoder, data is prefixed with a flag byte telling
+    # whether the rest is compressed (only done when it makes it smaller)
+    _RAW = '\x00'
+    _ZLIB = '\x01'
+
+    def __init__(self, encoder):
+        self._encoder = encoder
+
+    def encode(self, cls, datadict):
+        return self._compress(self._encoder.encode(cls, datadict))
+
+    def encode_record(self, cls, datadict, attrtuples, indexversions=None):
+        data, indexvalues = self._encoder.encode_record(cls, datadict, attrtuples, indexversions)
+        return self._compress(data), indexvalues
+
+    def decode(self, cls, data):
+        return self._encoder.decode(cls, self._decompress(data))
+
+    def decode_many(self, cls, rows):
+        return self._encoder.decode_many(cls, [self._decompress(row[-1]) for row in rows])
+
+    def _compress(self, data):
+        if len(data) >= config.COMPRESS_THRESHOLD:
+            compressed = zlib.compress(data, config.COMPRESS_LEVEL)
+            if len(compressed) < len(data):
+                return CompressedEncoder._ZLIB + compressed
+        return CompressedEncoder._RAW + data
+
+    def _decompress(self, data):
+        # escode decodes buffers in place, so raw data isn't copied
+        if data[0] == CompressedEncoder._ZLIB:
+            return zlib.decompress(buffer(data, 1))
+        return buffer(data, 1)
@@ -1,11 +1,16 @@
+import os
 import copy
 import binascii
 
 from utils import first
+from bloom import BloomFilter
+from datastore import DataStore
 from edgedata import EdgeDataType, EdgeData
 from attr import *
 from index import Index
 
+DATASTORE = DataStore.getInstance()
+
 class EntityType(EdgeDataType):
 
     def __init__(self, name, parents, attrs):
@@ -49,6 +54,14 @@ class Entity(EdgeData):
     def get(cls, gid, _gid=None):
         return super(Entity, cls).get(gid, gid)
 
+    @classmethod
+    def getmulti(cls, gids):
+        return super(Entity, cls).getmulti([(gid, gid) for gid in gids])
+
+    @classmethod
+    def aget(cls, gid, _gid=None):
+        return super(Entity, cls).aget(gid, gid)
+
     @property
     def __cologid__(self):
         return getattr(self, self.__coloattr__.name)
@@ -77,14 +90,24 @@ class KeyEntityType(EntityType):
 
         assert keyattr or name is 'KeyEntity', "missing key attr"
         self.__keyattr__ = keyattr
+        self.__keyindex__ = None
+
+        # classes opt in to answering lookups of absent keys locally, see
+        # KeyEntity.loadKeyFilter
+        self.__keyfilter__ = None
+        self.__keyfiltercurrent__ = False
 
         if keyattr:
-            self.addIndex(Index(keyattr, unique=True))
+            # __hashedkey__ keeps long keys out of the index, see Index
+            self.__keyindex__ = Index(keyattr, unique=True, hashed=self.__hashedkey__)
+            self.addIndex(self.__keyindex__)
 
 class KeyEntity(Entity):
 
     __metaclass__ = KeyEntityType
 
+    __hashedkey__ = False
+
     @classmethod
     def add(cls, **attrs):
         keyattrname = cls.__keyattr__.name
@@ -104,7 +127,7 @@ class KeyEntity(Entity):
 
         keycolo = cls._key2colo(key)
         with cls.lock(colos=[keycolo]):
-            instance = cls.getbykey(key)
+            instance = cls.getbykey(key, filtered=not get)
             assert not instance or get, "duplicate instance key(%s)" % key
 
             if not instance:
@@ -122,10 +145,52 @@ class KeyEntity(Entity):
                 instance.remove()
 
     @classmethod
-    def getbykey(cls, key):
+    def getbykey(cls, key, filtered=False):
+        # filtered lookups trust the key filter's negatives only while it
+        # holds every key, otherwise they go to the datastore like the rest
+        if (filtered and cls.__keyfilter__ is not None and cls.__keyfiltercurrent__ and
+                cls._keyIndexValue(key) not in cls.__keyfilter__):
+            return None
+
         keycolo = cls._key2colo(key)
         return first(cls.query(cls.__keyattr__ == key, colo=keycolo).fetch())
 
+    @classmethod
+    def loadKeyFilter(cls, capacity, errorrate=0.01, path=None, exclusive=False):
+        # reads the filter saved at path, or builds it from the key index
+        # and saves it there. exclusive says no other process adds keys of
+        # this class, only then does a filter built here stay current as
+        # this process adds keys. a saved filter may miss keys added since
+        # it was saved so it's never trusted
+        current = False
+        if path and os.path.exists(path):
+            keyfilter = BloomFilter.load(path)
+        else:
+            current = exclusive
+            keyfilter = BloomFilter(capacity, errorrate)
+            for indexvalue in DATASTORE.iterIndex(cls.__keyindex__.indextype):
+                keyfilter.add(indexvalue)
+            if path:
+                keyfilter.save(path)
+
+        cls.__keyfilter__ = keyfilter
+        cls.__keyfiltercurrent__ = current
+        return keyfilter
+
+    def _save(self):
+        super(KeyEntity, self)._save()
+
+        # bloom filters can't remove keys, so deleted ones stay in the filter
+        # and their lookups just go to the datastore
+        if self.__keyfilter__ is not None:
+            self.__keyfilter__.add(self._keyIndexValue(self.__key__))
+
+    @classmethod
+    def _keyIndexValue(cls, key):
+        # the filter holds the key index values, so it's built without
+        # decoding them
+        return cls.__keyindex__.value((cls.__keyattr__._to_base_type(key),))
+
     @classmethod
     def _key2colo(cls, key):
         return binascii.crc32(key) & 0xffffffff
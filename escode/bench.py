@@ -0,0 +1,211 @@
+import sys
+import json
+import time
+import escode
+import random
+import optparse
+
+# record shapes modelled on the EdgeData classes we store, a wide entity, a
+# repeated LocalDataAttr, unicode heavy text and a small assoc
+
+def user(i):
+    return {
+        'email': u'user%d@example.com' % i,
+        'password': u'%032x' % random.getrandbits(128),
+        'firstname': u'Jos\xe9',
+        'lastname': u'Garc\xeda %d' % i,
+        'dobtime': 946684800 + i,
+        'jointime': 1400000000 + i * 17,
+        'lastseen': 1500000000 + i * 31,
+        'counter': i % 100,
+        'score': i * 0.25,
+        'verified': bool(i % 2),
+        'locale': u'en_US',
+        'timezone': -480,
+        'referrer': None,
+        'tags': {'beta': [1, 2], 'source': 'ios'},
+        'phone': {'code': 1, 'number': 5550000 + i},
+    }
+
+def repeated(i):
+    return {
+        'ownergid': (1 << 40) + i,
+        'phones': [{'code': code, 'number': 5550000 + i + code, 'label': u'mobile'} for code in range(20)],
+    }
+
+def text(i):
+    return {
+        'title': u'\u4f60\u597d %d' % i,
+        'body': u'\xe1\xe9\xed\xf3\xfa\xfc\xf1 \u4e16\u754c ' * 200,
+        'lang': u'zh',
+    }
+
+def assoc(i):
+    return {'subscribed': bool(i % 2), 'time': 1400000000 + i}
+
+SHAPES = [('user', user), ('repeated', repeated), ('text', text), ('assoc', assoc)]
+
+INDEXES = [
+    ('int', lambda i: (i - 500,)),
+    ('float', lambda i: (i * -0.5,)),
+    ('string', lambda i: ('user%d@example.com' % i,)),
+    ('composite', lambda i: ((1 << 40) + i, True, u'Garc\xeda %d' % i)),
+]
+
+RECORDS = 100
+
+def timeit(func, mintime):
+    # best of 3 runs of enough loops to take mintime, in ops per second
+    number = 1
+    while True:
+        start = time.time()
+        for _ in xrange(number):
+            func()
+        elapsed = time.time() - start
+        if elapsed >= mintime:
+            break
+        number *= 2
+
+    best = elapsed
+    for _ in range(2):
+        start = time.time()
+        for _ in xrange(number):
+            func()
+        best = min(best, time.time() - start)
+
+    return number * RECORDS / best
+
+def allocs(results):
+    # distinct objects the decoded records hold and their size per record,
+    # shared objects like interned keys and small ints count once
+    seen, size = set(), 0
+    pending = list(results)
+    while pending:
+        obj = pending.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            pending.extend(obj.iterkeys())
+            pending.extend(obj.itervalues())
+        elif isinstance(obj, (list, tuple)):
+            pending.extend(obj)
+
+    return {'objects': len(seen) / float(RECORDS), 'heapbytes': size / float(RECORDS)}
+
+def bench(mintime):
+    random.seed(0)
+    results = {}
+
+    for version in (1, 2):
+        encoder = escode.Encoder(version=version)
+        suffix = '' if version == 1 else '/v2'
+
+        for name, shape in SHAPES:
+            objects = [shape(i) for i in range(RECORDS)]
+            encoded = [encoder.encode(obj) for obj in objects]
+
+            fieldids = dict((key, fieldid) for fieldid, key in enumerate(sorted(objects[0]), 1))
+            fieldnames = dict((fieldid, key) for key, fieldid in fieldids.iteritems())
+            records = [encoder.encode_record(obj, [], fieldids)[0] for obj in objects]
+            rows = [(0, 0, 0, 0, 0, 0, data) for data in records]
+
+            def encode():
+                for obj in objects:
+                    encoder.encode(obj)
+
+            def decode():
+                for data in encoded:
+                    escode.decode(data)
+
+            def encode_record():
+                for obj in objects:
+                    encoder.encode_record(obj, [], fieldids)
+
+            def decode_many():
+                escode.decode_many(rows, -1, fieldnames)
+
+            for op, func in [('encode', encode), ('decode', decode),
+                             ('encode_record', encode_record), ('decode_many', decode_many)]:
+                results['%s/%s%s' % (name, op, suffix)] = {'ops': timeit(func, mintime)}
+
+            results['%s/decode%s' % (name, suffix)].update(
+                allocs([escode.decode(data) for data in encoded]),
+                bytes=sum(map(len, encoded)) / float(RECORDS))
+            results['%s/decode_many%s' % (name, suffix)].update(
+                allocs(escode.decode_many(rows, -1, fieldnames)),
+                bytes=sum(map(len, records)) / float(RECORDS))
+
+        for name, index in INDEXES:
+            tuples = [index(i) for i in range(RECORDS)]
+
+            def encode_index():
+                for values in tuples:
+                    escode.encode_index(values, False, version)
+
+            results['index/%s%s' % (name, suffix)] = {
+                'ops': timeit(encode_index, mintime),
+                'bytes': sum(len(escode.encode_index(values, False, version)) for values in tuples) / float(RECORDS),
+            }
+
+    return results
+
+def compare(results, baseline, tolerance):
+    # lines per benchmark and whether any is slower or bigger than allowed
+    lines, regressed = [], False
+    for key in sorted(results):
+        result, base = results[key], baseline.get(key)
+        if not base:
+            lines.append('%-32s %12.0f ops/s  (new)' % (key, result['ops']))
+            continue
+
+        change = result['ops'] / base['ops'] - 1.0
+        flags = []
+        if change < -tolerance:
+            flags.append('SLOWER')
+        if result.get('bytes', 0) > base.get('bytes', 0) * (1.0 + tolerance):
+            flags.append('BIGGER')
+        if result.get('objects', 0) > base.get('objects', 0) * (1.0 + tolerance):
+            flags.append('ALLOCS')
+        regressed = regressed or bool(flags)
+        lines.append('%-32s %12.0f ops/s  %+6.1f%%  %s' % (key, result['ops'], change * 100, ' '.join(flags)))
+
+    return lines, regressed
+
+def main(argv):
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option('--min-time', type='float', default=0.2,
+        help="seconds each measurement runs for")
+    parser.add_option('--filter', default='',
+        help="only report benchmarks containing this string")
+    parser.add_option('--baseline',
+        help="json results to compare against, exits 1 on a regression")
+    parser.add_option('--tolerance', type='float', default=0.1,
+        help="allowed slowdown or size increase against the baseline")
+    parser.add_option('--save',
+        help="write the results as json to this file")
+
+    options, args = parser.parse_args(argv)
+
+    results = dict(
+        (key, result) for key, result in bench(options.min_time).iteritems()
+        if options.filter in key)
+
+    if options.save:
+        with open(options.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if not options.baseline:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+        return 0
+
+    with open(options.baseline) as f:
+        baseline = json.load(f)
+    lines, regressed = compare(results, baseline, options.tolerance)
+    print '\n'.join(lines)
+    return 1 if regressed else 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
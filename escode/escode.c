@@ -26,6 +26,18 @@
 #define _ESCODE_TYPE_UNICODE 8
 #define _ESCODE_TYPE_LIST 9
 #define _ESCODE_TYPE_DICT 10
+#define _ESCODE_TYPE_RECORD 11
+
+// format version 2 types, varint integers and lengths
+#define _ESCODE_TYPE_VARINT 12
+#define _ESCODE_TYPE_VSTRING 13
+#define _ESCODE_TYPE_VUNICODE 14
+#define _ESCODE_TYPE_VLIST 15
+#define _ESCODE_TYPE_VDICT 16
+#define _ESCODE_TYPE_VRECORD 17
+
+#define ESCODE_VERSION_1 1
+#define ESCODE_VERSION_2 2
 
 static PyObject *ESCODE_Error;
 static PyObject *ESCODE_EncodeError;
@@ -43,6 +55,23 @@ static const byte ESCODE_TYPE_STRING = _ESCODE_TYPE_STRING;
 static const byte ESCODE_TYPE_UNICODE = _ESCODE_TYPE_UNICODE;
 static const byte ESCODE_TYPE_LIST = _ESCODE_TYPE_LIST;
 static const byte ESCODE_TYPE_DICT = _ESCODE_TYPE_DICT;
+static const byte ESCODE_TYPE_RECORD = _ESCODE_TYPE_RECORD;
+static const byte ESCODE_TYPE_VARINT = _ESCODE_TYPE_VARINT;
+static const byte ESCODE_TYPE_VSTRING = _ESCODE_TYPE_VSTRING;
+static const byte ESCODE_TYPE_VUNICODE = _ESCODE_TYPE_VUNICODE;
+static const byte ESCODE_TYPE_VLIST = _ESCODE_TYPE_VLIST;
+static const byte ESCODE_TYPE_VDICT = _ESCODE_TYPE_VDICT;
+static const byte ESCODE_TYPE_VRECORD = _ESCODE_TYPE_VRECORD;
+
+// version 2 index value type tags, in the order the types sort
+static const byte ESCODE_INDEX_NONE = '\x10';
+static const byte ESCODE_INDEX_FALSE = '\x20';
+static const byte ESCODE_INDEX_TRUE = '\x21';
+static const byte ESCODE_INDEX_INT = '\x30';
+static const byte ESCODE_INDEX_UINT64 = '\x31';
+static const byte ESCODE_INDEX_FLOAT = '\x40';
+static const byte ESCODE_INDEX_STRING = '\x50';
+static const byte ESCODE_INDEX_UNICODE = '\x60';
 
 static const int64_t MIN_USINT = 0;
 static const int64_t MAX_USINT = 65535;
@@ -129,8 +158,121 @@ encode_index_helper(PyObject *object, strbuf* buf) {
     return 1;
 }
 
+/* Version 2 index values compare bytewise in the same order as the values
+   they encode. Every value starts with a type tag, numbers are fixed width
+   big endian and strings are escaped and terminated so shorter ones sort
+   first */
+
+static inline
+void
+encode_index_uint64(byte tag, uint64_t val, strbuf* buf) {
+  byte bytes[9];
+  bytes[0] = tag;
+  for (int idx = 8; idx > 0; --idx) {
+    bytes[idx] = val & 0xFF;
+    val >>= 8;
+  }
+  strbuf_put(buf, bytes, sizeof(bytes));
+}
+
+static inline
+void
+encode_index_bytes(byte tag, const char* str, Py_ssize_t len, strbuf* buf) {
+  // \x00 is escaped as \x00\xFF and the value ends with \x00\x01
+  strbuf_put(buf, &tag, sizeof(byte));
+
+  const char* start = str;
+  const char* end = str + len;
+  for (const char* pos = str; pos < end; ++pos) {
+    if (*pos == '\0') {
+      strbuf_put(buf, start, pos - start + 1);
+      strbuf_put(buf, "\xFF", sizeof(byte));
+      start = pos + 1;
+    }
+  }
+
+  strbuf_put(buf, start, end - start);
+  strbuf_put(buf, "\x00\x01", sizeof(byte) * 2);
+}
+
+int
+encode_index_helper_v2(PyObject *object, strbuf* buf) {
+    if (object == Py_None) {
+      strbuf_put(buf, &ESCODE_INDEX_NONE, sizeof(byte));
+
+    } else if (object == Py_True) {
+      strbuf_put(buf, &ESCODE_INDEX_TRUE, sizeof(byte));
+
+    } else if (object == Py_False) {
+      strbuf_put(buf, &ESCODE_INDEX_FALSE, sizeof(byte));
+
+    } else if (PyInt_CheckExact(object) || PyLong_CheckExact(object)) {
+      int64_t val = PyLong_AsLongLong(object);
+      if (!PyErr_Occurred()) {
+        // flipping the sign bit puts negative numbers first
+        encode_index_uint64(ESCODE_INDEX_INT, (uint64_t)val ^ ((uint64_t)1 << 63), buf);
+
+      } else {
+        PyErr_Clear();
+
+        // unsigned 64 bit values above the signed range sort after it
+        uint64_t uval = PyLong_AsUnsignedLongLong(object);
+        if (PyErr_Occurred()) {
+          PyErr_SetString(ESCODE_EncodeError, "integer too large to index");
+          return 0;
+        }
+        encode_index_uint64(ESCODE_INDEX_UINT64, uval, buf);
+      }
+
+    } else if (PyFloat_CheckExact(object)) {
+      double val = PyFloat_AsDouble(object);
+      if (PyErr_Occurred()) {
+        PyErr_SetString(ESCODE_EncodeError, "error encoding float");
+        return 0;
+      }
+
+      // -0.0 == 0.0, so they must encode the same
+      if (val == 0.0) { val = 0.0; }
+
+      // positive floats get the sign bit set, negative ones are inverted
+      // so larger magnitudes sort first
+      uint64_t bits;
+      memcpy(&bits, &val, sizeof(bits));
+      bits = (bits >> 63) ? ~bits : bits | ((uint64_t)1 << 63);
+      encode_index_uint64(ESCODE_INDEX_FLOAT, bits, buf);
+
+    } else if (PyString_CheckExact(object)) {
+      char* str;
+      Py_ssize_t len;
+      PyString_AsStringAndSize(object, &str, &len);
+      encode_index_bytes(ESCODE_INDEX_STRING, str, len, buf);
+
+    } else if (PyUnicode_CheckExact(object)) {
+      // utf-8 preserves code point order
+      PyObject* sobject = PyUnicode_AsEncodedString(object, "utf-8", "strict");
+      if (sobject == NULL) { return 0; }
+
+      char* str;
+      Py_ssize_t len;
+      PyString_AsStringAndSize(sobject, &str, &len);
+      encode_index_bytes(ESCODE_INDEX_UNICODE, str, len, buf);
+      Py_DECREF(sobject);
+
+    } else {
+      PyErr_SetString(ESCODE_EncodeError, "object is not ESCODE index encodable");
+      return 0;
+    }
+
+    return 1;
+}
+
 int
-encode_index(PyObject *object, PyObject *open, strbuf* buf) {
+encode_index(PyObject *object, PyObject *open, strbuf* buf, int version) {
+  if (version != ESCODE_VERSION_1 && version != ESCODE_VERSION_2) {
+    PyErr_SetString(PyExc_ValueError, "unknown escode format version");
+    return 0;
+  }
+
   if (PyTuple_CheckExact(object)) {
     Py_ssize_t _len = PyTuple_Size(object);
     if (_len > MAX_USINT) {
@@ -142,7 +284,10 @@ encode_index(PyObject *object, PyObject *open, strbuf* buf) {
     uint16_t len = _len & 0xFFFF;
     for (uint16_t idx = 0; idx < len; ++idx) {
       strbuf_put(buf, "\x00", sizeof(byte));
-      if (!encode_index_helper(PyTuple_GetItem(object, idx), buf)) {
+
+      PyObject* item = PyTuple_GET_ITEM(object, idx);
+      if (!(version >= ESCODE_VERSION_2 ?
+            encode_index_helper_v2(item, buf) : encode_index_helper(item, buf))) {
         return 0;
       }
     }
@@ -160,8 +305,44 @@ encode_index(PyObject *object, PyObject *open, strbuf* buf) {
   return 1;
 }
 
+static inline
+void
+encode_varint(uint64_t val, strbuf* buf) {
+  byte bytes[10];
+  int len = 0;
+
+  do {
+    byte b = val & 0x7F;
+    val >>= 7;
+    if (val) { b |= 0x80; }
+    bytes[len++] = b;
+  } while (val);
+
+  strbuf_put(buf, bytes, len);
+}
+
+/* Writes the type and length of a string, list or dict. Version 1 uses a
+   16 bit length, version 2 a varint one so there is no limit on the size */
+
+static inline
+int
+encode_length(byte type, byte vtype, Py_ssize_t len, int version, strbuf* buf) {
+  if (version >= ESCODE_VERSION_2) {
+    strbuf_put(buf, &vtype, sizeof(byte));
+    encode_varint((uint64_t)len, buf);
+    return 1;
+  }
+
+  if (len > MAX_USINT) { return 0; }
+
+  uint16_t shortlen = len & 0xFFFF;
+  strbuf_put(buf, &type, sizeof(byte));
+  strbuf_put(buf, (byte*)&shortlen, sizeof(uint16_t));
+  return 1;
+}
+
 int
-encode_object(PyObject *object, strbuf* buf) {
+encode_object(PyObject *object, strbuf* buf, int version) {
 
     if (object == Py_None) {
       strbuf_put(buf, &ESCODE_TYPE_NONE, sizeof(byte));
@@ -189,6 +370,11 @@ encode_object(PyObject *object, strbuf* buf) {
         strbuf_put(buf, &ESCODE_TYPE_ULONG, sizeof(byte));
         strbuf_put(buf, (byte*)&uint64, sizeof(uint64_t));
 
+      } else if (version >= ESCODE_VERSION_2) {
+        // zig-zag varint, small magnitudes take a byte or two
+        strbuf_put(buf, &ESCODE_TYPE_VARINT, sizeof(byte));
+        encode_varint(((uint64_t)val << 1) ^ (uint64_t)(val >> 63), buf);
+
       } else if ((val >= MIN_INT) && (val <= MAX_INT)) {
         // 32 bit signed int
         int32_t ival = val & 0xFFFFFFFF;
@@ -219,16 +405,13 @@ encode_object(PyObject *object, strbuf* buf) {
 
     } else if (PyString_CheckExact(object)) {
       char* str;
-      Py_ssize_t _len;
-      PyString_AsStringAndSize(object, &str, &_len);
-      if (_len > MAX_USINT) {
+      Py_ssize_t len;
+      PyString_AsStringAndSize(object, &str, &len);
+
+      if (!encode_length(ESCODE_TYPE_STRING, ESCODE_TYPE_VSTRING, len, version, buf)) {
         PyErr_SetString(ESCODE_EncodeError, "string too long to encode");
         return 0;
       }
-
-      uint16_t len = _len & 0xFFFF;
-      strbuf_put(buf, &ESCODE_TYPE_STRING, sizeof(byte));
-      strbuf_put(buf, (byte*)&len, sizeof(uint16_t));
       strbuf_put(buf, (byte*)str, len);
 
     } else if (PyUnicode_CheckExact(object)) {
@@ -236,51 +419,42 @@ encode_object(PyObject *object, strbuf* buf) {
       if (sobject == NULL) { return 0; }
 
       char* str;
-      Py_ssize_t _len;
-      PyString_AsStringAndSize(sobject, &str, &_len);
-      if (_len > MAX_USINT) {
+      Py_ssize_t len;
+      PyString_AsStringAndSize(sobject, &str, &len);
+
+      if (!encode_length(ESCODE_TYPE_UNICODE, ESCODE_TYPE_VUNICODE, len, version, buf)) {
         PyErr_SetString(ESCODE_EncodeError, "ustring too long to encode");
         Py_DECREF(sobject);
         return 0;
       }
-
-      uint16_t len = _len & 0xFFFF;
-      strbuf_put(buf, &ESCODE_TYPE_UNICODE, sizeof(byte));
-      strbuf_put(buf, (byte*)&len, sizeof(uint16_t));
       strbuf_put(buf, (byte*)str, len);
       Py_DECREF(sobject);
 
     } else if (PyList_CheckExact(object)) {
-      Py_ssize_t _listlen = PyList_Size(object);
-      if (_listlen > MAX_USINT) {
+      Py_ssize_t listlen = PyList_GET_SIZE(object);
+
+      if (!encode_length(ESCODE_TYPE_LIST, ESCODE_TYPE_VLIST, listlen, version, buf)) {
         PyErr_SetString(ESCODE_EncodeError, "list too long to encode");
         return 0;
       }
-
-      uint16_t listlen = _listlen & 0xFFFF;
-      strbuf_put(buf, &ESCODE_TYPE_LIST, sizeof(byte));
-      strbuf_put(buf, (byte*)&listlen, sizeof(uint16_t));
-      for (uint16_t idx = 0; idx < listlen; ++idx) {
-        if (!encode_object(PyList_GetItem(object, idx), buf)) { return 0; }
+      for (Py_ssize_t idx = 0; idx < listlen; ++idx) {
+        if (!encode_object(PyList_GET_ITEM(object, idx), buf, version)) { return 0; }
       }
 
     } else if (PyDict_CheckExact(object)) {
-      Py_ssize_t _dictlen = PyDict_Size(object);
-      if (_dictlen > MAX_USINT) {
+      Py_ssize_t dictlen = PyDict_Size(object);
+
+      if (!encode_length(ESCODE_TYPE_DICT, ESCODE_TYPE_VDICT, dictlen, version, buf)) {
         PyErr_SetString(ESCODE_EncodeError, "dict too long to encode");
         return 0;
       }
 
-      uint16_t dictlen = _dictlen & 0xFFFF;
-      strbuf_put(buf, &ESCODE_TYPE_DICT, sizeof(byte));
-      strbuf_put(buf, (byte*)&dictlen, sizeof(uint16_t));
-
       PyObject *key, *value;
       Py_ssize_t pos = 0;
 
       while (PyDict_Next(object, &pos, &key, &value)) {
-        if (!encode_object(key, buf)) { return 0; }
-        if (!encode_object(value, buf)) { return 0; }
+        if (!encode_object(key, buf, version)) { return 0; }
+        if (!encode_object(value, buf, version)) { return 0; }
       }
 
     } else {
@@ -291,20 +465,106 @@ encode_object(PyObject *object, strbuf* buf) {
     return 1;
 }
 
+/* Records are dicts whose keys are written as varint field ids instead of
+   the key strings, the ids are looked up in the `fieldids` dict */
+
+int
+encode_record_object(PyObject *object, PyObject *fieldids, strbuf* buf, int version) {
+  if (!PyDict_CheckExact(object) || !PyDict_Check(fieldids)) {
+    PyErr_SetString(ESCODE_EncodeError, "records and field ids must be dicts");
+    return 0;
+  }
+
+  Py_ssize_t dictlen = PyDict_Size(object);
+  if (!encode_length(ESCODE_TYPE_RECORD, ESCODE_TYPE_VRECORD, dictlen, version, buf)) {
+    PyErr_SetString(ESCODE_EncodeError, "record too long to encode");
+    return 0;
+  }
+
+  PyObject *key, *value;
+  Py_ssize_t pos = 0;
+
+  while (PyDict_Next(object, &pos, &key, &value)) {
+    PyObject* fieldid = PyDict_GetItem(fieldids, key);
+    if (fieldid == NULL) {
+      PyErr_SetString(ESCODE_EncodeError, "record key has no field id");
+      return 0;
+    }
+
+    long id = PyInt_AsLong(fieldid);
+    if (id < 0) {
+      if (!PyErr_Occurred()) {
+        PyErr_SetString(ESCODE_EncodeError, "invalid field id");
+      }
+      return 0;
+    }
+
+    encode_varint((uint64_t)id, buf);
+    if (!encode_object(value, buf, version)) { return 0; }
+  }
+
+  return 1;
+}
+
+static inline
+int
+decode_varint(char** pstr, uint32_t* size, uint64_t* val) {
+  uint64_t result = 0;
+
+  for (int shift = 0; shift < 64 && *size; shift += 7) {
+    unsigned char b = **pstr;
+    *pstr += sizeof(byte);
+    *size -= sizeof(byte);
+
+    result |= (uint64_t)(b & 0x7F) << shift;
+    if (!(b & 0x80)) {
+      *val = result;
+      return 1;
+    }
+  }
+
+  PyErr_SetString(ESCODE_DecodeError, "corrupted varint");
+  return 0;
+}
+
+/* Reads the length of a string, list, dict or record of the given type,
+   16 bit for version 1 types and varint for version 2 ones. `minsize` is
+   the least bytes each item takes, so corrupt lengths are caught before
+   allocating */
+
 static inline
-uint16_t
-decode_len(char** pstr, uint32_t* size) {
+int
+decode_length(byte type, char** pstr, uint32_t* size, uint32_t minsize, uint32_t* len) {
+  if (type >= _ESCODE_TYPE_VARINT) {
+    uint64_t val;
+    if (!decode_varint(pstr, size, &val)) { return 0; }
+    if (val > MAX_UINT) {
+      PyErr_SetString(ESCODE_DecodeError, "corrupted string");
+      return 0;
+    }
+    *len = (uint32_t)val;
+
+  } else {
     if (*size < sizeof(uint16_t)) {
       PyErr_SetString(ESCODE_DecodeError, "corrupted string");
       return 0;
     }
 
-    uint16_t len = *((uint16_t*)*pstr);
+    *len = *((uint16_t*)*pstr);
     *pstr += sizeof(uint16_t);
     *size -= sizeof(uint16_t);
-    return len;
+  }
+
+  if ((uint64_t)*len * minsize > *size) {
+    PyErr_SetString(ESCODE_DecodeError, "corrupted string");
+    return 0;
+  }
+
+  return 1;
 }
 
+PyObject* decode_record_fields(byte type, char** pstr, uint32_t* size, PyObject* fieldnames);
+
 PyObject*
 decode_object(char** pstr, uint32_t* size) {
   if (*size < sizeof(byte)) {
@@ -400,13 +660,20 @@ decode_object(char** pstr, uint32_t* size) {
     return PyFloat_FromDouble(val);
   }
 
-  case _ESCODE_TYPE_STRING: {
+  case _ESCODE_TYPE_VARINT: {
 
-    uint16_t len = decode_len(pstr, size);
-    if (PyErr_Occurred() || *size < len) {
-      PyErr_SetString(ESCODE_DecodeError, "corrupted string");
-      return NULL;
-    }
+    uint64_t zigzag;
+    if (!decode_varint(pstr, size, &zigzag)) { return NULL; }
+
+    int64_t val = (int64_t)(zigzag >> 1) ^ -(int64_t)(zigzag & 1);
+    return PyInt_FromLong((long)val);
+  }
+
+  case _ESCODE_TYPE_STRING:
+  case _ESCODE_TYPE_VSTRING: {
+
+    uint32_t len;
+    if (!decode_length(type, pstr, size, 1, &len)) { return NULL; }
 
     PyObject* obj = PyString_FromStringAndSize(*pstr, len);
     *pstr += len;
@@ -414,13 +681,11 @@ decode_object(char** pstr, uint32_t* size) {
     return obj;
   }
 
-  case _ESCODE_TYPE_UNICODE: {
+  case _ESCODE_TYPE_UNICODE:
+  case _ESCODE_TYPE_VUNICODE: {
 
-    uint16_t len = decode_len(pstr, size);
-    if (PyErr_Occurred() || *size < len) {
-      PyErr_SetString(ESCODE_DecodeError, "corrupted string");
-      return NULL;
-    }
+    uint32_t len;
+    if (!decode_length(type, pstr, size, 1, &len)) { return NULL; }
 
     PyObject* obj = PyUnicode_Decode(*pstr, len, "utf-8", "strict");
     *pstr += len;
@@ -428,42 +693,44 @@ decode_object(char** pstr, uint32_t* size) {
     return obj;
   }
 
-  case _ESCODE_TYPE_LIST: {
+  case _ESCODE_TYPE_LIST:
+  case _ESCODE_TYPE_VLIST: {
 
-    uint16_t len = decode_len(pstr, size);
-    if (PyErr_Occurred()) {
-      PyErr_SetString(ESCODE_DecodeError, "corrupted string");
-      return NULL;
-    }
+    uint32_t len;
+    if (!decode_length(type, pstr, size, 1, &len)) { return NULL; }
 
     PyObject* obj = PyList_New(len);
     if (obj == NULL) { return NULL; }
 
-    for (uint16_t idx = 0; idx < len; ++idx) {
+    for (uint32_t idx = 0; idx < len; ++idx) {
       PyObject* elem = decode_object(pstr, size);
-      // PyList_SetItem steals the reference even on failure
-      if (elem == NULL || PyList_SetItem(obj, idx, elem) < 0) {
+      if (elem == NULL) {
         Py_DECREF(obj);
         return NULL;
       }
+      PyList_SET_ITEM(obj, idx, elem);
     }
 
     return obj;
   }
 
-  case _ESCODE_TYPE_DICT: {
+  case _ESCODE_TYPE_DICT:
+  case _ESCODE_TYPE_VDICT: {
 
-    uint16_t len = decode_len(pstr, size);
-    if (PyErr_Occurred()) {
-      PyErr_SetString(ESCODE_DecodeError, "corrupted string");
-      return NULL;
-    }
+    uint32_t len;
+    if (!decode_length(type, pstr, size, 2, &len)) { return NULL; }
 
     PyObject* obj = PyDict_New();
     if (obj == NULL) { return NULL; }
 
-    for (uint16_t idx = 0; idx < len; ++idx) {
+    for (uint32_t idx = 0; idx < len; ++idx) {
       PyObject* key = decode_object(pstr, size);
+
+      // keys repeat across rows, share a single object for each of them
+      if (key != NULL && PyString_CheckExact(key)) {
+        PyString_InternInPlace(&key);
+      }
+
       PyObject* val = decode_object(pstr, size);
       if (key == NULL || val == NULL || PyDict_SetItem(obj, key, val) < 0) {
         Py_XDECREF(key);
@@ -478,34 +745,115 @@ decode_object(char** pstr, uint32_t* size) {
 
     return obj;
   }
+
+  case _ESCODE_TYPE_RECORD:
+  case _ESCODE_TYPE_VRECORD: {
+    // without field names a record decodes to a dict keyed by field id
+    return decode_record_fields(type, pstr, size, NULL);
+  }
   }
 
+  PyErr_SetString(ESCODE_DecodeError, "unknown type");
   return NULL;
 }
 
+/* Decode a record using `fieldnames` (field id -> key) for its keys, fields
+   without a name are skipped. Anything other than a record (like rows
+   written before records were used) is decoded as is */
+
+PyObject*
+decode_record_fields(byte type, char** pstr, uint32_t* size, PyObject* fieldnames) {
+  uint32_t len;
+  if (!decode_length(type, pstr, size, 2, &len)) { return NULL; }
+
+  PyObject* obj = PyDict_New();
+  if (obj == NULL) { return NULL; }
+
+  for (uint32_t idx = 0; idx < len; ++idx) {
+    uint64_t id;
+    if (!decode_varint(pstr, size, &id)) {
+      Py_DECREF(obj);
+      return NULL;
+    }
+
+    PyObject* key = id <= LONG_MAX ?
+      PyInt_FromLong((long)id) : PyLong_FromUnsignedLongLong(id);
+    PyObject* val = decode_object(pstr, size);
+    if (key == NULL || val == NULL) {
+      Py_XDECREF(key);
+      Py_XDECREF(val);
+      Py_DECREF(obj);
+      return NULL;
+    }
+
+    int ret = 0;
+    if (fieldnames == NULL) {
+      ret = PyDict_SetItem(obj, key, val);
+    } else {
+      PyObject* name = PyDict_GetItem(fieldnames, key);
+      if (name != NULL) {
+        ret = PyDict_SetItem(obj, name, val);
+      }
+    }
+
+    Py_DECREF(key);
+    Py_DECREF(val);
+    if (ret < 0) {
+      Py_DECREF(obj);
+      return NULL;
+    }
+  }
+
+  return obj;
+}
+
+PyObject*
+decode_record_object(char** pstr, uint32_t* size, PyObject* fieldnames) {
+  if (*size < sizeof(byte) ||
+      (**pstr != _ESCODE_TYPE_RECORD && **pstr != _ESCODE_TYPE_VRECORD)) {
+    return decode_object(pstr, size);
+  }
+
+  byte type = **pstr;
+  *pstr += sizeof(byte);
+  *size -= sizeof(byte);
+  return decode_record_fields(type, pstr, size, fieldnames);
+}
+
 /* Encode object or list into its ESCODE index representation */
 
+/* Copy the encoded contents of buf into a new string */
+
 static PyObject*
-ESCODE_encode_index(PyObject *self, PyObject *args)
+strbuf_to_string(strbuf* buf)
 {
-  strbuf* buf = strbuf_new();
-  if (buf == NULL) {
-    PyErr_SetString(ESCODE_EncodeError, "Error intializing index encode buffer");
-    return NULL;
+  if (buf->failed) {
+    return PyErr_NoMemory();
   }
+  return PyString_FromStringAndSize(buf->str, buf->offset);
+}
 
+static PyObject*
+ESCODE_encode_index(PyObject *self, PyObject *args)
+{
   PyObject *object;
   PyObject *open = Py_False;
+  int version = ESCODE_VERSION_1;
 
-  if (!PyArg_ParseTuple(args, "O|O", &object, &open)) {
-    PyErr_SetString(ESCODE_EncodeError, "Error intializing index encode buffer");
+  if (!PyArg_ParseTuple(args, "O|Oi", &object, &open, &version)) {
+    return NULL;
   }
 
-  if (!encode_index(object, open, buf)) {
+  strbuf* buf = strbuf_new();
+  if (buf == NULL) {
+    PyErr_SetString(ESCODE_EncodeError, "Error intializing index encode buffer");
     return NULL;
   }
 
-  PyObject* ret = PyString_FromStringAndSize(buf->str, buf->offset);
+  PyObject* ret = NULL;
+  if (encode_index(object, open, buf, version)) {
+    ret = strbuf_to_string(buf);
+  }
 
   strbuf_free(buf);
   return ret;
@@ -522,39 +870,538 @@ ESCODE_encode(PyObject *self, PyObject *object)
     return NULL;
   }
 
-  if (!encode_object(object, buf)) {
-    return NULL;
+  PyObject* ret = NULL;
+  if (encode_object(object, buf, ESCODE_VERSION_1)) {
+    ret = strbuf_to_string(buf);
   }
 
-  PyObject* ret = PyString_FromStringAndSize(buf->str, buf->offset);
-
   strbuf_free(buf);
   return ret;
 }
 
 
-/* Decode ESCODE representation into python objects */
+/* Encode a list of objects into their ESCODE representations */
 
 static PyObject*
-ESCODE_decode(PyObject *self, PyObject *object)
+ESCODE_encode_many(PyObject *self, PyObject *objects)
 {
-  if (!PyString_CheckExact(object)) {
-    PyErr_SetString(ESCODE_DecodeError, "Can not decode non-string");
+  PyObject* seq = PySequence_Fast(objects, "encode_many expects a sequence");
+  if (seq == NULL) { return NULL; }
+
+  Py_ssize_t len = PySequence_Fast_GET_SIZE(seq);
+  PyObject* ret = PyList_New(len);
+  if (ret == NULL) {
+    Py_DECREF(seq);
     return NULL;
   }
 
+  // a single buffer is reused for every object
+  strbuf* buf = strbuf_new();
+  if (buf == NULL) {
+    PyErr_SetString(ESCODE_EncodeError, "Error intializing encode buffer");
+    Py_DECREF(seq);
+    Py_DECREF(ret);
+    return NULL;
+  }
+
+  for (Py_ssize_t idx = 0; idx < len; ++idx) {
+    buf->offset = 0;
+    PyObject* str = NULL;
+
+    if (encode_object(PySequence_Fast_GET_ITEM(seq, idx), buf, ESCODE_VERSION_1)) {
+      str = strbuf_to_string(buf);
+    }
+
+    if (str == NULL) {
+      strbuf_free(buf);
+      Py_DECREF(seq);
+      Py_DECREF(ret);
+      return NULL;
+    }
+
+    PyList_SET_ITEM(ret, idx, str);
+  }
+
+  strbuf_free(buf);
+  Py_DECREF(seq);
+  return ret;
+}
+
+/* Decode `length` bytes (-1 for all) at `offset` of a string or any object
+   supporting the buffer protocol, setting `consumed` to the bytes read, or
+   failing on trailing bytes when `consumed` is NULL. Records are decoded
+   using `fieldnames` when it isn't NULL */
+
+static
+PyObject*
+decode_buffer(PyObject *object, Py_ssize_t offset, Py_ssize_t length,
+              PyObject* fieldnames, Py_ssize_t* consumed)
+{
+  Py_buffer view;
+  view.obj = NULL;
+
   char* str;
   Py_ssize_t slen;
-  PyString_AsStringAndSize(object, &str, &slen);
+
+  if (PyString_CheckExact(object)) {
+    PyString_AsStringAndSize(object, &str, &slen);
+
+  } else if (PyObject_CheckBuffer(object)) {
+    // bytearray, memoryview and other new style buffers are read in place
+    if (PyObject_GetBuffer(object, &view, PyBUF_SIMPLE) < 0) { return NULL; }
+    str = (char*)view.buf;
+    slen = view.len;
+
+  } else if (PyObject_CheckReadBuffer(object)) {
+    // old style buffers like mmap and buffer
+    if (PyObject_AsReadBuffer(object, (const void**)&str, &slen) < 0) { return NULL; }
+
+  } else {
+    PyErr_SetString(ESCODE_DecodeError, "Can not decode non-string");
+    return NULL;
+  }
+
+  if (offset < 0 || offset > slen) {
+    PyBuffer_Release(&view);
+    PyErr_SetString(ESCODE_DecodeError, "offset out of range");
+    return NULL;
+  }
+
+  slen -= offset;
+  if (length >= 0) {
+    if (length > slen) {
+      PyBuffer_Release(&view);
+      PyErr_SetString(ESCODE_DecodeError, "length out of range");
+      return NULL;
+    }
+    slen = length;
+  }
+
   if (slen > MAX_UINT) {
+    PyBuffer_Release(&view);
     PyErr_SetString(ESCODE_DecodeError, "string too long to decode");
-    return 0;
+    return NULL;
   }
 
+  str += offset;
   uint32_t size = (uint32_t)slen;
-  return decode_object(&str, &size);
+  PyObject* ret = fieldnames == NULL ?
+    decode_object(&str, &size) : decode_record_object(&str, &size, fieldnames);
+  if (consumed != NULL) {
+    *consumed = slen - size;
+  } else if (ret != NULL && size != 0) {
+    Py_DECREF(ret);
+    ret = NULL;
+    PyErr_SetString(ESCODE_DecodeError, "trailing bytes after ESCODE value");
+  }
+
+  PyBuffer_Release(&view);
+  return ret;
+}
+
+static inline
+PyObject*
+decode_string(PyObject *object, PyObject *fieldnames)
+{
+  return decode_buffer(object, 0, -1, fieldnames, NULL);
+}
+
+/* Decode ESCODE representation into python objects */
+
+static PyObject*
+ESCODE_decode(PyObject *self, PyObject *args)
+{
+  // fast path for the common decode(string)
+  if (PyTuple_GET_SIZE(args) == 1) {
+    return decode_string(PyTuple_GET_ITEM(args, 0), NULL);
+  }
+
+  PyObject *object;
+  Py_ssize_t offset = 0;
+  Py_ssize_t length = -1;
+
+  if (!PyArg_ParseTuple(args, "O|nn", &object, &offset, &length)) {
+    return NULL;
+  }
+
+  return decode_buffer(object, offset, length, NULL, NULL);
+}
+
+/* Decode one ESCODE value from a buffer, returning it with the bytes read */
+
+static PyObject*
+ESCODE_decode_from(PyObject *self, PyObject *args)
+{
+  PyObject *object;
+  Py_ssize_t offset = 0;
+  Py_ssize_t length = -1;
+  Py_ssize_t consumed = 0;
+
+  if (!PyArg_ParseTuple(args, "O|nn", &object, &offset, &length)) {
+    return NULL;
+  }
+
+  PyObject* obj = decode_buffer(object, offset, length, NULL, &consumed);
+  if (obj == NULL) { return NULL; }
+
+  return Py_BuildValue("(Nn)", obj, consumed);
+}
+
+/* Decode a record using its field names */
+
+static PyObject*
+ESCODE_decode_record(PyObject *self, PyObject *args)
+{
+  PyObject *object;
+  PyObject *fieldnames;
+
+  if (!PyArg_ParseTuple(args, "OO!", &object, &PyDict_Type, &fieldnames)) {
+    return NULL;
+  }
+
+  return decode_string(object, fieldnames);
+}
+
+/* Decode a list of ESCODE strings, or of rows holding one, in a single call */
+
+static PyObject*
+ESCODE_decode_many(PyObject *self, PyObject *args)
+{
+  PyObject *objects;
+  Py_ssize_t column = -1;
+  PyObject *fieldnames = Py_None;
+
+  if (!PyArg_ParseTuple(args, "O|nO", &objects, &column, &fieldnames)) {
+    return NULL;
+  }
+
+  if (fieldnames == Py_None) {
+    fieldnames = NULL;
+  } else if (!PyDict_Check(fieldnames)) {
+    PyErr_SetString(ESCODE_DecodeError, "field names must be a dict");
+    return NULL;
+  }
+
+  PyObject* seq = PySequence_Fast(objects, "decode_many expects a sequence");
+  if (seq == NULL) { return NULL; }
+
+  Py_ssize_t len = PySequence_Fast_GET_SIZE(seq);
+  PyObject* ret = PyList_New(len);
+  if (ret == NULL) {
+    Py_DECREF(seq);
+    return NULL;
+  }
+
+  for (Py_ssize_t idx = 0; idx < len; ++idx) {
+    PyObject* item = PySequence_Fast_GET_ITEM(seq, idx);
+
+    // rows are tuples (or lists) with the string at `column`
+    if (PyTuple_CheckExact(item) || PyList_CheckExact(item)) {
+      Py_ssize_t rowlen = PySequence_Fast_GET_SIZE(item);
+      Py_ssize_t col = column < 0 ? column + rowlen : column;
+      if (col < 0 || col >= rowlen) {
+        PyErr_SetString(ESCODE_DecodeError, "row has no such column");
+        Py_DECREF(seq);
+        Py_DECREF(ret);
+        return NULL;
+      }
+      item = PySequence_Fast_GET_ITEM(item, col);
+    }
+
+    PyObject* obj = decode_string(item, fieldnames);
+    if (obj == NULL) {
+      Py_DECREF(seq);
+      Py_DECREF(ret);
+      return NULL;
+    }
+
+    PyList_SET_ITEM(ret, idx, obj);
+  }
+
+  Py_DECREF(seq);
+  return ret;
+}
+
+
+/* Encoder objects keep one buffer across calls instead of allocating and
+   growing a new one per encode. The buffer is sized from a moving average
+   of the records encoded so far, and shrunk back when a rare large record
+   left it much bigger than that */
+
+#define ENCODER_MIN_SIZE 256
+#define ENCODER_MAX_SLACK 4
+
+typedef struct {
+  PyObject_HEAD
+  strbuf* buf;
+  uint32_t hint;
+  int version;
+} EncoderObject;
+
+static int
+Encoder_init(EncoderObject *self, PyObject *args, PyObject *kwargs)
+{
+  static char *kwlist[] = {"size_hint", "version", NULL};
+  unsigned int hint = 0;
+  int version = ESCODE_VERSION_1;
+
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|Ii", kwlist, &hint, &version)) {
+    return -1;
+  }
+
+  if (version != ESCODE_VERSION_1 && version != ESCODE_VERSION_2) {
+    PyErr_SetString(PyExc_ValueError, "unknown escode format version");
+    return -1;
+  }
+
+  self->hint = hint;
+  self->version = version;
+  if (self->buf == NULL) {
+    self->buf = strbuf_new_size(hint * 2 > ENCODER_MIN_SIZE ? hint * 2 : ENCODER_MIN_SIZE);
+    if (self->buf == NULL) {
+      PyErr_SetString(ESCODE_EncodeError, "Error intializing encode buffer");
+      return -1;
+    }
+  }
+
+  return 0;
+}
+
+static void
+Encoder_dealloc(EncoderObject *self)
+{
+  strbuf_free(self->buf);
+  Py_TYPE(self)->tp_free((PyObject*)self);
+}
+
+static strbuf*
+encoder_reset(EncoderObject *self)
+{
+  strbuf* buf = self->buf;
+  if (buf == NULL) {
+    PyErr_SetString(ESCODE_EncodeError, "Encoder is not initialized");
+    return NULL;
+  }
+
+  buf->offset = 0;
+  buf->failed = 0;
+
+  // grow once up front rather than doubling while encoding
+  uint32_t target = self->hint * 2;
+  if (target > buf->size) {
+    strbuf_resize(buf, target);
+  }
+
+  return buf;
+}
+
+static PyObject*
+encoder_record(EncoderObject *self)
+{
+  strbuf* buf = self->buf;
+  PyObject* ret = strbuf_to_string(buf);
+
+  self->hint = (uint32_t)(((uint64_t)self->hint * 7 + buf->offset) / 8);
+
+  uint32_t target = self->hint * 2;
+  if (target < ENCODER_MIN_SIZE) { target = ENCODER_MIN_SIZE; }
+  if (buf->size > target * ENCODER_MAX_SLACK) {
+    buf->offset = 0;
+    strbuf_resize(buf, target);
+  }
+
+  return ret;
 }
 
+static PyObject*
+Encoder_encode(EncoderObject *self, PyObject *object)
+{
+  strbuf* buf = encoder_reset(self);
+  if (buf == NULL) { return NULL; }
+
+  if (!encode_object(object, buf, self->version)) { return NULL; }
+  return encoder_record(self);
+}
+
+static PyObject*
+Encoder_encode_index(EncoderObject *self, PyObject *args)
+{
+  PyObject *object;
+  PyObject *open = Py_False;
+  int version = ESCODE_VERSION_1;
+
+  if (!PyArg_ParseTuple(args, "O|Oi", &object, &open, &version)) {
+    return NULL;
+  }
+
+  strbuf* buf = self->buf;
+  if (buf == NULL) {
+    PyErr_SetString(ESCODE_EncodeError, "Encoder is not initialized");
+    return NULL;
+  }
+
+  buf->offset = 0;
+  buf->failed = 0;
+
+  if (!encode_index(object, open, buf, version)) { return NULL; }
+  return strbuf_to_string(buf);
+}
+
+static PyObject*
+Encoder_encode_record(EncoderObject *self, PyObject *args)
+{
+  PyObject *object;
+  PyObject *indextuples;
+  PyObject *fieldids = Py_None;
+  PyObject *indexversions = Py_None;
+
+  if (!PyArg_ParseTuple(args, "OO|OO", &object, &indextuples, &fieldids, &indexversions)) {
+    return NULL;
+  }
+
+  PyObject* seq = PySequence_Fast(indextuples, "encode_record expects a sequence of index tuples");
+  if (seq == NULL) { return NULL; }
+
+  Py_ssize_t len = PySequence_Fast_GET_SIZE(seq);
+
+  // index format version of each index tuple, version 1 if not given
+  PyObject* versions = NULL;
+  if (indexversions != Py_None) {
+    versions = PySequence_Fast(indexversions, "encode_record expects a sequence of index versions");
+    if (versions == NULL) {
+      Py_DECREF(seq);
+      return NULL;
+    }
+    if (PySequence_Fast_GET_SIZE(versions) != len) {
+      PyErr_SetString(PyExc_ValueError, "need one index version per index tuple");
+      Py_DECREF(versions);
+      Py_DECREF(seq);
+      return NULL;
+    }
+  }
+
+  PyObject* indexvalues = PyList_New(len);
+  if (indexvalues == NULL) {
+    Py_XDECREF(versions);
+    Py_DECREF(seq);
+    return NULL;
+  }
+
+  PyObject* data = NULL;
+  strbuf* buf = encoder_reset(self);
+  if (buf != NULL && (fieldids == Py_None ?
+                      encode_object(object, buf, self->version) :
+                      encode_record_object(object, fieldids, buf, self->version))) {
+    data = encoder_record(self);
+  }
+
+  for (Py_ssize_t idx = 0; data != NULL && idx < len; ++idx) {
+    buf->offset = 0;
+    PyObject* str = NULL;
+
+    int version = ESCODE_VERSION_1;
+    if (versions != NULL) {
+      version = (int)PyInt_AsLong(PySequence_Fast_GET_ITEM(versions, idx));
+    }
+
+    if (!PyErr_Occurred() && encode_index(PySequence_Fast_GET_ITEM(seq, idx), Py_False, buf, version)) {
+      str = strbuf_to_string(buf);
+    }
+
+    if (str == NULL) {
+      Py_CLEAR(data);
+      break;
+    }
+
+    PyList_SET_ITEM(indexvalues, idx, str);
+  }
+
+  Py_XDECREF(versions);
+  Py_DECREF(seq);
+  if (data == NULL) {
+    Py_DECREF(indexvalues);
+    return NULL;
+  }
+
+  return Py_BuildValue("(NN)", data, indexvalues);
+}
+
+static PyObject*
+Encoder_get_size_hint(EncoderObject *self, void *closure)
+{
+  return PyInt_FromSize_t(self->hint);
+}
+
+static PyMethodDef Encoder_methods[] = {
+    {"encode", (PyCFunction)Encoder_encode,  METH_O,
+     PyDoc_STR("encode(object) -> generate the ESCODE representation for object.")},
+
+    {"encode_index", (PyCFunction)Encoder_encode_index,  METH_VARARGS,
+     PyDoc_STR("encode_index(tuple, open=False, version=1) -> generate the ESCODE index representation for tuple.")},
+
+    {"encode_record", (PyCFunction)Encoder_encode_record,  METH_VARARGS,
+     PyDoc_STR("encode_record(object, indextuples, fieldids=None, indexversions=None) -> (ESCODE representation, [index representations])")},
+
+    {NULL, NULL}  // sentinel
+};
+
+static PyObject*
+Encoder_get_version(EncoderObject *self, void *closure)
+{
+  return PyInt_FromLong(self->version);
+}
+
+static PyGetSetDef Encoder_getset[] = {
+    {"version", (getter)Encoder_get_version, NULL,
+     PyDoc_STR("format version written by the encoder"), NULL},
+
+    {"size_hint", (getter)Encoder_get_size_hint, NULL,
+     PyDoc_STR("average size of the records encoded so far"), NULL},
+
+    {NULL}  // sentinel
+};
+
+static PyTypeObject EncoderType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "escode.Encoder",                         /* tp_name */
+    sizeof(EncoderObject),                    /* tp_basicsize */
+    0,                                        /* tp_itemsize */
+    (destructor)Encoder_dealloc,              /* tp_dealloc */
+    0,                                        /* tp_print */
+    0,                                        /* tp_getattr */
+    0,                                        /* tp_setattr */
+    0,                                        /* tp_compare */
+    0,                                        /* tp_repr */
+    0,                                        /* tp_as_number */
+    0,                                        /* tp_as_sequence */
+    0,                                        /* tp_as_mapping */
+    0,                                        /* tp_hash */
+    0,                                        /* tp_call */
+    0,                                        /* tp_str */
+    0,                                        /* tp_getattro */
+    0,                                        /* tp_setattro */
+    0,                                        /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE, /* tp_flags */
+    PyDoc_STR("Encoder(size_hint=0, version=1) -> ESCODE encoder reusing its buffer across calls"), /* tp_doc */
+    0,                                        /* tp_traverse */
+    0,                                        /* tp_clear */
+    0,                                        /* tp_richcompare */
+    0,                                        /* tp_weaklistoffset */
+    0,                                        /* tp_iter */
+    0,                                        /* tp_iternext */
+    Encoder_methods,                          /* tp_methods */
+    0,                                        /* tp_members */
+    Encoder_getset,                           /* tp_getset */
+    0,                                        /* tp_base */
+    0,                                        /* tp_dict */
+    0,                                        /* tp_descr_get */
+    0,                                        /* tp_descr_set */
+    0,                                        /* tp_dictoffset */
+    (initproc)Encoder_init,                   /* tp_init */
+    0,                                        /* tp_alloc */
+    PyType_GenericNew,                        /* tp_new */
+};
+
 
 /* List of functions defined in the module */
 
@@ -562,11 +1409,23 @@ static PyMethodDef escode_methods[] = {
     {"encode", (PyCFunction)ESCODE_encode,  METH_O,
      PyDoc_STR("encode(object) -> generate the ESCODE representation for object.")},
 
-    {"decode", (PyCFunction)ESCODE_decode,  METH_O,
-     PyDoc_STR("decode(string) -> parse the ESCODE representation into python objects\n")},
+    {"decode", (PyCFunction)ESCODE_decode,  METH_VARARGS,
+     PyDoc_STR("decode(buffer, offset=0, length=-1) -> parse the ESCODE representation into python objects, trailing bytes are an error\n")},
+
+    {"decode_from", (PyCFunction)ESCODE_decode_from,  METH_VARARGS,
+     PyDoc_STR("decode_from(buffer, offset=0, length=-1) -> (object, bytes consumed)\n")},
+
+    {"encode_many", (PyCFunction)ESCODE_encode_many,  METH_O,
+     PyDoc_STR("encode_many(objects) -> list of ESCODE representations, one per object.")},
+
+    {"decode_many", (PyCFunction)ESCODE_decode_many,  METH_VARARGS,
+     PyDoc_STR("decode_many(strings_or_rows, column=-1, fieldnames=None) -> list of decoded python objects\n")},
+
+    {"decode_record", (PyCFunction)ESCODE_decode_record,  METH_VARARGS,
+     PyDoc_STR("decode_record(buffer, fieldnames) -> decode a record, naming its fields by id\n")},
 
     {"encode_index", (PyCFunction)ESCODE_encode_index,  METH_VARARGS,
-     PyDoc_STR("encode(object) -> generate the ESCODE index representation for object.")},
+     PyDoc_STR("encode_index(tuple, open=False, version=1) -> generate the ESCODE index representation for tuple.")},
 
     {NULL, NULL}  // sentinel
 };
@@ -582,10 +1441,16 @@ initescode(void)
 {
     PyObject *m;
 
+    if (PyType_Ready(&EncoderType) < 0)
+        return;
+
     m = Py_InitModule3("escode", escode_methods, module_doc);
     if (m == NULL)
         return;
 
+    Py_INCREF(&EncoderType);
+    PyModule_AddObject(m, "Encoder", (PyObject*)&EncoderType);
+
     ESCODE_Error = PyErr_NewException("on.Error", NULL, NULL);
     if (ESCODE_Error == NULL)
         return;
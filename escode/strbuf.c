@@ -2,14 +2,38 @@
 
 strbuf*
 strbuf_new() {
+  return strbuf_new_size(1024);
+}
+
+strbuf*
+strbuf_new_size(uint32_t size) {
   strbuf* buf = (strbuf*)malloc(sizeof(strbuf));
   if (buf == NULL) { return NULL; }
-  buf->size = 1024;
+  if (size == 0) { size = 1; }
+  buf->size = size;
   buf->offset = 0;
+  buf->failed = 0;
   buf->str = (char*) malloc(sizeof(char) * buf->size);
+  if (buf->str == NULL) {
+    free(buf);
+    return NULL;
+  }
   return buf;
 }
 
+int
+strbuf_resize(strbuf* buf, uint32_t size) {
+  if (size < buf->offset) { size = buf->offset; }
+  if (size == 0) { size = 1; }
+
+  char* str = (char*) realloc(buf->str, sizeof(char) * size);
+  if (str == NULL) { return 0; }
+
+  buf->str = str;
+  buf->size = size;
+  return 1;
+}
+
 int
 strbuf_free(strbuf* buf) {
   if (buf == NULL || buf->str == NULL) { return 0; }
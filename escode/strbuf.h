@@ -18,30 +18,29 @@ typedef struct strbuf {
   char *str;
   uint32_t size;
   uint32_t offset;
+  int failed;
 } strbuf;
 
 strbuf* strbuf_new(void);
+strbuf* strbuf_new_size(uint32_t size);
 int strbuf_free(strbuf* buf);
+int strbuf_resize(strbuf* buf, uint32_t size);
 
 inline int strbuf_put(strbuf* buf, const char* contents, uint32_t size) {
   if (buf == NULL) { return 0; }
 
-  char* old_str = buf->str;
-  int required_size = buf->offset + size;
+  uint32_t required_size = buf->offset + size;
 
   // Ensure there is enough space in the buffer
   if (buf->size < required_size) {
-    int new_size = buf->size * 2;
+    uint32_t new_size = buf->size * 2;
     if (new_size < required_size) { new_size = required_size; }
 
-    buf->str = (char*) realloc(buf->str, sizeof(char) * new_size);
-    if (buf->str == NULL) {
-      free(old_str);
-      free(buf);
+    // on failure the buffer is left untouched, the owner still frees it
+    if (!strbuf_resize(buf, new_size)) {
+      buf->failed = 1;
       return 0;
     }
-
-    buf->size = new_size;
   }
 
   memcpy(buf->str + buf->offset, contents, size);
@@ -1,7 +1,5 @@
 import escode
 import json
-import cjson
-import bson
 import random
 import time
 import cProfile
@@ -50,7 +48,16 @@ def do(n, enc, dec):
     assert d == input
     print n,et,dt
 
-do('cjson', cjson.encode, cjson.decode)
+# cjson and bson are only compared against when they're installed
+try:
+    import cjson
+    do('cjson', cjson.encode, cjson.decode)
+except ImportError:
+    pass
 do('json', json.dumps, json.loads)
-do('bson', bson.BSON.encode, bson.BSON.decode)
+try:
+    import bson
+    do('bson', bson.BSON.encode, bson.BSON.decode)
+except ImportError:
+    pass
 do('escode', escode.encode, escode.decode)
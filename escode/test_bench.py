@@ -0,0 +1,50 @@
+import os
+import json
+import shutil
+import tempfile
+
+import bench
+
+# benchmark suite checks, run with `python test_bench.py` after building the
+# extension in place
+
+results = bench.bench(0.001)
+for name, shape in bench.SHAPES:
+    for op in ('encode', 'decode', 'encode_record', 'decode_many'):
+        for suffix in ('', '/v2'):
+            assert results['%s/%s%s' % (name, op, suffix)]['ops'] > 0
+    assert results['%s/decode' % name]['bytes'] > results['%s/decode/v2' % name]['bytes'] > 0
+    assert results['%s/decode_many' % name]['objects'] > 0
+for name, index in bench.INDEXES:
+    assert results['index/%s' % name]['bytes'] > 0 and results['index/%s/v2' % name]['ops'] > 0
+
+# regressions are flagged against the baseline, new benchmarks aren't
+baseline = {
+    'a': {'ops': 100.0, 'bytes': 10.0},
+    'b': {'ops': 100.0, 'bytes': 10.0, 'objects': 2.0},
+    'c': {'ops': 100.0, 'bytes': 10.0},
+}
+lines, regressed = bench.compare({'a': {'ops': 95.0, 'bytes': 10.5}, 'd': {'ops': 1.0}}, baseline, 0.1)
+assert not regressed and 'new' in lines[1]
+for result, flag in (({'ops': 80.0, 'bytes': 10.0}, 'SLOWER'),
+                     ({'ops': 100.0, 'bytes': 12.0}, 'BIGGER'),
+                     ({'ops': 100.0, 'bytes': 10.0, 'objects': 3.0}, 'ALLOCS')):
+    lines, regressed = bench.compare({'b': result}, baseline, 0.1)
+    assert regressed and lines[0].endswith(flag), lines
+
+# saved results are a baseline that passes, until it is made faster
+tmpdir = tempfile.mkdtemp()
+path = os.path.join(tmpdir, 'baseline.json')
+assert bench.main(['--min-time', '0.001', '--filter', 'assoc/', '--save', path, '--tolerance', '100']) == 0
+assert bench.main(['--min-time', '0.001', '--filter', 'assoc/', '--baseline', path, '--tolerance', '100']) == 0
+with open(path) as f:
+    saved = json.load(f)
+assert saved and all(key.startswith('assoc/') for key in saved)
+for result in saved.itervalues():
+    result['ops'] *= 1000
+with open(path, 'w') as f:
+    json.dump(saved, f)
+assert bench.main(['--min-time', '0.001', '--filter', 'assoc/', '--baseline', path]) == 1
+shutil.rmtree(tmpdir)
+
+print 'ok'
@@ -0,0 +1,38 @@
+import mmap
+import escode
+
+# buffer decoding checks, run with `python test_buffer.py` after building
+# the extension in place
+
+values = [None, 1, -(1 << 40), 2.5, 'abc', u'\xe1', ['x' * 300, {'a': [1]}]]
+
+data = escode.encode(values)
+padded = 'head' + data + 'tail'
+for buf in (padded, buffer(padded), bytearray(padded), memoryview(padded)):
+    assert escode.decode(buf, 4, len(data)) == values
+    assert escode.decode_from(buf, 4) == (values, len(data))
+    assert escode.decode_many([buf[4:4 + len(data)]]) == [values]
+
+mapped = mmap.mmap(-1, len(padded))
+mapped.write(padded)
+assert escode.decode(mapped, 4, len(data)) == values
+mapped.close()
+
+# concatenated values are walked one by one
+stream = ''.join(escode.encode(value) for value in values)
+offset, walked = 0, []
+while offset < len(stream):
+    value, consumed = escode.decode_from(stream, offset)
+    walked.append(value)
+    offset += consumed
+assert walked == values
+
+for args in ((padded, -1), (padded, len(padded) + 1), (padded, 4, len(padded)), (padded, 4, 2), (object(),)):
+    try:
+        escode.decode(*args)
+    except escode.Error:
+        pass
+    else:
+        assert 0, "decoded %r" % (args,)
+
+print 'ok'
@@ -0,0 +1,40 @@
+import escode
+
+# Encoder checks, run with `python test_encoder.py` after building the
+# extension in place
+
+values = [None, True, -1, 1 << 40, 0.5, 'abc', u'\xe1', [1, [2]], {'a': {'b': None}}]
+
+# encoders write what escode.encode writes, reusing their buffer
+encoder = escode.Encoder()
+encoded = [encoder.encode(value) for value in values]
+assert encoded == map(escode.encode, values)
+assert map(escode.decode, encoded) == values
+
+# the size hint is a moving average of the records encoded, so a rare
+# large one doesn't stick
+encoder = escode.Encoder(size_hint=64)
+for _ in xrange(50):
+    assert escode.decode(encoder.encode('x' * 1000)) == 'x' * 1000
+assert 900 < encoder.size_hint <= 1010
+assert escode.decode(encoder.encode('y' * 60000)) == 'y' * 60000
+for _ in xrange(50):
+    assert escode.decode(encoder.encode('z' * 10)) == 'z' * 10
+assert encoder.size_hint < 1000
+
+# index values and records are encoded in one call
+assert encoder.encode_index((1, 'a')) == escode.encode_index((1, 'a'))
+assert encoder.encode_index((1,), True) == escode.encode_index((1,), True)
+record = {'name': u'a', 'tags': ['x']}
+assert encoder.encode_record(record, [(1,), (2, 'x')]) == \
+    (escode.encode(record), [escode.encode_index((1,)), escode.encode_index((2, 'x'))])
+
+try:
+    encoder.encode(object())
+except escode.Error:
+    pass
+else:
+    assert 0, "encoded an object"
+assert encoder.encode(values) == escode.encode(values)
+
+print 'ok'
@@ -0,0 +1,95 @@
+import escode
+
+# format checks for both escode versions, run with `python test_format.py`
+# after building the extension in place
+
+values = [
+    None,
+    True,
+    False,
+    0,
+    1,
+    -1,
+    127,
+    128,
+    (1 << 31) - 1,
+    -(1 << 31),
+    (1 << 32),
+    long((1 << 63) - 1),
+    long(-(1 << 63)),
+    0.0,
+    -123.123,
+    "",
+    "abcde",
+    "\x00\xff" * 100,
+    u"\xe1\xe9\xed\xf3\xfa\xfc\xf1\xbf\xa1",
+    [],
+    [1, 2],
+    {},
+    {'a': [1, {'b': None}]},
+    ]
+
+values.append(list(values))
+values.append(dict(('key%d' % i, value) for i, value in enumerate(values)))
+
+# roundtrip
+
+for version in (1, 2):
+    encoder = escode.Encoder(version=version)
+    assert encoder.version == version
+    for value in values:
+        assert escode.decode(encoder.encode(value)) == value, (version, value)
+
+assert escode.Encoder().encode(values) == escode.encode(values)
+assert len(escode.Encoder(version=2).encode(values)) < len(escode.encode(values))
+
+# bulk and buffer decoding
+
+encoded = [escode.Encoder(version=version).encode(value) for value in values for version in (1, 2)]
+assert escode.decode_many(encoded) == [value for value in values for version in (1, 2)]
+assert escode.decode_many([(i, data) for i, data in enumerate(encoded)], 1) == escode.decode_many(encoded)
+assert escode.encode_many(values) == map(escode.encode, values)
+
+data = escode.Encoder(version=2).encode(values[-1])
+padded = 'head' + data + 'tail'
+assert escode.decode(padded, 4, len(data)) == values[-1]
+assert escode.decode(buffer(padded), 4, len(data)) == values[-1]
+assert escode.decode_from(padded, 4) == (values[-1], len(data))
+
+for corrupt in (data[:-1], data[:len(data) // 2], '\xff' + data[1:], data + 'tail'):
+    try:
+        escode.decode(corrupt)
+    except escode.Error:
+        pass
+    else:
+        assert 0, "decoded corrupt data %r" % corrupt
+
+# only decode_from stops at the end of the value
+for decode in (lambda: escode.decode(padded, 4), lambda: escode.decode_many([data + 'tail'])):
+    try:
+        decode()
+    except escode.Error:
+        pass
+    else:
+        assert 0, "decoded trailing bytes"
+assert escode.decode_from(data + 'tail') == (values[-1], len(data))
+
+# records name their fields by id
+
+fieldids = {'email': 1, 'counter': 2, 'phone': 300}
+fieldnames = dict((fieldid, name) for name, fieldid in fieldids.iteritems())
+record = {'email': u'a@b.c', 'counter': 3, 'phone': {'code': 1}}
+for version in (1, 2):
+    encoder = escode.Encoder(version=version)
+    data, indexvalues = encoder.encode_record(record, [(1, u'x'), (2,)], fieldids, [1, 2])
+    assert escode.decode_record(data, fieldnames) == record
+    assert escode.decode_many([data], -1, fieldnames) == [record]
+    assert indexvalues == [escode.encode_index((1, u'x'), False, 1), escode.encode_index((2,), False, 2)]
+    try:
+        escode.decode_record(data + '\x00', fieldnames)
+    except escode.Error:
+        pass
+    else:
+        assert 0, "decoded trailing bytes"
+
+print 'ok'
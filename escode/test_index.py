@@ -0,0 +1,42 @@
+import escode
+import random
+
+# version 2 index values sort like the values they encode, run with
+# `python test_index.py` after building the extension in place
+
+def indexorder(keys):
+    return sorted(keys, key=lambda key: escode.encode_index(key, False, 2))
+
+# values of different types sort by type first
+numbers = [-(1 << 62), -1000, -1, 0, 1, 2, 255, 256, 1 << 40, -1e20, -0.5, -0.0, 0.25, 1e20]
+assert indexorder([(number,) for number in reversed(numbers)]) == [(number,) for number in numbers]
+
+strings = ['', 'a', 'a\x00', 'a\x00b', 'ab', 'b', '\xff']
+assert indexorder([(string,) for string in reversed(strings)]) == [(string,) for string in strings]
+
+random.seed(1)
+keys = [(random.choice([None, random.randrange(-5, 5)]), random.choice(['', 'x', 'xy', 'y'])) for _ in xrange(200)]
+assert indexorder(keys) == sorted(keys)
+
+# open values are a prefix of every value starting with them
+prefix = escode.encode_index((3,), True, 2)
+assert escode.encode_index((3, 'a'), False, 2).startswith(prefix)
+assert not escode.encode_index((4,), False, 2).startswith(prefix)
+
+# unknown versions are rejected rather than encoded as version 1
+for version in (0, 3, -1):
+    for encode in (escode.encode_index, escode.Encoder().encode_index):
+        try:
+            encode((1,), False, version)
+        except ValueError:
+            pass
+        else:
+            assert 0, "encoded index version %d" % version
+    try:
+        escode.Encoder().encode_record({}, [(1,)], {}, [version])
+    except ValueError:
+        pass
+    else:
+        assert 0, "encoded record index version %d" % version
+
+print 'ok'
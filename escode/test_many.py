@@ -0,0 +1,35 @@
+import escode
+
+# bulk encode and decode checks, run with `python test_many.py` after
+# building the extension in place
+
+values = [None, True, 0, -1, 1 << 40, 1.5, '', 'abc', u'\xe1\xe9', [1, [2]], {'a': {'b': None}}]
+
+encoded = escode.encode_many(values)
+assert encoded == map(escode.encode, values)
+assert escode.decode_many(encoded) == values
+assert escode.encode_many([]) == [] and escode.decode_many([]) == []
+
+# rows are decoded from their last column unless told otherwise
+rows = [(i, 'x', data) for i, data in enumerate(encoded)]
+assert escode.decode_many(rows) == values
+assert escode.decode_many([list(row) for row in rows], -1) == values
+assert escode.decode_many([(data, i) for i, data in enumerate(encoded)], 0) == values
+
+# any bad item fails the whole call
+for args in (([encoded[0], 1],), ([(encoded[0],)], 1), ([encoded[0]] * 2 + [encoded[-1][:-1]],)):
+    try:
+        escode.decode_many(*args)
+    except escode.Error:
+        pass
+    else:
+        assert 0, "decoded %r" % (args,)
+
+try:
+    escode.encode_many([1, object()])
+except escode.Error:
+    pass
+else:
+    assert 0, "encoded an object"
+
+print 'ok'
@@ -0,0 +1,35 @@
+import escode
+
+# record and interned key checks, run with `python test_record.py` after
+# building the extension in place
+
+fieldids = {'email': 1, 'counter': 2, 'phone': 300}
+fieldnames = dict((fieldid, name) for name, fieldid in fieldids.iteritems())
+record = {'email': u'a@b.c', 'counter': 3, 'phone': {'code': 1}}
+
+encoder = escode.Encoder()
+data, indexvalues = encoder.encode_record(record, [(1,)], fieldids)
+assert indexvalues == [escode.encode_index((1,))]
+assert escode.decode_record(data, fieldnames) == record
+assert escode.decode_many([data, ('row', data)], -1, fieldnames) == [record, record]
+assert len(data) < len(escode.encode(record))
+
+# decoded records use the given name objects, fields of unknown ids are
+# skipped
+name = ''.join(['coun', 'ter'])
+decoded = escode.decode_record(data, {2: name})
+assert decoded == {'counter': 3} and decoded.keys()[0] is name
+
+try:
+    encoder.encode_record({'other': 1}, [], fieldids)
+except escode.Error:
+    pass
+else:
+    assert 0, "encoded a field without an id"
+
+# keys of plain dicts are interned
+key = ''.join(['some', 'key'])
+first, second = escode.decode(escode.encode({key: 1})), escode.decode(escode.encode({key: 2}))
+assert first.keys()[0] is second.keys()[0] is intern(key)
+
+print 'ok'
@@ -0,0 +1,127 @@
+import sys
+import time
+import Queue
+import threading
+
+__all__ = ['Future', 'Timeout']
+
+class Timeout(Exception):
+    pass
+
+class Future(object):
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._result = None
+        self._excinfo = None
+
+    @staticmethod
+    def resolved(result):
+        future = Future()
+        future.setResult(result)
+        return future
+
+    @staticmethod
+    def gather(futures):
+        return _DerivedFuture(futures, lambda *results: list(results))
+
+    def then(self, func):
+        # func runs in the thread that asks for the result, so it can
+        # safely use that thread's session (caches, locks, instances)
+        return _DerivedFuture([self], func)
+
+    def done(self):
+        return self._event.is_set()
+
+    def result(self, timeout=None):
+        if not self._event.wait(timeout):
+            raise Timeout("timed out waiting for result")
+        if self._excinfo:
+            raise self._excinfo[0], self._excinfo[1], self._excinfo[2]
+        return self._result
+
+    def setResult(self, result):
+        self._result = result
+        self._event.set()
+
+    def setException(self, excinfo):
+        self._excinfo = excinfo
+        self._event.set()
+
+class _DerivedFuture(Future):
+
+    def __init__(self, parents, func):
+        super(_DerivedFuture, self).__init__()
+        self._parents = parents
+        self._func = func
+
+        # func runs once, however many threads ask for the result. the mutex
+        # only guards claiming the run, so callers waiting on the parents or
+        # on the thread running func still time out
+        self._mutex = threading.Lock()
+        self._claimed = False
+
+    def done(self):
+        return super(_DerivedFuture, self).done() or all(parent.done() for parent in self._parents)
+
+    def result(self, timeout=None):
+        # one deadline for all the parents and func
+        deadline = None if timeout is None else time.time() + timeout
+
+        if not super(_DerivedFuture, self).done():
+            excinfo = None
+            try:
+                results = [parent.result(_remaining(deadline)) for parent in self._parents]
+            except Timeout:
+                # a later call may still get the result
+                raise
+            except:
+                excinfo = sys.exc_info()
+
+            with self._mutex:
+                claimed, self._claimed = self._claimed, True
+
+            if not claimed:
+                if excinfo:
+                    self.setException(excinfo)
+                else:
+                    try:
+                        self.setResult(self._func(*results))
+                    except:
+                        self.setException(sys.exc_info())
+
+        return super(_DerivedFuture, self).result(_remaining(deadline))
+
+def _remaining(deadline):
+    return None if deadline is None else max(0, deadline - time.time())
+
+class Executor(object):
+
+    def __init__(self, size):
+        self._size = size
+        self._queue = Queue.Queue()
+        self._workers = []
+        self._mutex = threading.Lock()
+
+    def submit(self, func, *args):
+        # workers are started on first use, each one has its own session
+        # and so its own connection to the host
+        if not self._workers:
+            with self._mutex:
+                while len(self._workers) < self._size:
+                    worker = threading.Thread(target=self._work)
+                    worker.daemon = True
+                    worker.start()
+                    self._workers.append(worker)
+
+        future = Future()
+        self._queue.put((future, func, args))
+        return future
+
+    def _work(self):
+        while True:
+            future, func, args = self._queue.get()
+            try:
+                future.setResult(func(*args))
+            except:
+                future.setException(sys.exc_info())
@@ -1,8 +1,10 @@
+import copy
 import escode
+import hashlib
 
-from collections import Iterable
 from itertools import product, chain
 from attr import Attr
+from config import config
 
 class Index(object):
 
@@ -11,19 +13,106 @@ class Index(object):
         self.indextype = None # filled in by the metaclass
         self.attrdefs = attrdefs
         self.unique = kwargs.pop('unique', False)
+        self.version = kwargs.pop('version', None) or config.INDEX_VERSION
+        assert self.version in (1, 2), "unknown index version"
 
-    def tuples(self, data_instance):
+        # hashed indexes store a fixed width digest of the value instead of
+        # the value, so they only answer equality on all their attrs
+        self.hashed = kwargs.pop('hashed', False)
+
+        # covering indexes also store the values of the included attrs with
+        # each index row, so queries can be answered from the index alone
+        self.include = tuple(kwargs.pop('include', ()))
+        assert all(isinstance(attrdef, Attr) for attrdef in self.include), "invalid include attrdef"
+
+        # shadow indexes are written but never queried, see INDEX_SHADOW_VERSION
+        self.shadow = False
+
+    @property
+    def name(self):
+        name = ':'.join(attrdef.name for attrdef in self.attrdefs)
+        if self.version != 1:
+            name = '{}:v{}'.format(name, self.version)
+        if self.include:
+            name = '{}+{}'.format(name, ':'.join(attrdef.name for attrdef in self.include))
+        return name if not self.hashed else '{}:hashed'.format(name)
+
+    def shadowcopy(self, version):
+        indexdef = copy.copy(self)
+        indexdef.indextype = None
+        indexdef.version = version
+        indexdef.shadow = True
+        return indexdef
+
+    def attrtuples(self, data_instance):
         attrtuples = [tuple(
             attrdef._to_base_type(attrdef.get(data_instance))
             for attrdef in self.attrdefs)]
 
-        while any(isinstance(attr, Iterable) for attr in attrtuples[0]):
+        # repeated attrs index every combination of their values, strings
+        # are iterable too but are indexed as a single value
+        while any(isinstance(attr, (list, tuple)) for attr in attrtuples[0]):
             attrtuples = list(chain.from_iterable((
-                product(*[attr if isinstance(attr, Iterable) else [attr] for attr in attrtuple])
+                product(*[attr if isinstance(attr, (list, tuple)) else [attr] for attr in attrtuple])
                 for attrtuple in attrtuples)))
 
-        for attrtuple in attrtuples:
-            yield (self.indextype, escode.encode_index(attrtuple), self.unique)
+        return attrtuples
+
+    def value(self, attrtuple):
+        # the indexvalue stored for an edge's attr tuple
+        return self.digest(self.encode(attrtuple))
+
+    def encode(self, values, open=False):
+        return escode.encode_index(values, open, self.version)
+
+    def payload(self, data_instance):
+        # covering rows start with the remote gid, so a row can be told
+        # apart from the other edges of its local gid without the edge
+        if not self.include:
+            return None
+        values = [attrdef.get(data_instance) for attrdef in self.include]
+        return escode.encode([data_instance.__remotegid__] + [
+            None if value is None else attrdef._to_base_type(value)
+            for attrdef, value in zip(self.include, values)])
+
+    def included(self, payload):
+        # remote gid and included attr values by name, from a stored payload
+        values = escode.decode(payload)
+        return values[0], {
+            attrdef.name: None if value is None else attrdef._from_base_type(value)
+            for attrdef, value in zip(self.include, values[1:])}
+
+    _digestSize = 16
+
+    def digest(self, indexvalue):
+        # 128 bits keep collisions (and so false uniqueness violations)
+        # negligible, queries still compare the values of what they read
+        if not self.hashed:
+            return indexvalue
+        return hashlib.sha1(indexvalue).digest()[:Index._digestSize]
+
+    def range(self, startvalues, openstart, endvalues, openend):
+        if self.hashed:
+            assert startvalues == endvalues and openstart and openend, "hashed indexes only match equality"
+            digest = self.digest(self.encode(startvalues))
+
+            # all digests have the same width, so the only one between these
+            # is the digest itself
+            indexstart = digest[:-1] + (chr(ord(digest[-1]) - 1) if digest[-1] != '\x00' else '')
+            return (self.indextype, indexstart, digest + '\x00')
+
+        # values of stored edges continue with \x00 after the encoded values,
+        # so \x01 ends a range after them and \xff starts one after them
+        if self.version == 1:
+            indexstart = self.encode(startvalues, openstart)
+            indexend = self.encode(endvalues, openend)
+        else:
+            indexstart = self.encode(startvalues, True)
+            indexend = self.encode(endvalues, True)
+
+        if not openstart: indexstart = indexstart + '\xff'
+        if openend: indexend = indexend + '\x01'
+        return (self.indextype, indexstart, indexend)
 
     def match(self, query):
         equalargs = query.equalargs
@@ -31,7 +120,9 @@ class Index(object):
         attrsiter = iter(self.attrdefs)
 
         return (
-            (not self.unique or query.colo) # assures unique indices are restricted to colo
+            not self.shadow
+            and (not self.unique or query.colo) # assures unique indices are restricted to colo
+            and (not self.hashed or (len(equalargs) == len(self.attrdefs) and not otherattrs))
             and (len(equalargs) + len(otherattrs) <= len(self.attrdefs))
             and all(attrsiter.next() in equalargs for idx in range(len(equalargs)))
             and all(attrsiter.next() is attr for attr in otherattrs))
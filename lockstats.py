@@ -0,0 +1,189 @@
+import os
+import sys
+import time
+import logging
+import threading
+import traceback
+
+from collections import defaultdict
+from config import config
+
+__all__ = ['LockStats']
+
+logger = logging.getLogger(__name__)
+
+class LockTimer(object):
+
+    def __init__(self, colos, callsite):
+        self.colos = colos
+        self.callsite = callsite
+        self.start = time.time()
+
+        # filled in by DataStore.lock as each colo is acquired and released
+        self.requested = {}
+        self.acquired = {}
+        self.released = {}
+
+        # statements issued per shard while its colos were locked, and the
+        # shard of each colo
+        self.statements = {}
+        self.shards = {}
+
+        # filled in by EdgeData.lock before the locks are released
+        self.saves = defaultdict(int)
+        self.deletes = defaultdict(int)
+
+    def request(self, colo):
+        self.requested[colo] = time.time()
+
+    def acquire(self, colo):
+        self.acquired[colo] = time.time()
+
+    def release(self, colo, shard, statements):
+        self.released[colo] = time.time()
+        self.shards[colo] = shard
+
+        # nested colos on the same shard share a connection, so the
+        # outermost one sees every statement issued on that shard
+        self.statements[shard] = max(self.statements.get(shard, 0), statements)
+
+    @property
+    def wait(self):
+        return max(self.acquired.itervalues()) - self.start if self.acquired else 0.0
+
+    @property
+    def hold(self):
+        if not self.acquired:
+            return 0.0
+        return max(self.released.itervalues()) - min(self.acquired.itervalues())
+
+class LockStat(object):
+
+    # upper bounds (in seconds) of the lock hold time histogram buckets,
+    # the last bucket counts everything above the largest bound
+    BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+    def __init__(self):
+        self.count = 0
+        self.wait = 0.0
+        self.maxwait = 0.0
+        self.hold = 0.0
+        self.maxhold = 0.0
+        self.saves = 0
+        self.deletes = 0
+        self.statements = 0
+        self.histogram = [0] * (len(LockStat.BUCKETS) + 1)
+
+    def add(self, wait, hold, saves, deletes, statements):
+        self.count += 1
+        self.wait += wait
+        self.maxwait = max(self.maxwait, wait)
+        self.hold += hold
+        self.maxhold = max(self.maxhold, hold)
+        self.saves += saves
+        self.deletes += deletes
+        self.statements += statements
+
+        bucket = 0
+        while bucket < len(LockStat.BUCKETS) and hold > LockStat.BUCKETS[bucket]:
+            bucket += 1
+        self.histogram[bucket] += 1
+
+    def dict(self):
+        return {
+            'count': self.count,
+            'wait': self.wait,
+            'maxwait': self.maxwait,
+            'hold': self.hold,
+            'maxhold': self.maxhold,
+            'saves': self.saves,
+            'deletes': self.deletes,
+            'statements': self.statements,
+            'histogram': list(self.histogram),
+        }
+
+class LockStats:
+
+    # colo -> LockStat
+    _colos = defaultdict(LockStat)
+
+    # (filename, lineno, function) -> LockStat
+    _callsites = defaultdict(LockStat)
+
+    _mutex = threading.Lock()
+
+    # frames of the modules taking locks for their callers, and of
+    # contextlib, are skipped when looking for the call site
+    _SKIP_MODULES = tuple(
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), module)
+        for module in ('lockstats', 'edgedata', 'entity'))
+    _SKIP_FILES = ('contextlib.py',)
+
+    @staticmethod
+    def start(colos):
+        if not config.LOCK_STATS_ENABLED:
+            return None
+
+        return LockTimer(colos, LockStats.callsite())
+
+    @staticmethod
+    def record(timer):
+        if timer is None or not timer.acquired:
+            return
+
+        statements = sum(timer.statements.itervalues())
+        saves = sum(timer.saves.itervalues())
+        deletes = sum(timer.deletes.itervalues())
+
+        with LockStats._mutex:
+            LockStats._callsites[timer.callsite].add(
+                timer.wait, timer.hold, saves, deletes, statements)
+
+            # colos sharing a shard each count all of its statements
+            for colo, acquired in timer.acquired.iteritems():
+                LockStats._colos[colo].add(
+                    acquired - timer.requested.get(colo, timer.start),
+                    timer.released.get(colo, acquired) - acquired,
+                    timer.saves.get(colo, 0),
+                    timer.deletes.get(colo, 0),
+                    timer.statements.get(timer.shards.get(colo), 0))
+
+        # records are made as the lock is left, so the holder's frames are
+        # still on the stack and are only formatted for slow locks
+        threshold = config.SLOW_LOCK_THRESHOLD
+        if threshold is not None and timer.hold > threshold:
+            logger.warning(
+                "slow lock on colos %s held for %.3fs (waited %.3fs) at %s:%d in %s\n%s",
+                sorted(timer.colos), timer.hold, timer.wait,
+                timer.callsite[0], timer.callsite[1], timer.callsite[2],
+                ''.join(traceback.format_stack(sys._getframe(1))))
+
+    @staticmethod
+    def callsite():
+        frame = sys._getframe(1)
+        callsite = None
+        while frame:
+            code = frame.f_code
+            callsite = (code.co_filename, frame.f_lineno, code.co_name)
+            filename = os.path.abspath(code.co_filename)
+            if (os.path.splitext(filename)[0] not in LockStats._SKIP_MODULES and
+                os.path.basename(filename) not in LockStats._SKIP_FILES):
+                break
+            frame = frame.f_back
+        return callsite
+
+    @staticmethod
+    def colos():
+        with LockStats._mutex:
+            return {colo: stat.dict() for colo, stat in LockStats._colos.iteritems()}
+
+    @staticmethod
+    def callsites():
+        with LockStats._mutex:
+            return {site: stat.dict() for site, stat in LockStats._callsites.iteritems()}
+
+    @staticmethod
+    def reset():
+        with LockStats._mutex:
+            LockStats._colos.clear()
+            LockStats._callsites.clear()
@@ -0,0 +1,428 @@
+import os
+import sys
+import json
+import time
+import escode
+import logging
+import optparse
+import importlib
+
+from collections import defaultdict
+from config import config
+from datastore import DataStore
+from edgedata import EdgeData, EdgeDataType
+
+__all__ = [
+    'Checkpoint', 'Throttle', 'EdgeWalker', 'Reencoder', 'Reindexer', 'Inverter',
+    'dropIndexVersion', 'sweepExpired']
+
+logger = logging.getLogger(__name__)
+
+DATASTORE = DataStore.getInstance()
+
+class Checkpoint(object):
+
+    # scan position and totals per host, written after every chunk so an
+    # interrupted job picks up where it stopped
+
+    def __init__(self, path, job):
+        self._path = path
+        self._job = json.loads(json.dumps(job))
+        self.hosts = {}
+
+        if path and os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            assert state['job'] == self._job, "checkpoint `%s` is for another job" % path
+            self.hosts = {int(hostindex): host for hostindex, host in state['hosts'].iteritems()}
+
+    def host(self, hostindex):
+        state = self.hosts.setdefault(hostindex, {'position': [0, 0, 0], 'done': False})
+        state['stats'] = defaultdict(int, state.get('stats', {}))
+        return state
+
+    def save(self):
+        if not self._path:
+            return
+
+        # write and rename so a crash never leaves a partial checkpoint
+        tmppath = self._path + '.tmp'
+        with open(tmppath, 'w') as f:
+            json.dump({'job': self._job, 'hosts': self.hosts}, f, indent=2, sort_keys=True)
+        os.rename(tmppath, self._path)
+
+class Throttle(object):
+
+    def __init__(self, maxrate=None, maxlag=None, laginterval=5.0):
+        self._maxrate = maxrate
+        self._maxlag = maxlag
+        self._laginterval = laginterval
+        self._last = time.time()
+
+    def wait(self, hostindex, rows):
+        # keep under maxrate rows per second
+        if self._maxrate:
+            delay = rows / float(self._maxrate) - (time.time() - self._last)
+            if delay > 0:
+                time.sleep(delay)
+
+        # pause while a replica of the host lags behind or isn't replicating
+        while self._maxlag is not None:
+            lag = DATASTORE.replicationLag(hostindex)
+            if lag is not None and lag <= self._maxlag:
+                break
+            logger.info("host %d replication lag is %s, waiting", hostindex, lag)
+            time.sleep(self._laginterval)
+
+        self._last = time.time()
+
+class EdgeWalker(object):
+
+    # walks the edges of every host in chunks, resuming from the checkpoint,
+    # and hands each chunk to process(hostindex, edges, stats)
+
+    def __init__(self, process, edgetypes=None, chunksize=500, dryrun=False, throttle=None, checkpoint=None):
+        self._process = process
+        self._edgetypes = sorted(edgetypes) if edgetypes else [None]
+        self._chunksize = chunksize
+        self._dryrun = dryrun
+        self._throttle = throttle or Throttle()
+        self._checkpoint = checkpoint or Checkpoint(None, None)
+
+    def run(self, hostindices=None):
+        if hostindices is None:
+            hostindices = range(len(config.DATABASE_HOSTS))
+
+        totals = defaultdict(int)
+        for hostindex in hostindices:
+            for name, value in self.runHost(hostindex).iteritems():
+                totals[name] += value
+
+        return totals
+
+    def runHost(self, hostindex):
+        state = self._checkpoint.host(hostindex)
+        stats = state['stats']
+
+        for edgetype in self._edgetypes:
+            while not state['done']:
+                edges = DATASTORE.scan(hostindex, state['position'], self._chunksize, edgetype)
+                if not edges:
+                    break
+
+                self._process(hostindex, edges, stats)
+
+                edgetype_, order, revision, gid1 = edges[-1][:4]
+                state['position'] = [edgetype_, gid1, revision]
+                self._checkpoint.save()
+                self._throttle.wait(hostindex, len(edges))
+
+        state['done'] = True
+        self._checkpoint.save()
+        return stats
+
+class Reencoder(EdgeWalker):
+
+    def __init__(self, encoding=None, sources=None, **kwargs):
+        super(Reencoder, self).__init__(self._processChunk, **kwargs)
+
+        # encoding None re-encodes each class to the encoding it saves with
+        assert encoding is None or 0 <= encoding < len(EdgeData._encoders), "unknown encoding"
+        self._encoding = encoding
+        self._sources = set(sources) if sources else None
+
+    def _processChunk(self, hostindex, edges, stats):
+        updates = filter(None, [self._reencode(edgedata, stats) for edgedata in edges])
+        if updates and not self._dryrun:
+            stats['updated'] += DATASTORE.reencode(hostindex, updates)
+
+    def _reencode(self, edgedata, stats):
+        edgetype, order, revision, gid1, gid2, encoding, data = edgedata
+        stats['scanned'] += 1
+
+        cls = EdgeDataType.getEdgeDataClass(edgetype)
+        if not cls:
+            # can't decode edges of classes that aren't loaded
+            stats['unknown'] += 1
+            return None
+
+        target = self._encoding
+        if target is None:
+            target = cls.__encoding__ if cls.__encoding__ is not None else config.WRITE_ENCODING
+
+        if encoding == target or (self._sources and encoding not in self._sources):
+            return None
+
+        try:
+            datadict = EdgeData._encoders[encoding].decode(cls, data)
+        except escode.Error:
+            logger.exception("cannot decode edge %d:%d:%d", edgetype, gid1, gid2)
+            stats['failed'] += 1
+            return None
+
+        # only keep the attrs the class still has, like a save would
+        datadict = {
+            attrname: value for attrname, value in datadict.iteritems()
+            if attrname in cls.__attrdefs__}
+
+        newdata = EdgeData._encoders[target].encode(cls, datadict)
+        stats['reencoded'] += 1
+        stats['bytes'] += len(data)
+        stats['newbytes'] += len(newdata)
+
+        return (edgetype, gid1, revision, encoding, target, newdata)
+
+class Reindexer(EdgeWalker):
+
+    # adds the index rows of one index encoding version for existing edges,
+    # for the indexes that are (or shadow) that version
+
+    def __init__(self, version, **kwargs):
+        super(Reindexer, self).__init__(self._processChunk, **kwargs)
+
+        assert version in (1, 2), "unknown index version"
+        self._version = version
+
+    def _processChunk(self, hostindex, edges, stats):
+        updates = filter(None, [self._reindex(edgedata, stats) for edgedata in edges])
+        if updates and not self._dryrun:
+            stats['added'] += DATASTORE.reindex(hostindex, updates)
+
+    def _reindex(self, edgedata, stats):
+        edgetype, order, revision, gid1, gid2, encoding, data = edgedata
+        stats['scanned'] += 1
+
+        cls = EdgeDataType.getEdgeDataClass(edgetype)
+        if not cls:
+            stats['unknown'] += 1
+            return None
+
+        indexdefs = [indexdef for indexdef in cls.__indexdefs__ if indexdef.version == self._version]
+        if not indexdefs:
+            return None
+
+        try:
+            instance = cls._getDetachedInstanceFromEdge(edgedata)
+        except escode.Error:
+            logger.exception("cannot decode edge %d:%d:%d", edgetype, gid1, gid2)
+            stats['failed'] += 1
+            return None
+
+        values = [
+            (indexdef.indextype, indexdef.value(attrtuple), indexdef.payload(instance))
+            for indexdef in indexdefs
+            for attrtuple in indexdef.attrtuples(instance)]
+
+        stats['reindexed'] += 1
+        stats['values'] += len(values)
+
+        return (edgetype, gid1, revision, values)
+
+class Inverter(EdgeWalker):
+
+    # adds the inverse edges of existing edges of classes with __inverse__,
+    # adding them again is a noop
+
+    def __init__(self, **kwargs):
+        super(Inverter, self).__init__(self._processChunk, **kwargs)
+
+    def _processChunk(self, hostindex, edges, stats):
+        for edgetype, order, revision, gid1, gid2, encoding, data in edges:
+            stats['scanned'] += 1
+
+            cls = EdgeDataType.getEdgeDataClass(edgetype)
+            if not cls:
+                stats['unknown'] += 1
+                continue
+            if not cls.__inverse__:
+                continue
+
+            stats['inverted'] += 1
+            if not self._dryrun:
+                stats['added'] += DATASTORE.addInverse(edgetype, gid1, gid2)
+
+def dropIndexVersion(version, hostindices=None, chunksize=500, dryrun=False, throttle=None):
+    # removes the index rows of an index encoding version the loaded classes
+    # neither query nor shadow anymore
+    if hostindices is None:
+        hostindices = range(len(config.DATABASE_HOSTS))
+    throttle = throttle or Throttle()
+
+    indextypes = []
+    for cls in EdgeDataType._edgedataClasses.itervalues():
+        for indexdef in cls.__indexdefs__:
+            if version in (indexdef.version, config.INDEX_SHADOW_VERSION):
+                continue
+            name = '%s:%s' % (cls.__name__, indexdef.shadowcopy(version).name)
+            indextype = DATASTORE.getDefinitionType(name)
+            if indextype is not None:
+                indextypes.append(indextype)
+
+    stats = defaultdict(int)
+    stats['indices'] = len(indextypes)
+    if dryrun:
+        return stats
+
+    for hostindex in hostindices:
+        for indextype in indextypes:
+            while True:
+                deleted = DATASTORE.dropIndex(hostindex, indextype, chunksize)
+                stats['deleted'] += deleted
+                if not deleted:
+                    break
+                throttle.wait(hostindex, deleted)
+
+    return stats
+
+def sweepExpired(edgetypes=None, hostindices=None, chunksize=500, dryrun=False, throttle=None, now=None):
+    # deletes the edges of classes with __ttl__ that expired by now, a chunk
+    # per transaction. edges changed since they were read are left alone
+    if hostindices is None:
+        hostindices = range(len(config.DATABASE_HOSTS))
+    throttle = throttle or Throttle()
+    now = int(now or time.time())
+
+    classes = [
+        cls for edgetype, cls in sorted(EdgeDataType._edgedataClasses.iteritems())
+        if cls.__ttl__ and (not edgetypes or edgetype in edgetypes)]
+
+    stats = defaultdict(int)
+    for hostindex in hostindices:
+        for cls in classes:
+            indextypes = [indexdef.indextype for indexdef in cls.__indexdefs__]
+            # an expiretime of None never expires, and None is encoded
+            # before every int, so the range starts right after it
+            indexrange = cls.__expireindex__.range((None,), False, (now,), True)
+
+            # nothing is deleted on a dry run, so chunks wouldn't move on
+            if dryrun:
+                stats['expired'] += len(DATASTORE.queryShard(hostindex, cls.__edgetype__, indexrange))
+                continue
+
+            while True:
+                edges = DATASTORE.queryShard(hostindex, cls.__edgetype__, indexrange, chunksize)
+                if not edges:
+                    break
+                stats['expired'] += len(edges)
+
+                deleted = DATASTORE.deleteRevisions(
+                    hostindex, cls.__edgetype__,
+                    [(gid1, gid2, revision) for edgetype, order, revision, gid1, gid2, encoding, data in edges],
+                    indextypes)
+                stats['deleted'] += len(deleted)
+
+                # the sweep holds no lock, so an edge added again since it
+                # was deleted gets its inverse edge back
+                if cls.__inverse__:
+                    for gid1, gid2 in deleted:
+                        DATASTORE.deleteInverse(cls.__edgetype__, gid1, gid2)
+                        if DATASTORE.get(cls.__edgetype__, gid1, gid2):
+                            DATASTORE.addInverse(cls.__edgetype__, gid1, gid2)
+
+                # edges that keep changing aren't retried forever
+                if not deleted:
+                    break
+                throttle.wait(hostindex, len(edges))
+
+    return stats
+
+def main(argv):
+    parser = optparse.OptionParser(usage="%prog reencode|reindex|dropindex|invert|sweep [options]")
+    parser.add_option('--models', default='',
+        help="comma separated modules defining the EdgeData classes")
+    parser.add_option('--encoding', type='int',
+        help="target encoding, defaults to the one each class saves with")
+    parser.add_option('--from', dest='sources', action='append', type='int',
+        help="only re-encode edges with this encoding (repeatable)")
+    parser.add_option('--version', type='int',
+        help="index encoding version to reindex or drop")
+    parser.add_option('--class', dest='classes', action='append',
+        help="only walk edges of this class (repeatable)")
+    parser.add_option('--host', dest='hosts', action='append', type='int',
+        help="only walk this host index (repeatable)")
+    parser.add_option('--chunk-size', type='int', default=500,
+        help="edges read and updated per transaction")
+    parser.add_option('--max-rate', type='float',
+        help="maximum edges read per second")
+    parser.add_option('--max-lag', type='float',
+        help="pause while replicas are more than this many seconds behind")
+    parser.add_option('--checkpoint',
+        help="json file to resume from and save progress to")
+    parser.add_option('--dry-run', action='store_true', default=False,
+        help="don't write, only report what would change")
+
+    options, args = parser.parse_args(argv)
+    if len(args) != 1 or args[0] not in ('reencode', 'reindex', 'dropindex', 'invert', 'sweep'):
+        parser.error("unknown command")
+    command = args[0]
+    if command in ('reindex', 'dropindex') and options.version is None:
+        parser.error("%s needs --version" % command)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+    for module in filter(None, options.models.split(',')):
+        importlib.import_module(module)
+
+    throttle = Throttle(options.max_rate, options.max_lag)
+
+    if command == 'dropindex':
+        stats = dropIndexVersion(
+            options.version,
+            hostindices=options.hosts,
+            chunksize=options.chunk_size,
+            dryrun=options.dry_run,
+            throttle=throttle)
+        json.dump(stats, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+        return
+
+    classes = {cls.__name__: edgetype for edgetype, cls in EdgeDataType._edgedataClasses.iteritems()}
+    for name in options.classes or []:
+        if name not in classes:
+            parser.error("unknown class `%s`" % name)
+    edgetypes = [classes[name] for name in options.classes or []]
+
+    if command == 'sweep':
+        stats = sweepExpired(
+            edgetypes,
+            hostindices=options.hosts,
+            chunksize=options.chunk_size,
+            dryrun=options.dry_run,
+            throttle=throttle)
+        json.dump(stats, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+        return
+
+    job = {
+        'command': command,
+        'edgetypes': sorted(edgetypes),
+    }
+    if command == 'reencode':
+        job.update(encoding=options.encoding, sources=sorted(options.sources or []))
+    elif command == 'reindex':
+        job.update(version=options.version)
+
+    kwargs = dict(
+        edgetypes=edgetypes,
+        chunksize=options.chunk_size,
+        dryrun=options.dry_run,
+        throttle=throttle,
+        # a dry run doesn't write, so there's nothing to resume
+        checkpoint=Checkpoint(None if options.dry_run else options.checkpoint, job))
+
+    if command == 'reencode':
+        walker = Reencoder(encoding=options.encoding, sources=options.sources, **kwargs)
+    elif command == 'reindex':
+        walker = Reindexer(options.version, **kwargs)
+    else:
+        walker = Inverter(**kwargs)
+
+    stats = walker.run(options.hosts)
+    if stats.get('bytes'):
+        stats['savings'] = 1.0 - float(stats['newbytes']) / stats['bytes']
+
+    json.dump(stats, sys.stdout, indent=2, sort_keys=True)
+    sys.stdout.write('\n')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
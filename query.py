@@ -1,5 +1,3 @@
-import escode
-
 from utils import first
 
 class Query(object):
@@ -18,6 +16,10 @@ class Query(object):
             self.op = op
             self.value = None if value is None else attrdef._validate(value)
 
+        @property
+        def basevalue(self):
+            return None if self.value is None else self.attrdef._to_base_type(self.value)
+
     def __init__(self, cls, *args, **kwargs):
         self.colo = kwargs.pop('colo', None)
         self.localarg = None
@@ -34,6 +36,9 @@ class Query(object):
         self.orderargs = []
         self.orderattrs = []
 
+        # entity classes loaded for the remote gids of the results
+        self.prefetches = []
+
         self.filter(args)
 
     @property
@@ -88,6 +93,12 @@ class Query(object):
 
         return self
 
+    def prefetch(self, *entityclasses):
+        from entity import Entity
+        assert all(issubclass(cls, Entity) for cls in entityclasses), "can only prefetch entities"
+        self.prefetches.extend(entityclasses)
+        return self
+
     def setcolo(self, colo):
         self.colo = colo
         return self
@@ -95,24 +106,28 @@ class Query(object):
     def fetch(self):
         return self.datacls.queryfetch(self)
 
+    def afetch(self):
+        return self.datacls.aqueryfetch(self)
+
+    def iter(self, batch_size=1000):
+        return self.datacls.queryiter(self, batch_size)
+
+    def included(self):
+        return self.datacls.queryincluded(self)
+
     def range(self, indexdef):
         assert indexdef, "no matching index"
 
+        # index values are stored as base types (eg. datetimes as ints)
         attrdefs = (indexdef.attrdefs[idx] for idx in range(len(self.equalargs)))
-        startvalues = endvalues = tuple(self.equalargs[attrdef].value for attrdef in attrdefs)
-        indexstart = indexend = None
+        startvalues = endvalues = tuple(self.equalargs[attrdef].basevalue for attrdef in attrdefs)
 
         if self.argstart:
-            startvalues = startvalues + (self.argstart.value,)
+            startvalues = startvalues + (self.argstart.basevalue,)
 
         if self.argend:
-            endvalues = endvalues + (self.argend.value,)
+            endvalues = endvalues + (self.argend.basevalue,)
 
         openstart = not self.argstart or (self.argstart.op == Query.OP_GE)
-        indexstart = escode.encode_index(startvalues, openstart)
-
         openend = not self.argend or (self.argend.op == Query.OP_LE)
-        indexend = escode.encode_index(endvalues, openend)
-        if openend: indexend = indexend + '\x01'
-
-        return (indexdef.indextype, indexstart, indexend)
+        return indexdef.range(startvalues, openstart, endvalues, openend)
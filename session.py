@@ -0,0 +1,63 @@
+import threading
+
+from collections import defaultdict
+
+__all__ = ['Session']
+
+class Session(object):
+
+    # holds the session of the current context. threads get their own session
+    # by default, use setLocalFactory to scope sessions to greenlets instead
+    _local = threading.local()
+
+    def __init__(self):
+
+        # DB instances per (host, dbname) and datastore shards per DB,
+        # so every session talks to mysql over its own connections
+        self.dbs = {}
+        self.shards = {}
+
+        # (dbname, colo) locked by DataStore.lock
+        self.storeLockedColos = set()
+
+        # time of the last write per (dbname, hostindex), used to read
+        # from the primary until replicas have caught up
+        self.writeTimes = {}
+
+        # whether the last DataStore.add / EdgeData class add was an overwrite
+        self.lastAddWasOverwrite = False
+        self.overwrites = {}
+
+        #
+        # caches queries made so far so we can reuse them
+        # colo -> (edgetype, localgid) -> (None|index|remotegid) -> result
+        #
+        self.queryCache = defaultdict(lambda: defaultdict(dict))
+        self.queryCacheDisabled = False
+
+        # instances per (cls, localgid, remotegid) used by this session
+        self.instanceCache = {}
+
+        # instances fetched under lock
+        self.lockedInstances = set()
+
+        # instances that are dirtied or added under a lock
+        self.saveInstances = set()
+
+        # instances that are deleted under a lock
+        self.deleteInstances = set()
+
+        # colos that are currently locked
+        self.lockedColos = set()
+
+    @staticmethod
+    def current():
+        session = getattr(Session._local, 'session', None)
+        if session is None:
+            session = Session._local.session = Session()
+        return session
+
+    @staticmethod
+    def setLocalFactory(factory):
+        # eg. Session.setLocalFactory(gevent.local.local)
+        Session._local = factory()
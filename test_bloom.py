@@ -0,0 +1,39 @@
+import os
+import tempfile
+
+from bloom import BloomFilter
+
+# bloom filter checks, run with `python test_bloom.py`
+
+bloom = BloomFilter(10000, 0.01)
+keys = ['key%d' % i for i in xrange(10000)]
+for key in keys:
+    bloom.add(key)
+bloom.add(u'\xe1\xe9\xed')
+
+# no false negatives, and false positives near the configured rate
+assert all(key in bloom for key in keys) and u'\xe1\xe9\xed' in bloom
+falsepositives = sum(1 for i in xrange(10000) if 'other%d' % i in bloom)
+assert falsepositives < 300, falsepositives
+assert bloom.count == 10001
+
+# saved filters load with the same contents
+path = os.path.join(tempfile.mkdtemp(), 'keys.bloom')
+bloom.save(path)
+loaded = BloomFilter.load(path)
+assert loaded.count == bloom.count and all(key in loaded for key in keys)
+assert sum(1 for i in xrange(10000) if 'other%d' % i in loaded) == falsepositives
+
+with open(path, 'r+b') as f:
+    f.truncate(os.path.getsize(path) - 1)
+try:
+    BloomFilter.load(path)
+except AssertionError:
+    pass
+else:
+    assert 0, "loaded a truncated filter"
+
+os.remove(path)
+os.rmdir(os.path.dirname(path))
+
+print 'ok'
@@ -0,0 +1,99 @@
+import datetime
+
+from datastore import DataStoreShard
+from edgedata import EdgeData, DATASTORE
+from assoc import Assoc
+from attr import *
+from index import Index
+
+# covering index checks, run with `python test_covering.py` against a
+# datastore set up from datastore.sql
+
+class CoveringTestItem(Assoc):
+    ownergid = LocalGidAttr()
+    itemgid = RemoteGidAttr()
+    time = IntAttr(required=True)
+    title = UnicodeAttr(default=u'')
+    when = DateTimeAttr()
+    body = UnicodeAttr(default=u'')
+
+    __indexdefs__ = [
+        Index(ownergid, time, include=[itemgid, title, when])]
+
+class CoveringTestStory(Assoc):
+    __ttl__ = 100
+
+    ownergid = LocalGidAttr()
+    storygid = RemoteGidAttr()
+    rank = IntAttr(required=True)
+
+    __indexdefs__ = [
+        Index(ownergid, rank, include=[rank])]
+
+def reset():
+    EdgeData.clearInstanceCache()
+    EdgeData.clearQueryCache()
+
+loads = []
+def loading(name):
+    method = getattr(DataStoreShard, name)
+    def recording(self, *args, **kwargs):
+        loads.append(name)
+        return method(self, *args, **kwargs)
+    setattr(DataStoreShard, name, recording)
+for name in ('query', 'iter', 'get', 'getMulti'):
+    loading(name)
+
+def included(*filters):
+    reset()
+    del loads[:]
+    rows = CoveringTestItem.query(*filters).included()
+    assert not loads, loads
+    return rows
+
+owner = EdgeData.generateGid(colo=1)
+with EdgeData.lock(owner):
+    for i in xrange(5):
+        CoveringTestItem.add(
+            ownergid=owner, itemgid=100 + i, time=i, title=u't%d' % i, body=u'x' * 1000,
+            when=datetime.datetime(2020, 1, 1 + i) if i % 2 else None)
+
+# included values and both gids come from the index rows alone
+rows = included(CoveringTestItem.ownergid == owner, CoveringTestItem.time >= 2)
+assert [row['itemgid'] for row in rows] == [102, 103, 104]
+assert [row['title'] for row in rows] == [u't2', u't3', u't4']
+assert [row['when'] for row in rows] == [None, datetime.datetime(2020, 1, 4), None]
+assert all(row['ownergid'] == owner and 'body' not in row for row in rows)
+
+# and follow updates
+with EdgeData.lock(owner):
+    CoveringTestItem.get(owner, 103).title = u'new'
+assert [row['title'] for row in included(CoveringTestItem.ownergid == owner, CoveringTestItem.time == 3)] == [u'new']
+
+# rows left behind by an older revision of an edge are skipped
+query = CoveringTestItem.query(CoveringTestItem.ownergid == owner, CoveringTestItem.time == 3)
+indexdef = CoveringTestItem.__indexdefs__[0]
+[(indexvalue, revision, gid1, payload)] = DATASTORE.queryIndex(CoveringTestItem._queryRange(query), gid1=owner)
+DATASTORE._getShard(owner)._db.run(
+    DataStoreShard._addIndexSQL, (indexdef.indextype, indexvalue, owner, revision - 1, payload.replace('new', 'old')))
+rows = included(CoveringTestItem.ownergid == owner, CoveringTestItem.time >= 3)
+assert [(row['itemgid'], row['title']) for row in rows] == [(103, u'new'), (104, u't4')]
+
+# expired edges are left out like they are for fetches
+assert CoveringTestStory.__indexdefs__[0].name.endswith('+rank:expiretime')
+with EdgeData.lock(owner):
+    CoveringTestStory.add(ownergid=owner, storygid=200, rank=1)
+    CoveringTestStory.add(ownergid=owner, storygid=201, rank=2, expiretime=1)
+reset()
+rows = CoveringTestStory.query(CoveringTestStory.ownergid == owner, CoveringTestStory.rank >= 0).included()
+assert [(row['storygid'], row['rank']) for row in rows] == [(200, 1)]
+
+# only covering index queries can be read this way
+try:
+    CoveringTestItem.query(CoveringTestItem.ownergid == owner).included()
+except AssertionError:
+    pass
+else:
+    assert 0, "included without a covering index"
+
+print 'ok'
@@ -0,0 +1,77 @@
+import copy
+import datetime
+
+from data import Data
+from attr import *
+
+# attr default checks, run with `python test_defaults.py`
+
+class Settings(Data):
+    theme = UnicodeAttr(default=u'light')
+    flags = DictAttr(default={'beta': False})
+
+class Profile(Data):
+    name = UnicodeAttr(default=u'anonymous')
+    when = DateTimeAttr(default=datetime.datetime(2020, 1, 1))
+    tags = DictAttr(default={'colors': ['red'], 'sizes': {'s': [1]}, 'count': 1})
+    flat = DictAttr(default={'a': 1})
+    items = Attr(default=[1, [2, 3], {'x': [4]}])
+    scores = RepeatedAttr(IntAttr())
+    settings = LocalDataAttr(Settings, default=Settings(theme=u'dark'))
+
+# data defaults are checked through dict(), they don't compare by value
+defaults = dict((attrname, copy.deepcopy(attrdef.default)) for attrname, attrdef in Profile.__attrdefs__.iteritems()
+    if attrname != 'settings')
+basedefaults = Profile().dict()
+
+def unchanged():
+    # class defaults, and what other instances read and save, are as defined
+    other = Profile()
+    return (
+        all(Profile.__attrdefs__[attrname].default == default for attrname, default in defaults.iteritems()) and
+        Profile.settings.default.dict() == {'theme': u'dark', 'flags': {'beta': False}} and
+        other.tags == defaults['tags'] and other.flat == defaults['flat'] and
+        other.items == defaults['items'] and other.settings.theme == u'dark' and
+        other.settings.flags == {'beta': False} and other.dict() == basedefaults)
+
+# changes to the defaults an unset attr reads aren't kept or shared
+profile = Profile()
+profile.tags['colors'].append('blue')
+profile.tags['sizes']['s'].append(2)
+profile.tags['new'] = 1
+profile.flat['b'] = 2
+profile.items.append(5)
+profile.items[1].append(4)
+profile.items[2]['x'].append(5)
+profile.settings.theme = u'light'
+profile.settings.flags['beta'] = True
+assert profile.tags == defaults['tags'] and profile.items == defaults['items']
+assert unchanged()
+
+# and neither are changes to defaults once set on the instance
+for attrname in ('tags', 'flat', 'items', 'settings'):
+    setattr(profile, attrname, getattr(profile, attrname))
+profile.settings.flags = profile.settings.flags
+profile.tags['colors'].append('blue')
+profile.tags['sizes']['s'].append(2)
+profile.flat['b'] = 2
+profile.items[1].append(4)
+profile.items[2]['x'].append(5)
+profile.settings.flags['beta'] = True
+assert profile.tags['colors'] == ['red', 'blue'] and profile.settings.flags == {'beta': True}
+assert unchanged()
+
+# nor to the dicts saved for unset attrs
+saved = Profile().dict()
+saved['tags']['colors'].append('blue')
+saved['items'][1].append(4)
+saved['settings']['flags']['beta'] = True
+saved['scores'].append(1)
+assert unchanged()
+
+# immutable defaults aren't copied
+other = Profile()
+assert other.name is Profile.name.default and other.when is Profile.when.default
+assert other.scores is Profile.scores.default == ()
+
+print 'ok'
@@ -0,0 +1,45 @@
+import os
+import zlib
+
+from config import config
+from encoders import ESCodeEncoder, CompactEncoder, CompressedEncoder
+
+# compressed encoding checks, run with `python test_encoders.py` once escode
+# is built
+
+class Record(object):
+    __fieldids__ = {'name': 1, 'text': 2}
+    __fieldnames__ = {1: 'name', 2: 'text'}
+
+threshold = config.COMPRESS_THRESHOLD
+small = {'name': u'a', 'text': u'x' * (threshold // 4)}
+large = {'name': u'a', 'text': u'x' * (threshold * 4)}
+# random bytes don't get any smaller, so they're written raw at any size
+noise = {'name': u'a', 'text': os.urandom(threshold * 4)}
+
+for inner in (ESCodeEncoder(), CompactEncoder()):
+    encoder = CompressedEncoder(inner)
+    for datadict in (small, large, noise):
+        data = encoder.encode(Record, datadict)
+        assert encoder.decode(Record, data) == datadict
+
+        # only data over the threshold that zlib makes smaller is compressed
+        raw = inner.encode(Record, datadict)
+        if len(raw) >= threshold and datadict is not noise:
+            assert data[0] == '\x01' and zlib.decompress(data[1:]) == raw and len(data) < len(raw)
+        else:
+            assert data == '\x00' + raw
+
+    # records and bulk decoding go through the same flag
+    data, indexvalues = encoder.encode_record(Record, large, [(1,)])
+    assert data[0] == '\x01' and encoder.decode(Record, data) == large
+    assert indexvalues == inner.encode_record(Record, large, [(1,)])[1]
+    rows = [(1, encoder.encode(Record, datadict)) for datadict in (small, large, noise)]
+    assert encoder.decode_many(Record, rows) == [small, large, noise]
+
+# the threshold is read on every encode
+config.COMPRESS_THRESHOLD = 1 << 30
+assert CompressedEncoder(CompactEncoder()).encode(Record, large)[0] == '\x00'
+config.COMPRESS_THRESHOLD = threshold
+
+print 'ok'
@@ -0,0 +1,92 @@
+import time
+import threading
+
+from executor import Future, Timeout, Executor
+
+# future and executor checks, run with `python test_executor.py` (also with
+# python -O, timeouts don't depend on asserts)
+
+class Failure(Exception):
+    pass
+
+def fails():
+    raise Failure()
+
+future = Future()
+try:
+    future.result(0.01)
+except Timeout:
+    pass
+else:
+    raise Failure("no timeout")
+
+# derived futures run their function once, whoever asks for the result
+calls = []
+derived = future.then(lambda result: calls.append(result) or result + 1)
+try:
+    derived.result(0.01)
+except Timeout:
+    pass
+else:
+    raise Failure("no timeout")
+
+results = []
+threads = [threading.Thread(target=lambda: results.append(derived.result())) for _ in xrange(8)]
+for thread in threads:
+    thread.start()
+time.sleep(0.05)
+future.setResult(1)
+for thread in threads:
+    thread.join()
+if results != [2] * 8 or calls != [1]:
+    raise Failure((results, calls))
+
+# the timeout covers all the parents together
+start = time.time()
+try:
+    Future.gather([Future() for _ in xrange(10)]).result(0.05)
+except Timeout:
+    pass
+else:
+    raise Failure("no timeout")
+if time.time() - start > 0.3:
+    raise Failure("timed out after %.2fs" % (time.time() - start))
+
+# and still holds while another thread runs func
+slow = Future.resolved(1).then(lambda result: time.sleep(0.5) or result)
+thread = threading.Thread(target=slow.result)
+thread.start()
+time.sleep(0.05)
+start = time.time()
+try:
+    slow.result(0.05)
+except Timeout:
+    pass
+else:
+    raise Failure("no timeout")
+if time.time() - start > 0.3:
+    raise Failure("timed out after %.2fs" % (time.time() - start))
+thread.join()
+if slow.result(0) != 1:
+    raise Failure("slow")
+
+# executors run work on their threads, exceptions are raised by result
+executor = Executor(2)
+futures = [executor.submit(lambda n: (n, threading.current_thread().name), n) for n in xrange(10)]
+gathered = Future.gather(futures).result(5)
+if [n for n, name in gathered] != range(10) or threading.current_thread().name in [name for n, name in gathered]:
+    raise Failure(gathered)
+
+failed = executor.submit(fails)
+for _ in xrange(2):
+    try:
+        failed.then(lambda result: result).result(5)
+    except Failure:
+        pass
+    else:
+        raise Failure("no exception")
+
+if Future.resolved(3).then(lambda result: result * 2).result() != 6:
+    raise Failure("resolved")
+
+print 'ok'
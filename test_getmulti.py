@@ -0,0 +1,54 @@
+from edgedata import EdgeData, DATASTORE
+from entity import Entity
+from assoc import Assoc
+from attr import *
+
+# getmulti and prefetch checks, run with `python test_getmulti.py` against
+# a datastore set up from datastore.sql
+
+class MultiTestEntity(Entity):
+    name = UnicodeAttr(required=True)
+
+class MultiTestAssoc(Assoc):
+    usergid = LocalGidAttr()
+    itemgid = RemoteGidAttr()
+    rank = IntAttr(default=0)
+
+def reset():
+    EdgeData.clearInstanceCache()
+    EdgeData.clearQueryCache()
+
+entities = [MultiTestEntity.add(name=u'entity%d' % i) for i in xrange(4)]
+users = [EdgeData.generateGid(colo=colo) for colo in (1, 2)]
+items = [entity.gid for entity in entities]
+for user in users:
+    with EdgeData.lock(user):
+        for rank, item in enumerate(items[:3]):
+            MultiTestAssoc.add(usergid=user, itemgid=item, rank=rank)
+
+# only the pairs asked for, None for the missing ones
+reset()
+pairs = [(users[0], items[0]), (users[1], items[1]), (users[0], items[3]), (users[1], items[2])]
+got = MultiTestAssoc.getmulti(pairs)
+assert [edge and (edge.usergid, edge.itemgid) for edge in got] == [pairs[0], pairs[1], None, pairs[3]]
+assert [edge.rank for edge in MultiTestAssoc.getmulti([(users[1], items[2])])] == [2]
+
+# missing edges are cached too, even once they're added outside the session
+data = EdgeData._encoders[0].encode(MultiTestAssoc, {})
+DATASTORE.add(MultiTestAssoc.__edgetype__, users[0], items[3], 0, data)
+assert MultiTestAssoc.get(users[0], items[3]) is None
+assert MultiTestAssoc.getmulti([(users[0], items[3])]) == [None]
+reset()
+assert MultiTestAssoc.get(users[0], items[3]).itemgid == items[3]
+
+# prefetched entities are served from the session's caches
+reset()
+edges = MultiTestAssoc.query(MultiTestAssoc.usergid == users[0]).prefetch(MultiTestEntity).fetch()
+assert sorted(edge.itemgid for edge in edges) == sorted(items)
+for entity in entities:
+    DATASTORE.delete(MultiTestEntity.__edgetype__, entity.gid, entity.gid)
+assert [MultiTestEntity.get(item).name for item in items] == [entity.name for entity in entities]
+reset()
+assert MultiTestEntity.getmulti(items) == [None] * len(items)
+
+print 'ok'
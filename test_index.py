@@ -0,0 +1,77 @@
+import random
+import datetime
+
+from data import Data
+from attr import *
+from index import Index
+
+# index value and range checks, run with `python test_index.py` once
+# escode is built
+
+class Row(Data):
+    __slots__ = ('__remotegid__',)
+
+    kind = IntAttr()
+    name = StringAttr()
+    when = DateTimeAttr()
+
+def makeindex(*attrdefs, **kwargs):
+    indexdef = Index(*attrdefs, **kwargs)
+    indexdef.indextype = 1
+    return indexdef
+
+def inrange(indexrange, indexvalue):
+    # edgeindex rows are read with indexvalue > start and < end
+    indextype, indexstart, indexend = indexrange
+    return indexstart < indexvalue < indexend
+
+def matching(indexdef, values, indexrange):
+    return [value for value in values if inrange(indexrange, indexdef.value(value))]
+
+# ranges of both versions, closed ends (True) include the end values
+
+for version in (1, 2):
+    indexdef = makeindex(Row.kind, Row.name, version=version)
+    values = [(kind, name) for kind in (None, 0, 1, 2, 3, 200, 70000) for name in (None, '', 'a', 'ab')]
+
+    assert matching(indexdef, values, indexdef.range((1,), True, (1,), True)) == \
+        [value for value in values if value[0] == 1]
+    assert matching(indexdef, values, indexdef.range((1, 'a'), True, (1, 'a'), True)) == [(1, 'a')]
+    assert matching(indexdef, values, indexdef.range((0,), True, (200,), True)) == \
+        [value for value in values if value[0] is not None and 0 <= value[0] <= 200]
+
+    # None is before every int, so ranges starting after it hold every int
+    # but no None (the ttl sweeper relies on this)
+    assert matching(indexdef, values + [(-1, None)], indexdef.range((None,), False, (1 << 40,), True)) == \
+        [value for value in values if value[0] is not None] + [(-1, None)]
+
+    assert matching(indexdef, values, indexdef.range((1,), False, (3,), False)) == \
+        [value for value in values if value[0] == 2]
+
+# hashed indexes only match their own value
+
+indexdef = makeindex(Row.kind, Row.name, hashed=True)
+assert indexdef.name == 'kind:name:hashed'
+random.seed(1)
+values = [(random.randrange(1000), random.choice(['x', 'y', 'z' * 1000])) for _ in xrange(2000)]
+for value in values[:100]:
+    indexrange = indexdef.range(value, True, value, True)
+    assert len(indexdef.value(value)) == Index._digestSize
+    assert set(matching(indexdef, values, indexrange)) == set([value])
+
+for digest in ('\x00' * Index._digestSize, '\xff' * Index._digestSize):
+    indexdef.digest = lambda indexvalue: digest
+    assert matching(indexdef, [(1, 'x')], indexdef.range((1, 'x'), True, (1, 'x'), True)) == [(1, 'x')]
+
+# covering indexes store the remote gid and the included values
+
+indexdef = makeindex(Row.kind, include=[Row.name, Row.when])
+assert indexdef.name == 'kind+name:when'
+row = Row(kind=1, name='a', when=datetime.datetime(2020, 1, 2, 3, 4, 5))
+row.__remotegid__ = 1 << 40
+assert indexdef.included(indexdef.payload(row)) == (1 << 40, {'name': 'a', 'when': row.when})
+row.when = None
+assert indexdef.included(indexdef.payload(row)) == (1 << 40, {'name': 'a', 'when': None})
+assert makeindex(Row.kind).payload(row) is None
+
+print 'ok'
@@ -0,0 +1,78 @@
+from session import Session
+from edgedata import EdgeData, DATASTORE
+from assoc import Assoc
+from attr import *
+
+# inverse edge checks, run with `python test_inverse.py` against a datastore
+# set up from datastore.sql
+
+class InverseTestAssoc(Assoc):
+    __inverse__ = True
+
+    usergid = LocalGidAttr()
+    itemgid = RemoteGidAttr()
+    note = UnicodeAttr(default=u'')
+
+class Rollback(Exception):
+    pass
+
+def reset():
+    EdgeData.clearInstanceCache()
+    EdgeData.clearQueryCache()
+
+def followers(itemgid):
+    reset()
+    return [edge.usergid for edge in InverseTestAssoc.queryInverse(itemgid)]
+
+users = sorted(EdgeData.generateGid(colo=colo) for colo in (1, 2, 3))
+item = EdgeData.generateGid(colo=4)
+
+for user in users:
+    with EdgeData.lock(user):
+        InverseTestAssoc.add(usergid=user, itemgid=item)
+assert followers(item) == users
+
+# changes don't add inverse edges again
+with EdgeData.lock(users[0]):
+    InverseTestAssoc.get(users[0], item).note = u'changed'
+assert followers(item) == users
+assert DATASTORE.queryInverse(InverseTestAssoc.__edgetype__, item) == users
+
+# inverse edges are removed while the colo is still locked, so a session
+# adding the edge again right after always writes its inverse edge
+held = []
+deleteInverse = DATASTORE.deleteInverse
+def recordingDeleteInverse(edgetype, gid1, gid2):
+    held.append((DATASTORE._dbname, DATASTORE.colo(gid1)) in Session.current().storeLockedColos)
+    return deleteInverse(edgetype, gid1, gid2)
+DATASTORE.deleteInverse = recordingDeleteInverse
+
+with EdgeData.lock(users[1]):
+    InverseTestAssoc.delete(users[1], item)
+del DATASTORE.deleteInverse
+assert held == [True], held
+assert followers(item) == [users[0], users[2]]
+
+# rolled back deletes and adds leave the inverse edges as they were
+try:
+    with EdgeData.lock(users[0]):
+        InverseTestAssoc.delete(users[0], item)
+        raise Rollback()
+except Rollback:
+    pass
+assert followers(item) == [users[0], users[2]]
+
+try:
+    with EdgeData.lock(users[1]):
+        InverseTestAssoc.add(usergid=users[1], itemgid=item)
+        raise Rollback()
+except Rollback:
+    pass
+assert followers(item) == [users[0], users[2]]
+
+# added again after a delete
+with EdgeData.lock(users[1]):
+    InverseTestAssoc.add(usergid=users[1], itemgid=item)
+assert followers(item) == users
+
+print 'ok'
@@ -0,0 +1,74 @@
+from session import Session
+from edgedata import EdgeData
+from entity import Entity
+from assoc import Assoc
+from attr import *
+from index import Index
+
+# streaming query checks, run with `python test_iter.py` against a datastore
+# set up from datastore.sql
+
+class IterTestEntity(Entity):
+    kind = IntAttr(required=True)
+    name = UnicodeAttr(required=True)
+
+    __indexdefs__ = [
+        Index(kind)]
+
+class IterTestAssoc(Assoc):
+    usergid = LocalGidAttr()
+    itemgid = RemoteGidAttr()
+    rank = IntAttr(default=0)
+
+def reset():
+    EdgeData.clearInstanceCache()
+    EdgeData.clearQueryCache()
+
+def edges(instances):
+    return [(edge.usergid, edge.itemgid, edge.rank) for edge in instances]
+
+user = EdgeData.generateGid(colo=1)
+with EdgeData.lock(user):
+    for item in xrange(1, 8):
+        IterTestAssoc.add(usergid=user, itemgid=item, rank=item % 3)
+
+query = lambda: IterTestAssoc.query(IterTestAssoc.usergid == user)
+
+# streamed results are the fetched ones, whatever the batch size
+reset()
+fetched = edges(query().fetch())
+assert len(fetched) == 7
+for batch_size in (1, 2, 100):
+    reset()
+    assert edges(query().iter(batch_size)) == fetched
+
+# streamed instances aren't cached
+reset()
+streamed = list(query().iter(2))
+assert not any((IterTestAssoc, user, edge.itemgid) in Session.current().instanceCache for edge in streamed)
+
+# the session's connection stays usable while rows are consumed
+reset()
+rows = query().iter(2)
+first = next(rows)
+assert IterTestAssoc.get(user, 3).rank == 0
+assert edges([first] + list(rows)) == fetched
+
+# global scans merge the hosts
+for colo in (1, 2, 3):
+    IterTestEntity.add(gid=EdgeData.generateGid(colo=colo), kind=7, name=u'colo%d' % colo)
+reset()
+fetched = [entity.gid for entity in IterTestEntity.query(IterTestEntity.kind == 7).fetch()]
+reset()
+assert [entity.gid for entity in IterTestEntity.query(IterTestEntity.kind == 7).iter(1)] == fetched
+
+# streams use their own connection, so not the locked one
+with EdgeData.lock(user):
+    try:
+        list(query().iter())
+    except AssertionError:
+        pass
+    else:
+        assert 0, "streamed inside lock"
+
+print 'ok'
@@ -0,0 +1,65 @@
+import os
+import binascii
+import tempfile
+
+from edgedata import EdgeData
+from entity import KeyEntity
+from attr import *
+
+# key filter checks, run with `python test_keyfilter.py` against a datastore
+# set up from datastore.sql
+
+class KeyFilterTestEntity(KeyEntity):
+    email = PrimaryKeyAttr()
+    name = UnicodeAttr(required=True)
+
+def reset():
+    EdgeData.clearInstanceCache()
+    EdgeData.clearQueryCache()
+
+def behind(key):
+    # adds the key like another process would, without this one's filter
+    keyfilter, KeyFilterTestEntity.__keyfilter__ = KeyFilterTestEntity.__keyfilter__, None
+    try:
+        KeyFilterTestEntity.add(email=key, name=u'behind')
+    finally:
+        KeyFilterTestEntity.__keyfilter__ = keyfilter
+    reset()
+
+def duplicate(key):
+    try:
+        KeyFilterTestEntity.addbykey(key, name=u'again')
+    except AssertionError as e:
+        return 'duplicate instance key' in str(e)
+    return False
+
+prefix = binascii.hexlify(os.urandom(8))
+for i in xrange(10):
+    KeyFilterTestEntity.add(email='%s-%d@x' % (prefix, i), name=u'n')
+
+# filters other processes may add keys behind aren't trusted for absent keys
+path = os.path.join(tempfile.mkdtemp(), 'keys.bloom')
+KeyFilterTestEntity.loadKeyFilter(1000, path=path)
+behind(prefix + '-shared@x')
+assert duplicate(prefix + '-shared@x')
+assert KeyFilterTestEntity.getbykey(prefix + '-shared@x', filtered=True).name == u'behind'
+
+# and neither are saved ones, whatever they were built as
+KeyFilterTestEntity.loadKeyFilter(1000, path=path, exclusive=True)
+behind(prefix + '-saved@x')
+assert duplicate(prefix + '-saved@x')
+
+# exclusive filters built from the index hold every key, and the ones this
+# process adds
+KeyFilterTestEntity.loadKeyFilter(1000, exclusive=True)
+assert KeyFilterTestEntity.getbykey(prefix + '-new@x', filtered=True) is None
+KeyFilterTestEntity.addbykey(prefix + '-new@x', name=u'new')
+reset()
+assert duplicate(prefix + '-new@x') and duplicate(prefix + '-saved@x')
+assert KeyFilterTestEntity.getbykey(prefix + '-new@x', filtered=True).name == u'new'
+
+KeyFilterTestEntity.__keyfilter__ = None
+os.remove(path)
+os.rmdir(os.path.dirname(path))
+
+print 'ok'
@@ -0,0 +1,110 @@
+import os
+import imp
+import time
+import shutil
+import logging
+import tempfile
+import traceback
+import lockstats
+
+from config import config
+from lockstats import LockStats, LockTimer
+
+# lock stats checks, run with `python test_lockstats.py` (also with python
+# -O, nothing here depends on asserts)
+
+class Failure(Exception):
+    pass
+
+class Handler(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+handler = Handler()
+logging.getLogger('lockstats').addHandler(handler)
+
+formatted = []
+format_stack = traceback.format_stack
+def counting_format_stack(*args):
+    formatted.append(1)
+    return format_stack(*args)
+traceback.format_stack = counting_format_stack
+
+def hold(colos, seconds, saves=0, shards=None):
+    timer = LockStats.start(colos)
+    if timer:
+        for colo in colos:
+            timer.request(colo)
+            timer.acquire(colo)
+        time.sleep(seconds)
+        timer.saves[colos[0]] += saves
+        for colo in colos:
+            shard, statements = shards[colo] if shards else ('shard', 2)
+            timer.release(colo, shard, statements)
+    LockStats.record(timer)
+    return timer
+
+if config.LOCK_STATS_ENABLED or LockStats.start([1]) is not None:
+    raise Failure("lock stats enabled by default")
+
+config.LOCK_STATS_ENABLED = True
+config.SLOW_LOCK_THRESHOLD = 0.05
+LockStats.reset()
+
+# the call site is the first frame outside the modules taking the lock
+timer = hold([1, 2], 0, saves=3)
+if not isinstance(timer, LockTimer) or os.path.basename(timer.callsite[0]) != 'test_lockstats.py' or \
+        timer.callsite[2] != 'hold':
+    raise Failure(timer and timer.callsite)
+if formatted or handler.messages:
+    raise Failure("formatted a fast lock")
+
+hold([1], 0.1)
+if len(formatted) != 1 or len(handler.messages) != 1:
+    raise Failure(handler.messages)
+if 'slow lock on colos [1]' not in handler.messages[0] or 'hold([1], 0.1)' not in handler.messages[0]:
+    raise Failure(handler.messages[0])
+
+# colos count the statements of their own shard
+hold([5, 6], 0, shards={5: ('a', 3), 6: ('b', 7)})
+
+colos = LockStats.colos()
+if colos[1]['count'] != 2 or colos[2]['count'] != 1:
+    raise Failure(colos)
+if colos[1]['saves'] != 3 or colos[1]['statements'] != 4 or colos[2]['statements'] != 2:
+    raise Failure(colos)
+if colos[5]['statements'] != 3 or colos[6]['statements'] != 7:
+    raise Failure(colos)
+if colos[1]['maxhold'] < 0.1 or sum(colos[1]['histogram']) != 2:
+    raise Failure(colos)
+
+callsites = LockStats.callsites()
+if sorted(stat['count'] for stat in callsites.itervalues()) != [3]:
+    raise Failure(callsites)
+if callsites.values()[0]['statements'] != 2 + 2 + 10:
+    raise Failure(callsites)
+
+# called from outside the package through a module that locks for its
+# callers, like EdgeData.lock
+start = {'LockStats': LockStats}
+edgedata = os.path.join(os.path.dirname(os.path.abspath(lockstats.__file__)), 'edgedata.py')
+exec compile("def start(colos):\n    return LockStats.start(colos)\n", edgedata, 'exec') in start
+
+outside = tempfile.mkdtemp()
+try:
+    path = os.path.join(outside, 'lockcaller.py')
+    with open(path, 'w') as f:
+        f.write("def call(start):\n    return start([3])\n")
+    timer = imp.load_source('lockcaller', path).call(start['start'])
+finally:
+    shutil.rmtree(outside)
+
+if timer.callsite != (path, 2, 'call'):
+    raise Failure(timer.callsite)
+
+print 'ok'
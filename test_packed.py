@@ -0,0 +1,116 @@
+import random
+import sqlite3
+
+from contextlib import contextmanager
+from datastore import DataStore, DataStoreShard
+
+# packed edge block checks against an in memory sqlite edgeblock table, run
+# with `python test_packed.py`
+
+class SqliteDB(object):
+
+    # just enough of DB for the packed edge statements
+
+    def __init__(self):
+        self._conn = sqlite3.connect(':memory:')
+        self._conn.execute("""
+          CREATE TABLE edgeblock (
+            edgetype int, gid1 int, start int, data blob,
+            PRIMARY KEY (edgetype, gid1, start))
+        """)
+
+    def _execute(self, sql, args):
+        args = [buffer(arg) if isinstance(arg, str) else arg for arg in args]
+        rows = self._conn.execute(sql.replace('FOR UPDATE', '').replace('%s', '?'), args).fetchall()
+        return [tuple(str(value) if isinstance(value, buffer) else value for value in row) for row in rows]
+
+    def run(self, sql, args=()):
+        self._execute(sql, args)
+
+    def get(self, sql, args=()):
+        return self._execute(sql, args)
+
+    def getOne(self, sql, args=()):
+        rows = self._execute(sql, args)
+        return rows[0] if rows else None
+
+    @contextmanager
+    def transaction(self):
+        yield
+
+class TestShard(DataStoreShard):
+
+    # revisions and counts are kept in memory instead of edgemeta
+
+    def __init__(self, db):
+        super(TestShard, self).__init__(db)
+        self.meta = {}
+
+    def _incrementRevision(self, edgetype, gid1):
+        meta = self.meta.setdefault((edgetype, gid1), [0, 0])
+        meta[0] += 1
+        return meta[0]
+
+    def _incrementCount(self, edgetype, gid1, inc=1):
+        self.meta[(edgetype, gid1)][1] += inc
+
+    def count(self, edgetype, gid1):
+        return self.meta.get((edgetype, gid1), [0, 0])[1]
+
+EDGETYPE, GID1 = 7, 5
+
+db = SqliteDB()
+shard = TestShard(db)
+DataStore.setPacked(EDGETYPE, 3, 'data')
+
+# small blocks so they are split and merged often
+DataStoreShard._packedBlockSize = 8
+DataStoreShard._packedBlocksPerRead = 2
+
+def gids():
+    return [edgedata[4] for edgedata in shard.query(EDGETYPE, None, GID1)]
+
+random.seed(1)
+expected = set()
+for i in xrange(1000):
+    gid2 = random.randrange(1, 200) << 33
+    if random.random() < 0.7:
+        shard.add(EDGETYPE, GID1, gid2, 0, '')
+        assert shard.lastAddWasOverwrite == (gid2 in expected)
+        expected.add(gid2)
+    else:
+        assert shard.delete(EDGETYPE, GID1, gid2) == (gid2 in expected)
+        expected.discard(gid2)
+
+    if i % 50 == 0:
+        assert gids() == sorted(expected)
+
+expected = sorted(expected)
+assert gids() == expected
+assert shard.count(EDGETYPE, GID1) == len(expected)
+assert [edgedata[4] for edgedata in shard.iter(EDGETYPE, None, GID1)] == expected
+
+# blocks stay sorted, bounded and keyed by their first gid
+for start, data in db.get('SELECT start, data FROM edgeblock'):
+    blockgids = DataStoreShard._unpackGids(data)
+    assert 0 < len(blockgids) <= DataStoreShard._packedBlockSize
+    assert blockgids == sorted(blockgids) and blockgids[0] == start
+
+# reads
+for gid2 in xrange(1, 200):
+    gid2 <<= 33
+    assert bool(shard.get(EDGETYPE, GID1, gid2)) == (gid2 in expected)
+assert shard.get(EDGETYPE, GID1, expected[0]) == (EDGETYPE, 0, 1, GID1, expected[0], 3, 'data')
+
+for after in (0, expected[0], expected[5], expected[5] + 1, expected[-1], expected[-1] + 1):
+    page = [edgedata[4] for edgedata in shard.listPacked(EDGETYPE, GID1, after, 7)]
+    assert page == [gid2 for gid2 in expected if gid2 > after][:7], after
+
+edgedatas = shard.getMulti(EDGETYPE, [(GID1, expected[0]), (GID1, 1), (GID1, expected[3])])
+assert sorted(edgedata[4] for edgedata in edgedatas) == [expected[0], expected[3]]
+
+# gid deltas use the full 64 bits
+for blockgids in ([1, 2 ** 63, 2 ** 64 - 1], [2 ** 64 - 1], range(0, 1 << 20, 4099)):
+    assert DataStoreShard._unpackGids(DataStoreShard._packGids(blockgids)) == blockgids
+
+print 'ok'
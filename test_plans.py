@@ -0,0 +1,57 @@
+import datetime
+
+from data import Data
+from attr import *
+
+# encode and decode plan checks, run with `python test_plans.py`
+
+class Phone(Data):
+    number = StringAttr(required=True)
+    verified = DateTimeAttr()
+
+class Person(Data):
+    name = UnicodeAttr(required=True)
+    age = IntAttr(default=18)
+    born = DateTimeAttr()
+    logins = RepeatedAttr(DateTimeAttr())
+    scores = RepeatedAttr(IntAttr())
+    tags = DictAttr()
+    phone = LocalDataAttr(Phone)
+    phones = RepeatedAttr(LocalDataAttr(Phone))
+
+def generic(instance):
+    # what dict gave before plans, one attrdef call after another
+    attrsdict = {}
+    for attrname, attrdef in instance.__attrdefs__.iteritems():
+        attrvalue = attrdef.get(instance)
+        if attrvalue is not None:
+            attrsdict[attrname] = attrdef._to_base_type(attrvalue)
+    return attrsdict
+
+when = datetime.datetime(2020, 1, 2, 3, 4, 5, 6)
+person = Person(
+    name=u'a', born=when, logins=[when, when], scores=[1, 2], tags={'x': [1]},
+    phone=Phone(number='1', verified=when), phones=[Phone(number='2')])
+
+# dicts have the base type values, defaults filled in
+for instance in (person, Person(name=u'b'), Phone(number='3')):
+    assert instance.dict() == generic(instance) == instance.dict(validate=True)
+assert person.dict()['age'] == 18 and person.dict()['phone']['verified'] == person.dict()['born']
+
+try:
+    Person().dict(validate=True)
+except AssertionError:
+    pass
+else:
+    assert 0, "validated a missing required attr"
+
+# decoding gives the values back, nested attrs with a conversion included
+decoded = Person._fromDict(person.dict())
+assert decoded.dict() == person.dict()
+assert decoded.born == when and list(decoded.logins) == [when, when] and decoded.scores == (1, 2)
+assert decoded.phone.verified == when and decoded.phones[0].number == '2' and decoded.phones[0].verified is None
+
+decoded = Person._fromDict({'name': u'c'})
+assert decoded.age == 18 and decoded.born is None and decoded.dict() == Person(name=u'c').dict()
+
+print 'ok'
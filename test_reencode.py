@@ -0,0 +1,82 @@
+import os
+import json
+import shutil
+import tempfile
+import migrate
+
+from edgedata import EdgeData, DATASTORE
+from entity import Entity
+from attr import *
+
+# re-encoding job checks, run with `python test_reencode.py` against a
+# datastore set up from datastore.sql
+
+class ReencodeTestEntity(Entity):
+    name = UnicodeAttr(required=True)
+    counter = IntAttr(default=0)
+
+class Interrupt(Exception):
+    pass
+
+class InterruptedCheckpoint(migrate.Checkpoint):
+
+    # stops the job right after saving the first chunk that re-encoded
+    # anything, like a killed process would
+
+    def save(self):
+        migrate.Checkpoint.save(self)
+        if any(host['stats'].get('reencoded') and not host['done'] for host in self.hosts.itervalues()):
+            raise Interrupt()
+
+edgetype = ReencodeTestEntity.__edgetype__
+target = EdgeData.COMPRESSED_ENCODING
+gids = [ReencodeTestEntity.add(name=u'entity%d' % i, counter=i).gid for i in xrange(10)]
+
+def encodings():
+    return [DATASTORE.get(edgetype, gid, gid)[5] for gid in gids]
+
+assert target not in encodings()
+
+tmpdir = tempfile.mkdtemp()
+path = os.path.join(tmpdir, 'reencode.json')
+job = {'command': 'reencode', 'encoding': target}
+
+def reencoder(checkpoint):
+    return migrate.Reencoder(encoding=target, edgetypes=[edgetype], chunksize=3, checkpoint=checkpoint)
+
+try:
+    reencoder(InterruptedCheckpoint(path, job)).run()
+except Interrupt:
+    pass
+else:
+    assert 0, "not interrupted"
+
+# the checkpoint has the position and totals of the chunks done so far
+with open(path) as f:
+    hosts = json.load(f)['hosts']
+reencoded = sum(host['stats'].get('reencoded', 0) for host in hosts.itervalues())
+assert 0 < reencoded < len(gids) and encodings().count(target) == reencoded
+
+# checkpoints of other jobs aren't resumed
+try:
+    migrate.Checkpoint(path, {'command': 'reencode', 'encoding': 0})
+except AssertionError:
+    pass
+else:
+    assert 0, "resumed another job"
+
+# resuming only re-encodes the rest, and the totals cover the whole job
+stats = reencoder(migrate.Checkpoint(path, job)).run()
+assert stats['reencoded'] == len(gids), stats
+assert encodings() == [target] * len(gids)
+
+EdgeData.clearInstanceCache()
+EdgeData.clearQueryCache()
+assert [ReencodeTestEntity.get(gid).counter for gid in gids] == range(len(gids))
+
+# a finished job has nothing left to do, it just reports its totals
+assert reencoder(migrate.Checkpoint(path, job)).run() == stats
+
+shutil.rmtree(tmpdir)
+
+print 'ok'
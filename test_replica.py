@@ -0,0 +1,76 @@
+import time
+import threading
+
+from config import config
+from datastore import DataStore
+from edgedata import EdgeData
+from entity import Entity
+from attr import *
+
+# read replica routing checks, run with `python test_replica.py` against a
+# datastore set up from datastore.sql. the replicas are the primaries under
+# another name, so the reads they get can be told apart
+
+class ReplicaTestEntity(Entity):
+    name = UnicodeAttr(required=True)
+
+config.DATABASE_REPLICAS = dict((host, ['replica:' + host]) for host in config.DATABASE_HOSTS)
+config.READ_YOUR_WRITES_WINDOW = 0
+
+hosts = []
+getDBShard = DataStore._getDBShard
+def recordingGetDBShard(self, host):
+    hosts.append(host)
+    return getDBShard(self, host.replace('replica:', '', 1))
+DataStore._getDBShard = recordingGetDBShard
+
+def reads(func):
+    # whether each shard used by func was a replica
+    EdgeData.clearInstanceCache()
+    EdgeData.clearQueryCache()
+    del hosts[:]
+    func()
+    return [host.startswith('replica:') for host in hosts]
+
+def inthread(func):
+    results = []
+    thread = threading.Thread(target=lambda: results.append(func()))
+    thread.start()
+    thread.join()
+    return results[0]
+
+def get():
+    assert ReplicaTestEntity.get(gid).name == u'a'
+
+gid = ReplicaTestEntity.add(name=u'a').gid
+
+# reads outside a lock go to a replica, inside one to the primary
+assert reads(get) == [True]
+assert reads(lambda: ReplicaTestEntity.count(gid)) == [True]
+assert reads(lambda: ReplicaTestEntity.aget(gid).result()) == [True]
+
+def locked():
+    with EdgeData.lock(gid):
+        get()
+assert not any(reads(locked))
+
+# within the window after a write, the session reads from the primary
+config.READ_YOUR_WRITES_WINDOW = 60
+with EdgeData.lock(gid):
+    ReplicaTestEntity.get(gid).name = u'a'
+assert reads(get) == [False]
+assert reads(lambda: ReplicaTestEntity.aget(gid).result()) == [False]
+
+# other sessions didn't write, so they still read from a replica
+assert inthread(lambda: reads(get)) == [True]
+
+# and so does this one once the window is over
+config.READ_YOUR_WRITES_WINDOW = 0.05
+time.sleep(0.1)
+assert reads(get) == [True]
+
+DataStore._getDBShard = getDBShard
+config.DATABASE_REPLICAS = {}
+config.READ_YOUR_WRITES_WINDOW = 0
+
+print 'ok'
@@ -0,0 +1,78 @@
+import threading
+
+from data import Data
+from edgedata import EdgeData, EdgeDataType
+from entity import Entity
+from attr import *
+
+# per thread session checks, run with `python test_session.py` against a
+# datastore set up from datastore.sql
+
+class Settings(Data):
+    theme = UnicodeAttr(default=u'light')
+
+class SessionTestEntity(Entity):
+    name = UnicodeAttr(required=True)
+    counter = IntAttr(default=0)
+    tags = DictAttr()
+    settings = LocalDataAttr(Settings)
+
+class Rollback(Exception):
+    pass
+
+def reset():
+    EdgeData.clearInstanceCache()
+    EdgeData.clearQueryCache()
+
+def inthread(func):
+    results = []
+    thread = threading.Thread(target=lambda: results.append(func()))
+    thread.start()
+    thread.join()
+    return results[0]
+
+gid = SessionTestEntity.add(name=u'a', tags={'a': 1}, settings=Settings()).gid
+reset()
+
+# committed values are shared, dicts and nested data are copied per session
+entity = SessionTestEntity.get(gid)
+shared = EdgeDataType._instanceCache[(SessionTestEntity, gid, gid)][1]
+assert entity.__values__[SessionTestEntity.name._index] is shared[SessionTestEntity.name._index]
+entity.tags['a'] = 2
+entity.settings.theme = u'dark'
+other = inthread(lambda: SessionTestEntity.get(gid))
+assert other.tags == {'a': 1} and other.settings.theme == u'light'
+reset()
+
+# changes are only seen by other sessions once committed
+with EdgeData.lock(gid):
+    entity = SessionTestEntity.get(gid)
+    entity.counter = 1
+    assert inthread(lambda: SessionTestEntity.get(gid).counter) == 0
+assert inthread(lambda: SessionTestEntity.get(gid).counter) == 1
+
+# rolled back changes are reverted, including the ones made in place
+try:
+    with EdgeData.lock(gid):
+        entity = SessionTestEntity.get(gid)
+        entity.counter = 2
+        entity.tags['b'] = 1
+        raise Rollback()
+except Rollback:
+    pass
+assert entity.counter == 1 and entity.tags == {'a': 1}
+
+try:
+    with EdgeData.lock(gid):
+        entity = SessionTestEntity.get(gid)
+        entity.settings.theme = u'dark'
+        raise Rollback()
+except Rollback:
+    pass
+assert entity.settings.theme == u'light'
+
+reset()
+entity = SessionTestEntity.get(gid)
+assert (entity.counter, entity.tags, entity.settings.theme) == (1, {'a': 1}, u'light')
+
+print 'ok'
@@ -0,0 +1,76 @@
+from data import Data
+from attr import *
+
+# attr descriptor and slot checks, run with `python test_slots.py`
+
+class Point(Data):
+    x = IntAttr(required=True)
+    y = IntAttr(default=0)
+    label = UnicodeAttr()
+    norm = ComputedAttr(lambda point: abs(point.x) + abs(point.y))
+
+class Shape(Data):
+    __slots__ = ('cache',)
+
+    name = UnicodeAttr(default=u'shape')
+    origin = LocalDataAttr(Point, default=Point(x=1, y=1))
+
+class Square(Shape):
+    __slots__ = ('area',)
+
+    side = IntAttr(default=1)
+
+# instances read and write their attrs, classes give the attrdefs
+point = Point(x=-2)
+assert (point.x, point.y, point.label, point.norm) == (-2, 0, None, 2)
+point.y = 3
+point.label = u'p'
+assert (point.y, point.label, point.norm) == (3, u'p', 5)
+assert isinstance(Point.x, IntAttr) and isinstance(Point.norm, ComputedAttr)
+assert point.dict() == {'x': -2, 'y': 3, 'label': u'p', 'norm': 5}
+
+try:
+    point.x = None
+except AssertionError:
+    pass
+else:
+    assert 0, "unset a required attr"
+
+# unknown attrs can't be read or written, instances have no __dict__
+assert not hasattr(point, '__dict__')
+for name in ('z', 'cache'):
+    try:
+        setattr(point, name, 1)
+    except AttributeError:
+        pass
+    else:
+        assert 0, "set unknown attr `%s`" % name
+    for obj in (point, Point):
+        try:
+            getattr(obj, name)
+        except AttributeError:
+            pass
+        else:
+            assert 0, "read unknown attr `%s`" % name
+
+# subclasses add their attrs and slots to their parents'
+square = Square(side=3)
+square.cache = 1
+square.area = 9
+assert (square.name, square.side, square.cache, square.area) == (u'shape', 3, 1, 9)
+assert square.origin.x == 1 and square.origin is not Square.origin.default
+assert sorted(Square.__attrdefs__) == ['name', 'origin', 'side']
+assert Square.name is not Shape.name
+
+shape = Shape(name=u's')
+shape.cache = 2
+assert shape.name == u's' and shape.dict() == {'name': u's', 'origin': {'x': 1, 'y': 1, 'norm': 2}}
+for name in ('side', 'area'):
+    try:
+        setattr(shape, name, 1)
+    except AttributeError:
+        pass
+    else:
+        assert 0, "set subclass attr `%s`" % name
+
+print 'ok'
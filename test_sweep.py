@@ -0,0 +1,57 @@
+import time
+import migrate
+
+from edgedata import EdgeData, DATASTORE
+from assoc import Assoc
+from attr import *
+
+# ttl sweeper checks, run with `python test_sweep.py` against a datastore
+# set up from datastore.sql
+
+class SweepTestAssoc(Assoc):
+    __ttl__ = 60
+    __inverse__ = True
+
+    usergid = LocalGidAttr()
+    itemgid = RemoteGidAttr()
+
+edgetype = SweepTestAssoc.__edgetype__
+now = int(time.time())
+usergid = EdgeData.generateGid()
+# the sweeps are given now, the reads use the clock, so live and expired
+# edges are kept well apart from it
+expiretimes = {
+    1: None,
+    2: -1000,
+    3: 0,
+    4: now - 1000,
+    5: now,
+    6: now + 1000,
+}
+
+with EdgeData.lock(usergid):
+    for itemgid, expiretime in expiretimes.iteritems():
+        SweepTestAssoc.add(usergid=usergid, itemgid=itemgid).expiretime = expiretime
+
+# expired edges are hidden before they're swept
+EdgeData.clearInstanceCache()
+EdgeData.clearQueryCache()
+assert SweepTestAssoc.get(usergid, 4) is None and SweepTestAssoc.get(usergid, 6)
+assert SweepTestAssoc.count(usergid) == len(expiretimes)
+
+stats = migrate.sweepExpired(edgetypes=[edgetype], dryrun=True, now=now)
+assert stats['expired'] == 4 and not stats['deleted'], stats
+assert SweepTestAssoc.count(usergid) == len(expiretimes)
+
+stats = migrate.sweepExpired(edgetypes=[edgetype], chunksize=2, now=now)
+assert stats['deleted'] == 4, stats
+
+# edges without an expiretime never expire, negative ones already have
+remaining = [itemgid for itemgid in expiretimes if DATASTORE.get(edgetype, usergid, itemgid)]
+assert remaining == [1, 6], remaining
+assert DATASTORE.count(edgetype, usergid) == 2
+assert [itemgid for itemgid in expiretimes if usergid in DATASTORE.queryInverse(edgetype, itemgid)] == [1, 6]
+
+assert not migrate.sweepExpired(edgetypes=[edgetype], now=now)['deleted']
+
+print 'ok'
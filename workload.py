@@ -0,0 +1,304 @@
+import sys
+import json
+import time
+import random
+import bisect
+import logging
+import optparse
+import multiprocessing
+
+from collections import defaultdict
+from config import config
+from db import DB
+from session import Session
+from datastore import DataStore
+from edgedata import EdgeData
+from entity import Entity
+from assoc import Assoc
+from attr import *
+from index import Index
+
+__all__ = ['WorkloadNode', 'WorkloadLink', 'Zipf', 'Workload', 'OPERATIONS']
+
+logger = logging.getLogger(__name__)
+
+class WorkloadNode(Entity):
+    kind = IntAttr(required=True)
+    version = IntAttr(default=0)
+    time = IntAttr(required=True)
+    data = UnicodeAttr(default=u'')
+
+    __indexdefs__ = [
+        Index(kind)]
+
+class WorkloadLink(Assoc):
+    id1 = LocalGidAttr()
+    id2 = RemoteGidAttr()
+    visible = BoolAttr(default=True)
+    time = IntAttr(required=True)
+    data = UnicodeAttr(default=u'')
+
+    __indexdefs__ = [
+        Index(id1, time)]
+
+class Zipf(object):
+
+    # picks ranks 0..n-1 where rank k is picked with probability
+    # proportional to 1 / (k + 1) ** shape, shape 0 is uniform
+
+    def __init__(self, n, shape, rand=random):
+        self._rand = rand
+        self._shape = shape
+        self._cdf = []
+        self.extend(n)
+
+    def extend(self, n):
+        # adds n ranks after the existing ones, so the new ones are the
+        # least popular
+        total = self._cdf[-1] if self._cdf else 0.0
+        for rank in xrange(len(self._cdf), len(self._cdf) + n):
+            total += 1.0 / (rank + 1) ** self._shape
+            self._cdf.append(total)
+
+    def sample(self):
+        return bisect.bisect_left(self._cdf, self._rand.random() * self._cdf[-1])
+
+# operation mix in percent, loosely after the LinkBench defaults with the
+# link list split between plain and index range queries
+OPERATIONS = [
+    ('get_node', 13),
+    ('add_node', 3),
+    ('update_node', 7),
+    ('add_link', 9),
+    ('update_link', 8),
+    ('get_link', 5),
+    ('count_link', 5),
+    ('list_link', 32),
+    ('range_link', 16),
+    ('global_query', 2),
+]
+
+class Workload(object):
+
+    def __init__(self, gids, linkshape=1.0, nodeshape=1.0, datasize=128, kinds=10, seed=None):
+        self._rand = random.Random(seed)
+        self._gids = list(gids)
+        self._nodes = Zipf(len(self._gids), nodeshape, self._rand)
+        self._links = Zipf(len(self._gids), linkshape, self._rand)
+        self._datasize = datasize
+        self._kinds = kinds
+
+        operations, weights = zip(*OPERATIONS)
+        self._operations = operations
+        self._cumweights = [sum(weights[:i + 1]) for i in range(len(weights))]
+
+    def _data(self):
+        return u'x' * self._rand.randint(self._datasize / 2, self._datasize * 3 / 2)
+
+    def _node(self):
+        return self._gids[self._nodes.sample()]
+
+    def _linked(self):
+        # gid1 of links follows its own popularity so hot nodes get the
+        # high fan-out lists
+        return self._gids[self._links.sample()]
+
+    def addNode(self):
+        return WorkloadNode.add(kind=self._rand.randrange(self._kinds), time=int(time.time()), data=self._data()).gid
+
+    def addLink(self, id1=None, id2=None):
+        id1, id2 = id1 or self._linked(), id2 or self._node()
+        with EdgeData.lock(id1):
+            WorkloadLink.add(id1=id1, id2=id2, time=int(time.time()), data=self._data(), get=True)
+
+    def run(self, operation):
+        getattr(self, '_' + operation)()
+
+    def choose(self):
+        return self._operations[bisect.bisect_right(self._cumweights, self._rand.random() * self._cumweights[-1])]
+
+    def _get_node(self):
+        WorkloadNode.get(self._node())
+
+    def _add_node(self):
+        # added nodes can be picked by the operations that follow
+        self._gids.append(self.addNode())
+        self._nodes.extend(1)
+        self._links.extend(1)
+
+    def _update_node(self):
+        gid = self._node()
+        with EdgeData.lock(gid):
+            node = WorkloadNode.get(gid)
+            node.version += 1
+            node.data = self._data()
+
+    def _add_link(self):
+        self.addLink()
+
+    def _update_link(self):
+        id1 = self._linked()
+        with EdgeData.lock(id1):
+            links = WorkloadLink.query(WorkloadLink.id1 == id1).fetch()
+            if links:
+                link = self._rand.choice(links)
+                link.visible = not link.visible
+                link.time = int(time.time())
+
+    def _get_link(self):
+        WorkloadLink.get(self._linked(), self._node())
+
+    def _count_link(self):
+        WorkloadLink.count(self._linked())
+
+    def _list_link(self):
+        WorkloadLink.query(WorkloadLink.id1 == self._linked()).fetch()
+
+    def _range_link(self):
+        since = int(time.time()) - self._rand.randint(0, 3600)
+        WorkloadLink.query(WorkloadLink.id1 == self._linked(), WorkloadLink.time >= since).fetch()
+
+    def _global_query(self):
+        WorkloadNode.query(WorkloadNode.kind == self._rand.randrange(self._kinds)).fetch()
+
+def statementCount():
+    # counted process wide, as parallel reads run on the executor threads
+    return DB.getTotalStatementCount()
+
+def resetSession():
+    # forked workers must not share the parent's connections or pools
+    for db in Session.current().dbs.itervalues():
+        db.closeConnection()
+    Session._local.session = Session()
+    DataStore._executors.clear()
+
+def load(nodes, links, linkshape, datasize, seed):
+    workload = Workload([], linkshape=linkshape, datasize=datasize, seed=seed)
+    gids = [workload.addNode() for _ in xrange(nodes)]
+
+    workload = Workload(gids, linkshape=linkshape, datasize=datasize, seed=seed)
+    for _ in xrange(links):
+        workload.addLink()
+        EdgeData.clearInstanceCache()
+        EdgeData.clearQueryCache()
+
+    return gids
+
+def work(args):
+    gids, options, seed, deadline = args
+    resetSession()
+
+    workload = Workload(gids, options.link_shape, options.node_shape, options.data_size, seed=seed)
+    latencies = defaultdict(list)
+    statements = defaultdict(int)
+    errors = defaultdict(int)
+
+    count = 0
+    while count < options.ops and time.time() < deadline:
+        operation = workload.choose()
+
+        # each operation is a fresh request, so nothing is served from the
+        # session's caches
+        EdgeData.clearInstanceCache()
+        EdgeData.clearQueryCache()
+
+        before = statementCount()
+        start = time.time()
+        try:
+            workload.run(operation)
+        except Exception:
+            logger.exception("%s failed", operation)
+            errors[operation] += 1
+            continue
+        finally:
+            count += 1
+
+        latencies[operation].append(time.time() - start)
+        statements[operation] += statementCount() - before
+
+    return latencies, statements, errors
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+def report(workers, elapsed, results):
+    latencies, statements, errors = defaultdict(list), defaultdict(int), defaultdict(int)
+    for workerlatencies, workerstatements, workererrors in results:
+        for operation, values in workerlatencies.iteritems():
+            latencies[operation].extend(values)
+        for operation, value in workerstatements.iteritems():
+            statements[operation] += value
+        for operation, value in workererrors.iteritems():
+            errors[operation] += value
+
+    operations = {}
+    for operation in set(latencies) | set(errors):
+        values = sorted(latencies[operation])
+        operations[operation] = {'count': len(values), 'errors': errors[operation]}
+        if values:
+            operations[operation].update({
+                'p50_ms': percentile(values, 0.50) * 1000,
+                'p99_ms': percentile(values, 0.99) * 1000,
+                'statements': float(statements[operation]) / len(values),
+            })
+
+    total = sum(len(values) for values in latencies.itervalues())
+    return {
+        'workers': workers,
+        'elapsed': elapsed,
+        'throughput': total / elapsed if elapsed else 0.0,
+        'operations': operations,
+    }
+
+def main(argv):
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option('--nodes', type='int', default=1000,
+        help="entities to load before the run")
+    parser.add_option('--links', type='int', default=5000,
+        help="assocs to load before the run")
+    parser.add_option('--workers', default='1,2,4',
+        help="comma separated worker process counts to run with")
+    parser.add_option('--ops', type='int', default=10000,
+        help="operations per worker")
+    parser.add_option('--duration', type='float', default=60.0,
+        help="maximum seconds per run")
+    parser.add_option('--node-shape', type='float', default=1.0,
+        help="zipf shape of node popularity, 0 is uniform")
+    parser.add_option('--link-shape', type='float', default=1.0,
+        help="zipf shape of link fan-out per gid1, 0 is uniform")
+    parser.add_option('--data-size', type='int', default=128,
+        help="average payload characters per node and link")
+    parser.add_option('--seed', type='int', default=0,
+        help="random seed for the load and the workers")
+
+    options, args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+    logger.info("loading %d nodes and %d links", options.nodes, options.links)
+    gids = load(options.nodes, options.links, options.link_shape, options.data_size, options.seed)
+
+    runs = []
+    for workers in map(int, options.workers.split(',')):
+        resetSession()
+        pool = multiprocessing.Pool(workers)
+        try:
+            start = time.time()
+            deadline = start + options.duration
+            results = pool.map(work, [
+                (gids, options, options.seed * 1000 + worker, deadline)
+                for worker in range(workers)])
+            elapsed = time.time() - start
+        finally:
+            pool.close()
+            pool.join()
+
+        run = report(workers, elapsed, results)
+        logger.info("%d workers: %.0f ops/s", workers, run['throughput'])
+        runs.append(run)
+
+    json.dump({'hosts': len(config.DATABASE_HOSTS), 'runs': runs}, sys.stdout, indent=2, sort_keys=True)
+    sys.stdout.write('\n')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])